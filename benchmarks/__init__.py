@@ -0,0 +1 @@
+"""Benchmarks and stand-ins for exercising the pipeline off-robot."""
@@ -0,0 +1,85 @@
+"""Measures change-point gating on a recorded data set replayed in order.
+
+Replays the frames at the glove's 90 Hz sampling rate through a
+GatedPredictor, and for a range of settle times reports the fraction of
+frames the model was skipped for, how often the gated decision matches
+running the model on every frame, the CPU time per frame, and the delay the
+detector adds before a new pose is decided. Also counts the segments found
+against the gesture changes in the recording.
+
+Run from the repository root with:
+    $ python3 -m benchmarks.change_gating --model trained_models/virgo.pth --csv data/virgo.csv
+"""
+
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from src import change_detector
+from src import inference
+from src.evaluate import load_model
+
+SAMPLE_RATE = 90
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--model", default="trained_models/virgo.pth")
+    parser.add_argument("--csv", default="data/virgo.csv")
+    parser.add_argument("--num-sensors", type=int, default=7)
+    parser.add_argument("--move-threshold", type=float, default=5.0)
+    parser.add_argument("--settle-threshold", type=float, default=1.5)
+    args = parser.parse_args()
+
+    model = load_model(args.model)
+    data_file = pd.read_csv(args.csv)
+    frames = data_file.iloc[:, 2:2 + args.num_sensors] \
+        .to_numpy(dtype=np.float32)
+    labels = data_file.iloc[:, 0].to_numpy()
+    timestamps = (np.arange(len(frames)) * 1e9 / SAMPLE_RATE).astype(np.int64)
+    session = inference.InferenceSession(model, args.num_sensors)
+
+    # Every frame through the model, as without gating
+    start_ns = time.process_time_ns()
+    for frame in frames:
+        session.predict(frame)
+    baseline = (time.process_time_ns() - start_ns) / len(frames) / 1e3
+    expected, _, _ = model.predict_batch(frames)
+    expected = expected.numpy()
+
+    steps = np.abs(np.diff(frames, axis=0)).max(axis=1)
+    print(f"{len(frames)} frames from {args.csv}, "
+          f"{np.count_nonzero(np.diff(labels))} gesture changes, largest "
+          f"change between frames p50 {np.median(steps):.2f} "
+          f"p99.9 {np.percentile(steps, 99.9):.2f}")
+    print(f"ungated: {baseline:.1f} us/frame\n")
+
+    print(f"{'settle':>7}{'skipped':>9}{'agreement':>11}{'us/frame':>10}"
+          f"{'segments':>10}{'delay p50 ms':>14}{'p99 ms':>8}")
+    for settle_frames in (3, 5, 9, 15, 30):
+        detector = change_detector.ChangeDetector(
+            args.num_sensors,
+            move_threshold=args.move_threshold,
+            settle_threshold=args.settle_threshold,
+            settle_frames=settle_frames,
+            max_events=len(frames))
+        gate = change_detector.GatedPredictor(detector)
+
+        gated = np.empty(len(frames), dtype=np.int64)
+        start_ns = time.process_time_ns()
+        for idx, frame in enumerate(frames):
+            gated[idx], _ = gate.predict(session, frame, session.predict,
+                                         int(timestamps[idx]))
+        cost = (time.process_time_ns() - start_ns) / len(frames) / 1e3
+
+        stats = gate.stats()
+        delays = np.array([event.delay_ns for event in detector.events
+                           if event.kind == change_detector.SETTLED]) / 1e6
+        p50, p99 = np.percentile(delays, [50, 99]) if len(delays) else (0, 0)
+        print(f"{settle_frames:>7}{stats['skipped_fraction']:>9.3f}"
+              f"{np.mean(gated == expected):>11.4f}{cost:>10.1f}"
+              f"{stats['settled_segments']:>10}{p50:>14.1f}{p99:>8.1f}")
+
+if __name__ == "__main__":
+    main()
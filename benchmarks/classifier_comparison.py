@@ -0,0 +1,159 @@
+"""Compares the nearest centroid model with the trained models.
+
+Splits a recorded data set, builds the nearest centroid model and trains the
+logistic regression and feed forward network on one part, and reports the
+accuracy on the other part, the build or training time, and the single
+frame and batched query cost of each. Also times few-shot enrollment of a
+gesture left out of the build.
+
+Run from the repository root with:
+    $ python3 -m benchmarks.classifier_comparison --csv data/virgo.csv
+"""
+
+import argparse
+import time
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+import torch
+from torch.utils.data import DataLoader, TensorDataset
+
+from src import inference
+from src.models import feed_forward
+from src.models import logistic_regression
+from src.models import nearest_centroid
+
+class Samples(NamedTuple):
+    """Samples in the form NearestCentroidModel.from_dataset() takes."""
+
+    inputs: torch.Tensor
+    labels: torch.Tensor
+
+def train_model(model: torch.nn.Module,
+                inputs: torch.Tensor,
+                labels: torch.Tensor,
+                num_epochs: int,
+                batch_size: int = 128,
+                lr: float = 1e-2) -> torch.nn.Module:
+    """Trains a model the way the Trainer does, on tensors already in
+    memory."""
+
+    optimiser = torch.optim.Adam(model.parameters(), lr)
+    loader = DataLoader(TensorDataset(inputs, labels), batch_size,
+                        shuffle=True)
+    for _ in range(num_epochs):
+        for batch in loader:
+            loss = model.training_step(batch)
+            loss.backward()
+            optimiser.step()
+            optimiser.zero_grad()
+    return model.eval()
+
+def accuracy(model: torch.nn.Module,
+             inputs: torch.Tensor,
+             labels: torch.Tensor) -> float:
+    """The fraction of samples a model predicts correctly."""
+
+    predictions, _, _ = model.predict_batch(inputs)
+    return (predictions == labels).double().mean().item()
+
+def query_cost(model: torch.nn.Module, frames: np.ndarray):
+    """Times single frame predictions through an InferenceSession and one
+    batched prediction of every frame.
+
+    Returns:
+        A tuple of the p50 and p99 single frame latency in microseconds and
+        the batched throughput in frames per second.
+    """
+
+    session = inference.InferenceSession(model, frames.shape[1])
+    latencies = np.empty(len(frames))
+    for idx, frame in enumerate(frames):
+        start_ns = time.perf_counter_ns()
+        session.predict(frame)
+        latencies[idx] = time.perf_counter_ns() - start_ns
+    p50, p99 = np.percentile(latencies / 1e3, [50, 99])
+
+    start = time.perf_counter()
+    model.predict_batch(frames)
+    throughput = len(frames) / (time.perf_counter() - start)
+    return p50, p99, throughput
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--csv", default="data/virgo.csv")
+    parser.add_argument("--num-sensors", type=int, default=7)
+    parser.add_argument("--epochs", type=int, default=100,
+                        help="training epochs for the trained models")
+    parser.add_argument("--learning-capacity", type=int, default=32)
+    parser.add_argument("--enroll-frames", type=int, default=10,
+                        help="frames a left out gesture is enrolled from")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    # Seeded 80/20 split
+    data_file = pd.read_csv(args.csv)
+    inputs = torch.tensor(data_file.iloc[:, 2:2 + args.num_sensors]
+                          .to_numpy(dtype=np.float32))
+    labels = torch.tensor(data_file.iloc[:, 0].to_numpy(), dtype=torch.int64)
+    num_gestures = int(labels.max()) + 1
+    order = torch.from_numpy(
+        np.random.default_rng(args.seed).permutation(len(labels)))
+    split = len(order) * 4 // 5
+    train, test = order[:split], order[split:]
+    frames = inputs[test].numpy()
+
+    torch.manual_seed(args.seed)
+    models = {}
+
+    start = time.perf_counter()
+    models["nearest centroid"] = \
+        nearest_centroid.NearestCentroidModel.from_dataset(
+            Samples(inputs[train], labels[train]))
+    build_times = {"nearest centroid": time.perf_counter() - start}
+
+    for name, model in (
+            ("logistic regression",
+             logistic_regression.LogisticRegressionModel(args.num_sensors,
+                                                         num_gestures)),
+            ("feed forward",
+             feed_forward.FeedForwardModel(args.num_sensors,
+                                           num_gestures,
+                                           args.learning_capacity))):
+        start = time.perf_counter()
+        models[name] = train_model(model, inputs[train], labels[train],
+                                   args.epochs)
+        build_times[name] = time.perf_counter() - start
+
+    print(f"{len(train)} build and {len(test)} test frames from {args.csv}\n")
+    print(f"{'model':<20}{'accuracy':>10}{'build ms':>12}{'p50 us':>9}"
+          f"{'p99 us':>9}{'batch frames/s':>16}")
+    for name, model in models.items():
+        p50, p99, throughput = query_cost(model, frames)
+        print(f"{name:<20}{accuracy(model, inputs[test], labels[test]):>10.4f}"
+              f"{build_times[name] * 1e3:>12.1f}{p50:>9.1f}{p99:>9.1f}"
+              f"{throughput:>16.0f}")
+
+    # Leave each gesture out of the build, then enroll it from a few frames
+    print(f"\nenrolling each gesture from {args.enroll_frames} frames:")
+    for gesture in range(num_gestures):
+        kept = train[labels[train] != gesture]
+        left_out = train[labels[train] == gesture][:args.enroll_frames]
+        # Renumber so the left out gesture is enrolled as the last index
+        model = nearest_centroid.NearestCentroidModel.from_dataset(
+            Samples(inputs[kept],
+                    labels[kept] - (labels[kept] > gesture).long()))
+
+        start = time.perf_counter()
+        index = model.enroll(inputs[left_out])
+        enroll_ms = (time.perf_counter() - start) * 1e3
+
+        # Map the test labels to the enrolled numbering
+        test_labels = labels[test] - (labels[test] > gesture).long()
+        test_labels[labels[test] == gesture] = index
+        print(f"  gesture {gesture}: {enroll_ms:.3f} ms, accuracy "
+              f"{accuracy(model, inputs[test], test_labels):.4f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""Measures the cost of ensembles against the number of members.
+
+Trains feed forward networks with different seeds on a split of a recorded
+data set, then for a growing number of them reports the held out accuracy
+of their average and its single frame and batched cost, both through an
+EnsembleModel and through a loop over the networks, and the batched cost of
+getting every member's output with EnsembleModel.member_outputs, checked
+against the averaged forward pass.
+
+Run from the repository root with:
+    $ python3 -m benchmarks.ensemble_latency --csv data/virgo.csv
+"""
+
+import argparse
+import time
+from typing import List
+
+import numpy as np
+import pandas as pd
+import torch
+
+from benchmarks.classifier_comparison import accuracy, query_cost, train_model
+from src.models import ensemble
+from src.models import feed_forward
+from src.models import prediction
+
+class LoopedEnsemble(torch.nn.Module, prediction.BatchPredictor):
+    """Averages the outputs of networks run one after another."""
+
+    def __init__(self, models: List[feed_forward.FeedForwardModel]):
+        super().__init__()
+        self.members = torch.nn.ModuleList(models)
+
+    def forward(self, input_: torch.tensor) -> torch.tensor:
+        """Returns the mean of the members' outputs."""
+
+        return torch.stack([member(input_)
+                            for member in self.members]).mean(dim=0)
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--csv", default="data/virgo.csv")
+    parser.add_argument("--num-sensors", type=int, default=7)
+    parser.add_argument("--epochs", type=int, default=10,
+                        help="training epochs of each network")
+    parser.add_argument("--learning-capacity", type=int, default=32)
+    parser.add_argument("--max-members", type=int, default=16)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    # Seeded 80/20 split
+    data_file = pd.read_csv(args.csv)
+    inputs = torch.tensor(data_file.iloc[:, 2:2 + args.num_sensors]
+                          .to_numpy(dtype=np.float32))
+    labels = torch.tensor(data_file.iloc[:, 0].to_numpy(), dtype=torch.int64)
+    num_gestures = int(labels.max()) + 1
+    order = torch.from_numpy(
+        np.random.default_rng(args.seed).permutation(len(labels)))
+    split = len(order) * 4 // 5
+    train, test = order[:split], order[split:]
+    frames = inputs[test].numpy()
+
+    members = []
+    for seed in range(args.seed, args.seed + args.max_members):
+        torch.manual_seed(seed)
+        members.append(train_model(
+            feed_forward.FeedForwardModel(args.num_sensors, num_gestures,
+                                          args.learning_capacity),
+            inputs[train], labels[train], args.epochs))
+
+    print(f"{len(train)} training and {len(test)} test frames from "
+          f"{args.csv}, {args.epochs} epochs per network\n")
+    print(f"{'members':>8}{'accuracy':>10}{'p50 us':>9}{'looped p50 us':>15}"
+          f"{'batch frames/s':>16}{'looped frames/s':>17}"
+          f"{'members frames/s':>18}{'max diff':>10}")
+    num_members = 1
+    while num_members <= args.max_members:
+        stacked = ensemble.EnsembleModel.from_models(members[:num_members])
+        looped = LoopedEnsemble(members[:num_members])
+        p50, _, throughput = query_cost(stacked, frames)
+        looped_p50, _, looped_throughput = query_cost(looped, frames)
+
+        # Every member's output at once, whose mean must be the ensemble's
+        start = time.perf_counter()
+        outputs = stacked.member_outputs(inputs[test])
+        members_throughput = len(frames) / (time.perf_counter() - start)
+        with torch.inference_mode():
+            difference = (outputs.mean(dim=0)
+                          - stacked(inputs[test])).abs().max().item()
+        print(f"{num_members:>8}"
+              f"{accuracy(stacked, inputs[test], labels[test]):>10.4f}"
+              f"{p50:>9.1f}{looped_p50:>15.1f}{throughput:>16.0f}"
+              f"{looped_throughput:>17.0f}{members_throughput:>18.0f}"
+              f"{difference:>10.1e}")
+        num_members *= 2
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""Compares the streaming filter with draining old readings.
+
+Replays a recorded data set at the glove's 90 Hz sampling rate and, for each
+way of reading gestures, works out the decision held at every frame. Reports
+the accuracy of the held decision, how often it flips once a gesture has
+been held for half a second, how long it takes to follow a change of gesture, how noisy the
+readings the model sees are, and the cost of filtering a frame.
+
+    per frame:  read_gesture_fast() on raw readings.
+    drain:      read_gesture(), which drains 300 readings before predicting
+                one, so a decision is made every 301 frames.
+    filters:    read_gesture_fast() on readings through each FilterConfig.
+
+Run from the repository root with:
+    $ python3 -m benchmarks.filter_stability --model trained_models/virgo.pth --csv data/virgo.csv
+"""
+
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from src import filters
+from src import timing
+from src.evaluate import load_model
+
+SAMPLE_RATE = 90
+DRAIN_FRAMES = 300
+
+# Frames after a change of gesture before the gesture counts as held
+SETTLE_FRAMES = SAMPLE_RATE // 2
+
+CONFIGS = {
+    "median 3": filters.FilterConfig(median_window=3),
+    "median 5": filters.FilterConfig(median_window=5),
+    "low-pass 0.5": filters.FilterConfig(alpha=0.5),
+    "low-pass 0.2": filters.FilterConfig(alpha=0.2),
+    "median 3 + lp 0.5": filters.FilterConfig(alpha=0.5, median_window=3),
+}
+
+def follow_ms(held: np.ndarray, labels: np.ndarray) -> float:
+    """The median time from each change of gesture until the held decision
+    is the new gesture and stays so until the next change."""
+
+    changes = np.flatnonzero(np.diff(labels)) + 1
+    ends = np.append(changes[1:], len(labels))
+    delays = []
+    for start, end in zip(changes, ends):
+        wrong = np.flatnonzero(held[start:end] != labels[start])
+        delays.append(wrong[-1] + 1 if len(wrong) else 0)
+    return float(np.median(delays)) * 1e3 / SAMPLE_RATE
+
+def settled(labels: np.ndarray) -> np.ndarray:
+    """Marks the steps between frames at which the gesture has been held
+    for at least SETTLE_FRAMES frames."""
+
+    since_change = np.arange(len(labels))
+    changes = np.flatnonzero(np.diff(labels)) + 1
+    for start, end in zip(changes, np.append(changes[1:], len(labels))):
+        since_change[start:end] -= start
+    return since_change[1:] >= SETTLE_FRAMES
+
+def flips_per_minute(held: np.ndarray, labels: np.ndarray) -> float:
+    """The rate at which the held decision changes while a gesture is
+    held."""
+
+    mask = settled(labels)
+    flips = np.count_nonzero((np.diff(held) != 0) & mask)
+    return flips / (np.count_nonzero(mask) / SAMPLE_RATE / 60)
+
+def jitter(frames: np.ndarray, labels: np.ndarray) -> float:
+    """The 99th percentile of the largest change between frames while a
+    gesture is held."""
+
+    steps = np.abs(np.diff(frames, axis=0)).max(axis=1)
+    return float(np.percentile(steps[settled(labels)], 99))
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--model", default="trained_models/virgo.pth")
+    parser.add_argument("--csv", default="data/virgo.csv")
+    parser.add_argument("--num-sensors", type=int, default=7)
+    args = parser.parse_args()
+
+    model = load_model(args.model)
+    data_file = pd.read_csv(args.csv)
+    raw = data_file.iloc[:, 2:2 + args.num_sensors].to_numpy(dtype=np.float32)
+    labels = data_file.iloc[:, 0].to_numpy()
+    predicted = model.predict_batch(raw)[0].numpy()
+
+    print(f"{len(raw)} frames from {args.csv}, "
+          f"{np.count_nonzero(np.diff(labels))} gesture changes\n")
+    print(f"{'reading':<20}{'accuracy':>10}{'flips/min':>11}{'follow ms':>11}"
+          f"{'jitter':>8}{'filter us':>11}")
+
+    def row(name, held, frames, cost):
+        print(f"{name:<20}{np.mean(held == labels):>10.4f}"
+              f"{flips_per_minute(held, labels):>11.1f}"
+              f"{follow_ms(held, labels):>11.0f}"
+              f"{jitter(frames, labels):>8.2f}{cost:>11.1f}")
+
+    row("per frame", predicted, raw, 0.0)
+
+    # Each read_gesture() call drains 300 readings then predicts the next,
+    # and its decision is held until the following call returns
+    decided = np.arange(DRAIN_FRAMES, len(raw), DRAIN_FRAMES + 1)
+    held = np.full(len(raw), -1)
+    for start, end in zip(decided, np.append(decided[1:], len(raw))):
+        held[start:end] = predicted[start]
+    row("drain", held, raw, 0.0)
+
+    for name, config in CONFIGS.items():
+        stream_filter = filters.StreamingFilter(args.num_sensors, config)
+        cost = timing.per_frame_us(stream_filter.update, raw)
+
+        filtered = filters.filter_frames(raw, config).astype(np.float32)
+        row(name, model.predict_batch(filtered)[0].numpy(), filtered, cost)
+
+if __name__ == "__main__":
+    main()
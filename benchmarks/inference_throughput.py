@@ -0,0 +1,110 @@
+"""Compares per-frame and batched inference throughput on a recorded data set.
+
+Also compares the single frame latency of the original per-frame path with
+the InferenceSession used by the API.
+
+Run from the repository root with:
+    $ python3 -m benchmarks.inference_throughput --model trained_models/virgo.pth --csv data/virgo.csv
+"""
+
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+import torch
+
+from src import inference
+from src.models import feed_forward
+
+def per_frame(model: torch.nn.Module, frames) -> float:
+    """Predicts one frame at a time the way API.read_gesture does.
+
+    Returns:
+        The number of frames predicted per second.
+    """
+
+    rows = frames.tolist()
+    start = time.perf_counter()
+    for row in rows:
+        output = model(torch.tensor(row))
+        torch.argmax(output).item()
+    return len(rows) / (time.perf_counter() - start)
+
+def batched(model: torch.nn.Module, frames, batch_size: int) -> float:
+    """Predicts the frames in batches with predict_batch.
+
+    Returns:
+        The number of frames predicted per second.
+    """
+
+    # Preallocated outputs, reused for every batch
+    probs = torch.empty(batch_size, model.model[-1].out_features)
+    confidences = torch.empty(batch_size)
+    indices = torch.empty(batch_size, dtype=torch.int64)
+
+    start = time.perf_counter()
+    for first in range(0, len(frames), batch_size):
+        batch = frames[first:first + batch_size]
+        size = len(batch)
+        model.predict_batch(batch, probs[:size], confidences[:size],
+                            indices[:size])
+    return len(frames) / (time.perf_counter() - start)
+
+def single_frame_latency(predict, frames) -> np.ndarray:
+    """Times a single frame predict function on every frame.
+
+    Returns:
+        An array of the latency of every call in microseconds.
+    """
+
+    latencies = np.empty(len(frames))
+    for idx, frame in enumerate(frames):
+        start_ns = time.perf_counter_ns()
+        predict(frame)
+        latencies[idx] = time.perf_counter_ns() - start_ns
+    return latencies / 1e3
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--model", default="trained_models/virgo.pth")
+    parser.add_argument("--csv", default="data/virgo.csv")
+    parser.add_argument("--num-sensors", type=int, default=7)
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="times to repeat the data set")
+    args = parser.parse_args()
+
+    # Load the model and the sensor columns of the data set
+    model = feed_forward.FeedForwardModel.from_state_dict(
+        torch.load(args.model))
+    frames = pd.read_csv(args.csv).iloc[:, 2:2 + args.num_sensors] \
+        .to_numpy(dtype="float32")
+    frames = frames.repeat(args.repeat, axis=0)
+
+    print(f"{len(frames)} frames from {args.csv}")
+    baseline = per_frame(model, frames)
+    print(f"per frame:      {baseline:12.0f} frames/s")
+    for batch_size in (1, 16, 256, 4096, len(frames)):
+        rate = batched(model, frames, batch_size)
+        print(f"batch of {batch_size:6d}: {rate:12.0f} frames/s "
+              f"({rate / baseline:.1f}x)")
+
+    # Single frame latency, including the first calls
+    def original(frame):
+        output = model(torch.tensor(frame.tolist()))
+        return torch.argmax(output).item()
+
+    fresh_model = feed_forward.FeedForwardModel.from_state_dict(
+        torch.load(args.model))
+    session = inference.InferenceSession(fresh_model, args.num_sensors)
+
+    print("\nsingle frame latency (us):")
+    for name, predict in (("original", original),
+                          ("session", session.predict)):
+        latencies = single_frame_latency(predict, frames)
+        p50, p99, p999 = np.percentile(latencies, [50, 99, 99.9])
+        print(f"{name:>8}: first {latencies[0]:8.1f}, p50 {p50:6.1f}, "
+              f"p99 {p99:6.1f}, p99.9 {p999:6.1f}, max {latencies.max():8.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""Measures the prediction cache on a recorded data set replayed in order.
+
+For each resolution, reports the hit rate, the CPU time per frame with and
+without the cache, and how often rounding changes the prediction. Also
+checks every cached prediction matches running the model on the rounded
+reading directly.
+
+Run from the repository root with:
+    $ python3 -m benchmarks.prediction_cache --model trained_models/virgo.pth --csv data/virgo.csv
+"""
+
+import argparse
+import time
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+
+from src import inference
+from src import prediction_cache
+from src.evaluate import load_model
+
+class Owner(NamedTuple):
+    """Stands in for the API's LoadedModel."""
+
+    session: inference.InferenceSession
+
+def cpu_per_frame_us(predict, frames: np.ndarray) -> float:
+    """The mean CPU time of predicting every frame, in microseconds."""
+
+    start_ns = time.process_time_ns()
+    for frame in frames:
+        predict(frame)
+    return (time.process_time_ns() - start_ns) / len(frames) / 1e3
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--model", default="trained_models/virgo.pth")
+    parser.add_argument("--csv", default="data/virgo.csv")
+    parser.add_argument("--num-sensors", type=int, default=7)
+    parser.add_argument("--capacity", type=int, default=4096)
+    args = parser.parse_args()
+
+    model = load_model(args.model)
+    frames = pd.read_csv(args.csv).iloc[:, 2:2 + args.num_sensors] \
+        .to_numpy(dtype=np.float32)
+    owner = Owner(inference.InferenceSession(model, args.num_sensors))
+
+    steps = np.abs(np.diff(frames, axis=0))
+    print(f"{len(frames)} frames from {args.csv}, median change between "
+          f"frames {np.median(steps):.2f}")
+    baseline = cpu_per_frame_us(owner.session.predict, frames)
+    print(f"uncached: {baseline:.1f} us/frame\n")
+
+    print(f"{'resolution':>10}{'hit rate':>10}{'us/frame':>10}"
+          f"{'speedup':>9}{'agreement':>11}{'consistent':>12}")
+    for resolution in (0.1, 0.5, 1.0, 2.0, 5.0, 10.0):
+        cache = prediction_cache.PredictionCache(resolution, args.capacity)
+        cost = cpu_per_frame_us(
+            lambda frame: cache.predict(owner, frame), frames)
+        stats = cache.stats()
+
+        # Replay again, checking every prediction, hits included, against
+        # the model run on the rounded reading
+        cells = cache.quantize(frames)
+        expected, _, _ = model.predict_batch(cache.representative(cells))
+        consistent = all(cache.predict(owner, frame)[0] == int(index)
+                         for frame, index in zip(frames, expected))
+
+        print(f"{resolution:>10}{stats['hit_rate']:>10.3f}{cost:>10.1f}"
+              f"{baseline / cost:>8.1f}x"
+              f"{cache.agreement(model, frames):>11.4f}"
+              f"{str(consistent):>12}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+"""Benchmarks the teleop publisher against the pseudo-terminal robot.
+
+Drives a VirgoTeleopController from a synthetic or replayed gesture source
+instead of a glove and reports command throughput, serial bytes per second
+and gesture to wire latency.
+
+Run from the repository root with:
+    $ python3 -m benchmarks.teleop_throughput --source replay --csv data/virgo.csv
+"""
+
+import argparse
+import bisect
+import time
+from abc import ABC, abstractmethod
+from threading import Thread
+from typing import List, Tuple
+
+import pandas as pd
+
+import gesture_recognition_api
+import virgo_teleop_controller as vtc
+from src import timing
+from .virgo_stub import VirgoStub
+
+class PacedGestureSource(ABC):
+    """A stand-in for the API that yields gestures at the glove's rate.
+
+    Args:
+        gestures:
+            The list of gesture names, in index order.
+        rate_hz:
+            The number of gestures produced per second.
+
+    Attributes:
+        transitions:
+            A list of (notified_ns, gesture index) tuples, one for every
+            time the produced gesture changed.
+    """
+
+    def __init__(self, gestures: List[str], rate_hz: float):
+        self.gestures: List[str] = gestures
+        self.transitions: List[Tuple[int, int]] = []
+        self._period: float = 1.0 / rate_hz
+        self._next: float = time.monotonic()
+        self._count: int = 0
+        self._last: int = -1
+
+    def setup(self) -> None:
+        """Nothing to connect to."""
+
+    @abstractmethod
+    def _gesture_at(self, count: int) -> int:
+        """Returns the index of the count-th gesture produced."""
+
+    def read_stamped_gesture_fast(self) -> gesture_recognition_api.StampedGesture:
+        """Waits for the next notification time and produces a gesture."""
+
+        # Pace to the notification rate
+        self._next += self._period
+        delay = self._next - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+        notified_ns = time.monotonic_ns()
+        gesture_idx = self._gesture_at(self._count)
+        self._count += 1
+
+        # Remember when the gesture changed
+        if gesture_idx != self._last:
+            self.transitions.append((notified_ns, gesture_idx))
+            self._last = gesture_idx
+
+        return gesture_recognition_api.StampedGesture(gesture_idx,
+                                                      notified_ns,
+                                                      time.monotonic_ns())
+
+class SyntheticGestureSource(PacedGestureSource):
+    """Cycles through every gesture, holding each for a number of frames.
+
+    Args:
+        hold:
+            The number of frames each gesture is held for.
+    """
+
+    def __init__(self, gestures: List[str], rate_hz: float, hold: int):
+        super().__init__(gestures, rate_hz)
+        self._hold = hold
+
+    def _gesture_at(self, count: int) -> int:
+        return (count // self._hold) % len(self.gestures)
+
+class ReplayGestureSource(PacedGestureSource):
+    """Replays the gesture labels of a recorded data set in order.
+
+    Args:
+        filepath:
+            The path of the raw data csv file to replay.
+    """
+
+    def __init__(self, filepath: str, rate_hz: float):
+        data_file = pd.read_csv(filepath)
+        self._labels = data_file["gesture_index"].to_numpy()
+
+        # Recover the gesture list from the recorded names
+        names = data_file.drop_duplicates("gesture_index")
+        gestures = [name for _, name in sorted(zip(names["gesture_index"],
+                                                   names["gesture_name"]))]
+        super().__init__(gestures, rate_hz)
+
+    def _gesture_at(self, count: int) -> int:
+        return int(self._labels[count % len(self._labels)])
+
+def gesture_to_wire_latency(source: PacedGestureSource,
+                            controller: vtc.VirgoTeleopController,
+                            stub: VirgoStub) -> timing.LatencyHistogram:
+    """Matches each change seen by the robot to the gesture that caused it.
+
+    Returns:
+        A LatencyHistogram of the time from a gesture's notification to
+        the robot reading the corresponding frame.
+    """
+
+    histogram = timing.LatencyHistogram()
+    times = [notified_ns for notified_ns, _ in source.transitions]
+    previous = None
+    for frame in stub.frames:
+        if frame.raw == previous:
+            continue
+        previous = frame.raw
+
+        # The latest gesture change before the frame arrived
+        idx = bisect.bisect_right(times, frame.arrived_ns) - 1
+        if idx < 0:
+            continue
+        notified_ns, gesture_idx = source.transitions[idx]
+        if controller._commands[gesture_idx] == frame.raw:
+            histogram.record(frame.arrived_ns - notified_ns)
+    return histogram
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--source", choices=["synthetic", "replay"],
+                        default="synthetic")
+    parser.add_argument("--csv", default="data/virgo.csv",
+                        help="data set to replay")
+    parser.add_argument("--glove-rate", type=float, default=90.0,
+                        help="gestures produced per second")
+    parser.add_argument("--hold", type=int, default=45,
+                        help="frames each synthetic gesture is held for")
+    parser.add_argument("--rate", type=float, default=50.0,
+                        help="publisher ticks per second")
+    parser.add_argument("--keepalive", type=float, default=0.5)
+    parser.add_argument("--duration", type=float, default=10.0)
+    args = parser.parse_args()
+
+    # Set up the gesture source
+    if args.source == "replay":
+        source = ReplayGestureSource(args.csv, args.glove_rate)
+    else:
+        source = SyntheticGestureSource(list(vtc.DIRECTIONS),
+                                        args.glove_rate,
+                                        args.hold)
+
+    # Start the robot stand-in and point the controller at it
+    stub = VirgoStub()
+    stub.start()
+    controller = vtc.VirgoTeleopController(rate_hz=args.rate,
+                                           keepalive=args.keepalive,
+                                           port=stub.port,
+                                           api=source)
+
+    # Run for the requested duration
+    runner = Thread(target=controller.run)
+    start = time.monotonic()
+    runner.start()
+    time.sleep(args.duration)
+    controller.stop()
+    runner.join()
+    elapsed = time.monotonic() - start
+
+    # Give the robot a moment to drain the link
+    time.sleep(0.2)
+    stub.stop()
+
+    # Report
+    latency = gesture_to_wire_latency(source, controller, stub)
+    print(f"\nsource: {args.source}, {elapsed:.1f}s")
+    print(f"commands received: {len(stub.frames)} "
+          f"({len(stub.frames) / elapsed:.1f}/s)")
+    print(f"serial throughput: {stub.bytes_received / elapsed:.1f} bytes/s")
+    print(f"gesture changes: {len(source.transitions)}")
+    print("gesture to wire latency (ms): "
+          + ", ".join(f"{key} {value:.3f}" if isinstance(value, float)
+                      else f"{key} {value}"
+                      for key, value in latency.snapshot().items()))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""Measures the per-frame cost of streaming the temporal model.
+
+For a range of depths, times each new frame through the TemporalConvModel's
+incremental step() and through recomputing its whole window, alongside the
+feed forward model's single frame prediction, all through an
+InferenceSession the way the API runs them. Also checks the streamed outputs
+match the windowed ones.
+
+Run from the repository root with:
+    $ python3 -m benchmarks.temporal_step --csv data/virgo.csv
+"""
+
+import argparse
+
+import numpy as np
+import pandas as pd
+import torch
+
+from src import inference
+from src import timing
+from src.models import feed_forward
+from src.models import temporal_conv
+
+class WindowedModel(torch.nn.Module):
+    """Runs a TemporalConvModel on the window ending at each frame, as a
+    model without streaming state would have to."""
+
+    def __init__(self, model: temporal_conv.TemporalConvModel):
+        super().__init__()
+        self.model = model
+        self.window = torch.zeros(1, model.convs[0].in_channels,
+                                  model.receptive_field)
+
+    def forward(self, input_: torch.tensor) -> torch.tensor:
+        """Shifts the frame into the window and runs the whole window."""
+
+        self.window[0, :, :-1] = self.window[0, :, 1:].clone()
+        self.window[0, :, -1] = input_[0]
+        return self.model(self.window)
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--csv", default="data/virgo.csv")
+    parser.add_argument("--num-sensors", type=int, default=7)
+    parser.add_argument("--num-gestures", type=int, default=9)
+    parser.add_argument("--learning-capacity", type=int, default=32)
+    args = parser.parse_args()
+
+    frames = pd.read_csv(args.csv).iloc[:, 2:2 + args.num_sensors] \
+        .to_numpy(dtype=np.float32)
+    torch.manual_seed(0)
+
+    baseline = feed_forward.FeedForwardModel(args.num_sensors,
+                                             args.num_gestures,
+                                             args.learning_capacity)
+    baseline_us = timing.per_frame_us(
+        inference.InferenceSession(baseline, args.num_sensors).predict, frames)
+    print(f"{len(frames)} frames from {args.csv}, feed forward "
+          f"{baseline_us:.1f} us/frame\n")
+
+    print(f"{'layers':>7}{'window':>8}{'step us':>9}{'window us':>11}"
+          f"{'speedup':>9}{'max diff':>10}")
+    for num_layers in (2, 3, 4, 5):
+        model = temporal_conv.TemporalConvModel(args.num_sensors,
+                                                args.num_gestures,
+                                                args.learning_capacity,
+                                                num_layers=num_layers)
+        streamed = inference.InferenceSession(model, args.num_sensors)
+        step_us = timing.per_frame_us(streamed.predict, frames)
+
+        windowed = inference.InferenceSession(WindowedModel(model),
+                                              args.num_sensors)
+        window_us = timing.per_frame_us(windowed.predict, frames)
+
+        # Every streamed output against the window of frames leading up to
+        # it, with the stream's start held as the first frame
+        model.reset_state()
+        outputs = np.stack([streamed.predict(frame)[1].numpy().copy()
+                            for frame in frames])
+        padded = torch.from_numpy(np.concatenate(
+            [np.repeat(frames[:1], model.receptive_field - 1, axis=0),
+             frames]))
+        with torch.inference_mode():
+            expected = model(padded.unfold(0, model.receptive_field, 1))
+        difference = np.abs(outputs - expected.numpy()).max()
+
+        print(f"{num_layers:>7}{model.receptive_field:>8}{step_us:>9.1f}"
+              f"{window_us:>11.1f}{window_us / step_us:>8.1f}x"
+              f"{difference:>10.1e}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""A pseudo-terminal stand-in for the Virgo robot's serial link."""
+
+import os
+import select
+import time
+import tty
+from threading import Event, Thread
+from typing import List, NamedTuple
+
+class ReceivedFrame(NamedTuple):
+    """A frame decoded by the stand-in robot.
+
+    Attributes:
+        arrived_ns:
+            The time.monotonic_ns() at which the frame was read.
+        left:
+            The left wheel direction, from -1 to 1.
+        right:
+            The right wheel direction, from -1 to 1.
+        raw:
+            The 3 bytes of the frame.
+    """
+
+    arrived_ns: int
+    left: float
+    right: float
+    raw: bytes
+
+class VirgoStub:
+    """Pretends to be the robot at the other end of the serial link.
+
+    Opens a pseudo-terminal and decodes the 0xFF,left,right frames written
+    to it on a background thread. Pass port to the VirgoTeleopController
+    in place of the FTDI device.
+
+    Attributes:
+        port:
+            The path of the pseudo-terminal to open as the serial port.
+        frames:
+            A list of every ReceivedFrame decoded so far.
+        bytes_received:
+            The total number of bytes read, including any discarded while
+            looking for a frame header.
+    """
+
+    def __init__(self):
+        self._master, self._slave = os.openpty()
+
+        # Pass bytes through untouched
+        tty.setraw(self._slave)
+
+        self.port: str = os.ttyname(self._slave)
+        self.frames: List[ReceivedFrame] = []
+        self.bytes_received: int = 0
+
+        self._stop = Event()
+        self._reader = Thread(target=self._read, daemon=True)
+
+    def start(self) -> None:
+        """Starts decoding frames."""
+
+        self._reader.start()
+
+    def stop(self) -> None:
+        """Stops decoding frames and closes the pseudo-terminal."""
+
+        self._stop.set()
+        self._reader.join()
+        os.close(self._master)
+        os.close(self._slave)
+
+    def _read(self) -> None:
+        """Reads and decodes frames until stopped."""
+
+        pending = bytearray()
+        while not self._stop.is_set():
+            # Wait for data without spinning
+            ready, _, _ = select.select([self._master], [], [], 0.1)
+            if not ready:
+                continue
+            chunk = os.read(self._master, 4096)
+            arrived_ns = time.monotonic_ns()
+            self.bytes_received += len(chunk)
+            pending += chunk
+
+            # Wheel speeds are at most 200, so 0xFF only marks a header
+            while len(pending) >= 3:
+                if pending[0] != 0xFF:
+                    del pending[0]
+                    continue
+                raw = bytes(pending[:3])
+                del pending[:3]
+                self.frames.append(ReceivedFrame(arrived_ns,
+                                                 (raw[1] - 100) / 100,
+                                                 (raw[2] - 100) / 100,
+                                                 raw))
+
+if __name__ == "__main__":
+    stub = VirgoStub()
+    stub.start()
+    print(f"Robot stand-in listening on {stub.port}, press CTRL+C to quit")
+    try:
+        while True:
+            stub._stop.wait(1.0)
+            if stub.frames:
+                frame = stub.frames[-1]
+                print(f"{len(stub.frames)} frames, "
+                      f"latest: ({frame.left}, {frame.right})")
+    except KeyboardInterrupt:
+        stub.stop()
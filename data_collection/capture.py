@@ -0,0 +1,229 @@
+"""Records raw BLE notifications to disk and replays them.
+
+A capture is a directory of segment files named capture-NNNNN.bin, each
+starting with MAGIC and followed by records of:
+    timestamp_ns (uint64), handle (uint16), length (uint16), data
+all little endian, where timestamp_ns is the time.monotonic_ns() at which
+the notification arrived. Closed segments are optionally gzipped to
+capture-NNNNN.bin.gz.
+"""
+
+import glob
+import gzip
+import os
+import queue
+import shutil
+import struct
+import time
+from threading import Thread
+from typing import Iterator, NamedTuple, Optional
+
+MAGIC = b"SSCAP1\n\x00"
+RECORD_HEADER = struct.Struct("<QHH")
+
+class Packet(NamedTuple):
+    """A raw notification read back from a capture.
+
+    Attributes:
+        timestamp_ns:
+            The time.monotonic_ns() at which the notification arrived.
+        handle:
+            The handle of the characteristic that sent the notification.
+        data:
+            The bytestring data of the notification.
+    """
+
+    timestamp_ns: int
+    handle: int
+    data: bytes
+
+class CaptureRecorder:
+    """Appends raw notifications to a rotating capture on a writer thread.
+
+    record() only packs the record and puts it on a queue, so it is cheap
+    enough to call from the notification handler at full sampling rate.
+
+    Args:
+        directory:
+            The directory to write the segment files into. Created if it
+            does not exist.
+        segment_bytes:
+            The size in bytes after which a new segment is started.
+        compress:
+            Whether to gzip segments once they are closed.
+
+    Attributes:
+        packets_recorded:
+            The number of notifications written so far.
+    """
+
+    def __init__(self,
+                 directory: str,
+                 segment_bytes: int = 64 * 1024 * 1024,
+                 compress: bool = True):
+        self._directory: str = directory
+        self._segment_bytes: int = segment_bytes
+        self._compress: bool = compress
+        self.packets_recorded: int = 0
+
+        os.makedirs(directory, exist_ok=True)
+
+        # Continue numbering after the last segment already in the
+        # directory, even if earlier ones were deleted
+        self._segment_idx: int = 1 + max(
+            (int(os.path.basename(path)[len("capture-"):].split(".")[0])
+             for path in glob.glob(os.path.join(directory,
+                                                "capture-*.bin*"))),
+            default=-1)
+
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._writer = Thread(target=self._write, daemon=True)
+        self._writer.start()
+
+    def record(self, handle: int, data: bytes, timestamp_ns: int) -> None:
+        """Queues a notification to be written.
+
+        Args:
+            handle:
+                The handle of the characteristic that sent the notification.
+            data:
+                The bytestring data of the notification.
+            timestamp_ns:
+                The time.monotonic_ns() at which the notification arrived.
+        """
+
+        self._queue.put(RECORD_HEADER.pack(timestamp_ns, handle, len(data))
+                        + data)
+
+    def close(self) -> None:
+        """Writes everything queued so far and closes the capture."""
+
+        self._queue.put(None)
+        self._writer.join()
+
+    def _segment_path(self) -> str:
+        """Returns the path of the current segment."""
+
+        return os.path.join(self._directory,
+                            f"capture-{self._segment_idx:05d}.bin")
+
+    def _write(self) -> None:
+        """Writes queued records until closed, rotating segments."""
+
+        # Opened exclusively, so an existing segment is never overwritten
+        segment = open(self._segment_path(), "xb")
+        segment.write(MAGIC)
+        size = len(MAGIC)
+
+        while True:
+            record = self._queue.get()
+            if record is None:
+                break
+
+            segment.write(record)
+            size += len(record)
+            self.packets_recorded += 1
+
+            # Start a new segment once this one is full
+            if size >= self._segment_bytes:
+                self._close_segment(segment)
+                self._segment_idx += 1
+                segment = open(self._segment_path(), "xb")
+                segment.write(MAGIC)
+                size = len(MAGIC)
+
+        self._close_segment(segment)
+
+    def _close_segment(self, segment) -> None:
+        """Closes a segment, compressing it if required."""
+
+        segment.close()
+        if not self._compress:
+            return
+
+        with open(segment.name, "rb") as raw, \
+                gzip.open(segment.name + ".gz", "wb") as compressed:
+            shutil.copyfileobj(raw, compressed)
+        os.remove(segment.name)
+
+def read_capture(directory: str) -> Iterator[Packet]:
+    """Reads every notification in a capture in order.
+
+    Args:
+        directory:
+            The directory containing the segment files.
+
+    Yields:
+        A Packet for every notification recorded.
+
+    Raises:
+        ValueError if a segment is not a capture file.
+    """
+
+    paths = sorted(glob.glob(os.path.join(directory, "capture-*.bin*")))
+    for path in paths:
+        opener = gzip.open if path.endswith(".gz") else open
+        with opener(path, "rb") as segment:
+            if segment.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{path} is not a capture file")
+
+            while True:
+                header = segment.read(RECORD_HEADER.size)
+                if len(header) < RECORD_HEADER.size:
+                    # End of segment, or a record cut off by a crash
+                    break
+                timestamp_ns, handle, length = RECORD_HEADER.unpack(header)
+                data = segment.read(length)
+                if len(data) < length:
+                    break
+                yield Packet(timestamp_ns, handle, data)
+
+def replay(directory: str,
+           delegate,
+           speed: Optional[float] = 1.0) -> Iterator[Packet]:
+    """Feeds a capture through a delegate at its original timing.
+
+    Args:
+        directory:
+            The directory containing the segment files.
+        delegate:
+            The StretchSenseDelegate to pass each notification to.
+        speed:
+            How many times faster than real time to replay, or None to
+            replay as fast as possible.
+
+    Yields:
+        Each Packet, right after the delegate has handled it.
+    """
+
+    start_ns = time.monotonic_ns()
+    first_ns = None
+    for packet in read_capture(directory):
+        if first_ns is None:
+            first_ns = packet.timestamp_ns
+
+        # Wait until the packet's original offset from the first one
+        if speed is not None:
+            due_ns = start_ns + (packet.timestamp_ns - first_ns) / speed
+            delay = (due_ns - time.monotonic_ns()) / 1e9
+            if delay > 0:
+                time.sleep(delay)
+
+        delegate.handleNotification(packet.handle, packet.data)
+        yield packet
+
+if __name__ == "__main__":
+    import sys
+
+    # Summarise a capture
+    count = 0
+    first_ns = last_ns = 0
+    for packet in read_capture(sys.argv[1]):
+        if count == 0:
+            first_ns = packet.timestamp_ns
+        last_ns = packet.timestamp_ns
+        count += 1
+
+    duration = (last_ns - first_ns) / 1e9
+    print(f"{count} packets over {duration:.1f}s "
+          f"({count / duration if duration else 0:.1f} Hz)")
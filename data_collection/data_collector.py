@@ -1,14 +1,26 @@
 import csv
+import threading
 import time
-from typing import List
-from datetime import datetime
+from typing import List, Optional
+from datetime import datetime, timedelta
 
+from . import capture
+from . import live_buffer
 from .peripheral import bluetooth_handler
 from .peripheral import stretchsense_peripheral as ssp
 
+# The longest a read waits before progress is reported, in seconds
+PROGRESS_INTERVAL = 0.1
 
 class DataCollector:
     """This class collects data from the Stretchsense Glove.
+
+    collect_data() blocks until every rep is collected, so the GUI runs it
+    on a worker thread. It can be paused, resumed and cancelled from other
+    threads, and reports its progress through the controller's
+    update_text() and update_progress(). Every reading taken, including
+    those discarded between gestures, is written to the live buffer for
+    display.
     
     Args:
         filepath:
@@ -24,6 +36,13 @@ class DataCollector:
             Number of sensors in the peripheral used for data collection.
         controller:
             The controller used to facilitate communication with the GUI.
+        capture_dir:
+            If given, the directory the raw notifications received during
+            collection are captured into, for exact replay.
+
+    Attributes:
+        live:
+            A LiveBuffer of the most recent readings.
     """
 
     def __init__(self,
@@ -32,7 +51,8 @@ class DataCollector:
                  num_sets: int,
                  gestures: List,
                  num_sensors: int,
-                 controller):
+                 controller,
+                 capture_dir: Optional[str] = None):
 
         # The handler used to connect to Stretchsense peripherals via Bluetooth
         self._handler: bluetooth_handler.BluetoothHandler
@@ -47,6 +67,84 @@ class DataCollector:
         self._num_sensors: int = num_sensors
 
         self._controller = controller
+        self._capture_dir: Optional[str] = capture_dir
+
+        self.live = live_buffer.LiveBuffer(num_sensors)
+
+        # Cleared while paused, and set again to resume or cancel
+        self._running = threading.Event()
+        self._running.set()
+        self._cancelled = threading.Event()
+
+    @property
+    def cancelled(self) -> bool:
+        """Whether the last collection was cancelled."""
+
+        return self._cancelled.is_set()
+
+    @property
+    def frames_dropped(self) -> int:
+        """The number of readings lost, malformed or while the link was
+        down, since connecting."""
+
+        return (self._peripheral.frames_dropped
+                + sum(gap.lost_frames for gap in self._peripheral.gaps))
+
+    def pause(self) -> None:
+        """Stops recording until resume() is called.
+
+        Readings that arrive while paused are discarded, as the user may
+        have let go of the gesture.
+        """
+
+        self._running.clear()
+
+    def resume(self) -> None:
+        """Continues recording after pause()."""
+
+        self._running.set()
+
+    def cancel(self) -> None:
+        """Stops the collection, which then saves nothing."""
+
+        self._cancelled.set()
+        self._running.set()
+
+    def reset(self) -> None:
+        """Clears a previous pause or cancel before the next collection.
+
+        Called by whoever starts the collection, before it starts, so that
+        a cancel made in between is not lost.
+        """
+
+        self._cancelled.clear()
+        self._running.set()
+
+    def _drain(self) -> None:
+        """Discards the readings that built up while nothing was recorded."""
+
+        self.live.write(*self._peripheral.read_sensors_batch(
+            300, timeout=600 / self._peripheral.SAMPLE_RATE))
+
+    def _idle(self, seconds: float) -> bool:
+        """Keeps reading for display only, without recording.
+
+        Args:
+            seconds:
+                The number of seconds to read for.
+
+        Returns:
+            Whether the collection was cancelled meanwhile.
+        """
+
+        deadline = time.monotonic() + seconds
+        while not self._cancelled.is_set():
+            if time.monotonic() >= deadline:
+                break
+            # Whole intervals, so the last read does not time out at once
+            self.live.write(*self._peripheral.read_sensors_batch(
+                self._peripheral.SAMPLE_RATE, timeout=PROGRESS_INTERVAL))
+        return self._cancelled.is_set()
 
     def get_available_peripherals(self) -> List[str]:
         """Initialises a BluetoothHandler and gets the available peripherals.
@@ -77,63 +175,128 @@ class DataCollector:
         return self._peripheral is not None
 
     def collect_data(self) -> None:
-        """Collects and saves the required data."""
+        """Collects and saves the required data.
+
+        Returns early without saving anything if cancel() is called.
+        """
         
         # Setting up output lists
         inputs = []
         targets = []
         timestamps = []
+        gaps = []
+
+        # Capture the raw notifications alongside the CSV if required
+        recorder = None
+        if self._capture_dir is not None:
+            recorder = capture.CaptureRecorder(self._capture_dir)
+            self._peripheral.set_recorder(recorder)
+
+        try:
+            # Main data collection loop
+            total = self._num_sets * len(self._gestures) * self._num_reps
+            for _ in range(self._num_sets):
+                # Repeat num_sets times
+                for idx, gesture in enumerate(self._gestures):
+                    # For each gesture,
+                    # Display gesture name, and give the user a second to make
+                    # it
+                    print(f"Current gesture: {gesture}")
+                    self._controller.update_text(gesture)
+                    if self._idle(1):
+                        break
+
+                    # Clear up the old sensor data
+                    self._drain()
+
+                    print("Recording now")
+
+                    # Collect data for given gesture
+                    rep_count = 0
+                    while rep_count < self._num_reps:
+                        if not self._running.is_set():
+                            # Hold here while paused, still showing the
+                            # readings, then skip what arrived
+                            while not self._running.is_set():
+                                self._idle(PROGRESS_INTERVAL)
+                            if self._cancelled.is_set():
+                                break
+                            self._drain()
+
+                        # Read up to the remaining reps, returning often enough
+                        # to report progress and notice a pause
+                        num_gaps = len(self._peripheral.gaps)
+                        sensor_inputs, arrival_times = \
+                            self._peripheral.read_sensors_batch(
+                                self._num_reps - rep_count,
+                                timeout=PROGRESS_INTERVAL)
+                        self.live.write(sensor_inputs, arrival_times)
+
+                        # Record any gap that closed during this read against
+                        # the row it precedes
+                        for gap in self._peripheral.gaps[num_gaps:]:
+                            gaps.append([len(inputs), *gap])
+
+                        # Update targets
+                        num_read = len(sensor_inputs)
+                        targets.extend([idx, gesture] for _ in range(num_read))
+
+                        # Update inputs as lists
+                        inputs.extend(sensor_inputs.tolist())
+
+                        # Update timestamps, converting the arrival times to
+                        # wall clock time
+                        now = datetime.now()
+                        now_ns = time.monotonic_ns()
+                        timestamps.extend(
+                            str(now - timedelta(
+                                microseconds=(now_ns - t) / 1000))
+                            for t in arrival_times.tolist())
+
+                        # Increment counter
+                        rep_count += num_read
+                        self._controller.update_progress(len(inputs), total)
+
+                    if self._cancelled.is_set():
+                        break
+                    print("gesture completed")
+                    if self._idle(1):
+                        break
+                if self._cancelled.is_set():
+                    break
+        except ssp.ReconnectFailedError:
+            # Keep the rows collected before the glove was lost
+            partial_filepath = self._filepath.rsplit(".csv", 1)[0] \
+                + "_partial.csv"
+            self._save_csv(inputs, targets, timestamps, partial_filepath)
+            if gaps:
+                self._save_gaps_csv(gaps, partial_filepath)
+            print(f"glove lost, saved the {len(inputs)} rows collected to "
+                  f"{partial_filepath}")
+            raise
+        finally:
+            # Stop capturing
+            if recorder is not None:
+                self._peripheral.set_recorder(None)
+                recorder.close()
+
+        if self._cancelled.is_set():
+            print("collection cancelled")
+            return
 
-        # Main data collection loop
-        for _ in range(self._num_sets):
-            # Repeat num_sets times
-            for idx, gesture in enumerate(self._gestures):
-                # For each gesture,
-                # Display gesture name
-                print(f"Current gesture: {gesture}")
-                self._controller.update_text(gesture)
-                time.sleep(1)
-
-                # Clear up the old sensor data
-                for _ in range(300):
-                    self._peripheral.read_sensors()
-
-                print("Recording now")
-
-                # Collect data for given gesture
-                rep_count = 0
-                while rep_count < self._num_reps:
-                    # For each rep,
-                    # Read sensors
-                    sensor_input = self._peripheral.read_sensors()
-
-                    # Check if input is a valid rep
-                    if sensor_input is None:
-                        continue # If invalid, skip
-                    
-                    # Update targets
-                    targets.append([idx, gesture])
-
-                    # Update inputs as lists
-                    inputs.append(sensor_input.tolist())
-
-                    # Update timestamp
-                    timestamps.append(str(datetime.now()))
-
-                    # Increment counter
-                    rep_count += 1
-                
-                print("gesture completed")
-                time.sleep(1)
-        
         # Save the collected data as a CSV file
         self._save_csv(inputs, targets, timestamps)
 
+        # Save where data is missing, if the link dropped while recording
+        if gaps:
+            self._save_gaps_csv(gaps)
+
 
     def _save_csv(self,
                   input_data: List[List[float]],
                   target_data: List[List[str]],
-                  timestamps: List[str]) -> None:
+                  timestamps: List[str],
+                  filepath: Optional[str] = None) -> None:
         """Creates a csv file to store the collected data.
         
         Args:
@@ -149,6 +312,9 @@ class DataCollector:
             timestamps:
                 A list of all the timestamps corresponding to the data
                 collected.
+
+            filepath:
+                The path to write to, by default the collector's.
         """
         
         # Generate headers
@@ -159,7 +325,7 @@ class DataCollector:
         headers.append("timestamp")
 
         # Write to given file path
-        with open(f"{self._filepath}", "w+") as data_file:
+        with open(filepath or self._filepath, "w+") as data_file:
             # Instantiate csv writer
             csv_writer = csv.writer(data_file)
 
@@ -167,9 +333,41 @@ class DataCollector:
             csv_writer.writerow(headers)
 
             # Write for each sample
-            total_num_samples = self._num_reps * self._num_sets * len(self._gestures)
-            for i in range(total_num_samples):
+            for i in range(len(input_data)):
                 # Each row comprises the index and name of the gesture,
                 # followed by the sensors, and then the timestamp
                 row = [*target_data[i], *input_data[i], timestamps[i]]
-                csv_writer.writerow(row)
\ No newline at end of file
+                csv_writer.writerow(row)
+
+    def _save_gaps_csv(self,
+                       gaps: List[List],
+                       filepath: Optional[str] = None) -> None:
+        """Creates a csv file recording where the collected data has gaps.
+
+        The file is stored next to the data file, with "_gaps" appended to
+        its name.
+
+        Args:
+            gaps:
+                A list of all the gaps, each of which is a list containing
+                the index of the first row of collected data after the gap,
+                followed by the fields of the corresponding Gap.
+            filepath:
+                The path of the data file the gaps belong to, by default the
+                collector's.
+        """
+
+        # Generate headers
+        headers = ["row",
+                   "started_at",
+                   "duration",
+                   "lost_frames",
+                   "frame_index"]
+
+        # Write next to the data file
+        gaps_filepath = (filepath or self._filepath).rsplit(".csv", 1)[0] \
+            + "_gaps.csv"
+        with open(gaps_filepath, "w+") as gaps_file:
+            csv_writer = csv.writer(gaps_file)
+            csv_writer.writerow(headers)
+            csv_writer.writerows(gaps)
@@ -0,0 +1,129 @@
+"""A ring of the most recent sensor readings, for live display."""
+
+import time
+from typing import Optional, Tuple
+
+import numpy as np
+
+class LiveBuffer:
+    """Keeps the latest readings in preallocated arrays.
+
+    One thread writes every batch it reads from the glove, and another, like
+    the GUI, takes copies of the newest readings whenever it likes. The
+    writer never waits for the reader: the count of frames written is only
+    advanced once a batch is in place, and the capacity leaves room for
+    a write to land while the reader copies, as long as the reader takes
+    fewer than capacity minus the largest batch written.
+
+    Args:
+        num_sensors:
+            The number of sensors in each reading.
+        capacity:
+            The number of readings kept.
+
+    Attributes:
+        frames_written:
+            The total number of readings written so far.
+    """
+
+    def __init__(self, num_sensors: int, capacity: int = 1024):
+        self._frames = np.zeros((capacity, num_sensors))
+        self._timestamps = np.zeros(capacity, dtype=np.int64)
+        self.frames_written: int = 0
+
+    @property
+    def num_sensors(self) -> int:
+        """The number of sensors in each reading."""
+
+        return self._frames.shape[1]
+
+    @property
+    def capacity(self) -> int:
+        """The number of readings kept."""
+
+        return len(self._frames)
+
+    def write(self, frames: np.ndarray, timestamps_ns: np.ndarray) -> None:
+        """Adds readings after the newest ones, overwriting the oldest.
+
+        Args:
+            frames:
+                An array of shape (n, num_sensors) of readings, oldest first.
+            timestamps_ns:
+                An int64 array of shape (n,) of the time.monotonic_ns() at
+                which each reading arrived.
+        """
+
+        num_frames = len(frames)
+        capacity = self.capacity
+        if num_frames > capacity:
+            # Only the newest capacity readings would survive
+            frames = frames[-capacity:]
+            timestamps_ns = timestamps_ns[-capacity:]
+        head = (self.frames_written + num_frames - len(frames)) % capacity
+
+        # Up to the end of the arrays, then around to the start
+        first = min(len(frames), capacity - head)
+        self._frames[head:head + first] = frames[:first]
+        self._timestamps[head:head + first] = timestamps_ns[:first]
+        self._frames[:len(frames) - first] = frames[first:]
+        self._timestamps[:len(frames) - first] = timestamps_ns[first:]
+
+        self.frames_written += num_frames
+
+    def latest(self,
+               num_frames: int,
+               out: Optional[np.ndarray] = None,
+               out_timestamps: Optional[np.ndarray] = None
+               ) -> Tuple[np.ndarray, np.ndarray]:
+        """Copies the newest readings.
+
+        Args:
+            num_frames:
+                The most readings to copy. Fewer are copied if fewer have
+                been written.
+            out:
+                An optional array of shape (num_frames, num_sensors) to copy
+                the readings into, so that repeated calls do not allocate.
+            out_timestamps:
+                An optional int64 array of shape (num_frames,) to copy their
+                arrival times into.
+
+        Returns:
+            A tuple of an array of shape (n, num_sensors) of the newest n
+            readings, oldest first, and an int64 array of shape (n,) of
+            their arrival times. Both are views of the output arrays.
+        """
+
+        if out is None:
+            out = np.empty((num_frames, self.num_sensors))
+        if out_timestamps is None:
+            out_timestamps = np.empty(num_frames, dtype=np.int64)
+
+        written = self.frames_written
+        num_frames = min(num_frames, written, self.capacity)
+        start = (written - num_frames) % self.capacity
+
+        # From start to the end of the arrays, then around from the start
+        first = min(num_frames, self.capacity - start)
+        out[:first] = self._frames[start:start + first]
+        out_timestamps[:first] = self._timestamps[start:start + first]
+        out[first:num_frames] = self._frames[:num_frames - first]
+        out_timestamps[first:num_frames] = \
+            self._timestamps[:num_frames - first]
+
+        return out[:num_frames], out_timestamps[:num_frames]
+
+    def rate(self, window: float = 1.0) -> float:
+        """The number of readings that arrived per second over the last
+        window seconds, so it falls to 0 when the stream stops.
+
+        Args:
+            window:
+                The number of seconds to count readings over. At most
+                capacity readings are counted.
+        """
+
+        # Slots not yet written hold 0, older than any window
+        since_ns = time.monotonic_ns() - int(window * 1e9)
+        return np.count_nonzero(self._timestamps > since_ns) / window
@@ -1,6 +1,8 @@
-import binascii
+import time
 import numpy as np
 from bluepy import btle
+from typing import Optional
+from src import timing
 
 class StretchSenseDelegate(btle.DefaultDelegate):
     """Handles notifications from the glove
@@ -12,11 +14,22 @@ class StretchSenseDelegate(btle.DefaultDelegate):
         capacitance:
             A numpy array used to store the capacitance data read from the
             stretchsense peripheral.
+        timestamp_ns:
+            The time.monotonic_ns() at which the latest notification arrived.
+        timings:
+            The StageTimings the decode time is recorded into, or None to
+            disable timing.
+        recorder:
+            The CaptureRecorder every raw notification is passed to, or None
+            to disable capturing.
     """
 
     def __init__(self):
         super().__init__()
         self.capacitance: np.ndarray
+        self.timestamp_ns: int = 0
+        self.timings: Optional[timing.StageTimings] = None
+        self.recorder = None
 
     def handleNotification(self, cHandle, data) -> None:
         """Implementation of the handleNotification method in DefaultDelegate.
@@ -26,20 +39,34 @@ class StretchSenseDelegate(btle.DefaultDelegate):
 
         Args:
             cHandle:
-                Unused parameter.
+                The handle of the characteristic that sent the data. Only
+                used when capturing.
             data:
                 Bytestring data from glove's sensors.
         """
 
-        # Convert the bytestring into hexadecimal
-        hex_vals = (binascii.b2a_hex(data))
+        # Stamp the arrival time before any processing
+        self.timestamp_ns = time.monotonic_ns()
 
-        # Split into individual integer values
-        split_vals = np.array([int(hex_vals[i:i + 4], 16) / 10 
-                               for i in range(0, len(hex_vals), 4)])
+        # Keep the raw notification if capturing
+        recorder = self.recorder
+        if recorder is not None:
+            recorder.record(cHandle, data, self.timestamp_ns)
+
+        # Read the bytestring as big endian 16 bit integers, which is the
+        # same as splitting its hexadecimal into groups of 4 digits. A
+        # trailing odd byte is a group of 2 digits, so pad it to 16 bits.
+        if len(data) % 2:
+            data = data[:-1] + b'\x00' + data[-1:]
+        split_vals = np.frombuffer(data, dtype='>u2') / 10
 
         # Use numpy array magic to remove all zero entries
         capacitance = split_vals[split_vals != 0]
 
         # Store values in self.capacitance
-        self.capacitance = capacitance
\ No newline at end of file
+        self.capacitance = capacitance
+
+        # Record how long decoding took
+        timings = self.timings
+        if timings is not None:
+            timings.record("decode", time.monotonic_ns() - self.timestamp_ns)
\ No newline at end of file
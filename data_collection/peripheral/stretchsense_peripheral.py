@@ -1,11 +1,44 @@
 """Classes that encapsulate a single Stretchsense peripheral."""
 
+import time
+from datetime import datetime
 from bluepy import btle
 from abc import ABC
 import numpy as np
 import yaml
 from . import stretchsense_delegate
-from typing import Optional
+from typing import List, NamedTuple, Optional, Tuple
+from src import timing
+
+class ReconnectFailedError(Exception):
+    """Raised when a dropped peripheral cannot be reconnected to."""
+
+    def __init__(self, address: str, attempts: int):
+        super().__init__(f"could not reconnect to {address} "
+                         f"after {attempts} attempts")
+
+class Gap(NamedTuple):
+    """A period during which no data was received from the peripheral.
+
+    Attributes:
+        started_at:
+            A string containing the wall clock time of the last notification
+            received before the link dropped, in the same format as the
+            timestamps written by the DataCollector.
+        duration:
+            The number of seconds between the last notification before the
+            drop and the first notification after the reconnect.
+        lost_frames:
+            The estimated number of frames the peripheral would have sent
+            during the gap at its configured sampling rate.
+        frame_index:
+            The number of frames received before the gap started.
+    """
+
+    started_at: str
+    duration: float
+    lost_frames: int
+    frame_index: int
 
 class StretchSensePeripheral(btle.Peripheral, ABC):
     """An abstract class providing a blueprint for concrete peripherals.
@@ -17,13 +50,49 @@ class StretchSensePeripheral(btle.Peripheral, ABC):
     Attributes:
         NUM_SENSORS:
             An integer representing the number of sensors on the glove.
+        SAMPLE_RATE:
+            The sampling rate in Hz the glove is set to in setup().
+        SILENCE_TIMEOUT:
+            The number of seconds without a notification after which the
+            link is treated as dropped even if no disconnect was reported.
+        MAX_RECONNECT_ATTEMPTS:
+            The number of reconnect attempts made before giving up.
+        INITIAL_BACKOFF:
+            The number of seconds to wait after the first failed reconnect
+            attempt. Doubles after every failed attempt.
+        MAX_BACKOFF:
+            The upper limit in seconds of the wait between attempts.
+        gaps:
+            A list of Gap objects, one for every time the link dropped and
+            was reconnected.
+        frames_received:
+            The total number of notifications received from the glove.
+        frames_dropped:
+            The number of notifications discarded for not having
+            NUM_SENSORS readings.
+        timeouts:
+            The number of waits that timed out without a notification.
+        timings:
+            The StageTimings the notification wait time is recorded into, or
+            None to disable timing. Set with set_timings().
     """
 
+    SAMPLE_RATE: int = 90
+    SILENCE_TIMEOUT: float = 3.0
+    MAX_RECONNECT_ATTEMPTS: int = 10
+    INITIAL_BACKOFF: float = 0.5
+    MAX_BACKOFF: float = 8.0
+
     def __init__(self, address: str):
         super().__init__(address, "random")
 
         # Attributes
         self.NUM_SENSORS: int
+        self.gaps: List[Gap] = []
+        self.frames_received: int = 0
+        self.frames_dropped: int = 0
+        self.timeouts: int = 0
+        self.timings: Optional[timing.StageTimings] = None
 
         # The peripheral's service uuid
         self._SERVICE_UUID: str
@@ -34,6 +103,34 @@ class StretchSensePeripheral(btle.Peripheral, ABC):
         # Bluetooth address of this peripheral
         self._address: str = address
 
+        # Connection supervision state
+        self._last_notification: float = time.monotonic()
+        self._silent_since: float = self._last_notification
+        self._last_notification_wall: str = str(datetime.now())
+        self._gap_open: bool = False
+
+    def set_timings(self, timings: Optional[timing.StageTimings]) -> None:
+        """Enables timing of this peripheral and its delegate.
+
+        Args:
+            timings:
+                The StageTimings to record into, or None to disable timing.
+        """
+
+        self.timings = timings
+        self._delegate.timings = timings
+
+    def set_recorder(self, recorder) -> None:
+        """Captures every raw notification from this peripheral.
+
+        Args:
+            recorder:
+                The CaptureRecorder to pass notifications to, or None to
+                stop capturing.
+        """
+
+        self._delegate.recorder = recorder
+
     def setup(self) -> None:
         """Sets up the glove for data collection."""
 
@@ -49,7 +146,7 @@ class StretchSensePeripheral(btle.Peripheral, ABC):
         self.writeCharacteristic(handle + 1, b'\x01\x00')
 
         # change sampling rate to 90Hz
-        self.writeCharacteristic(29, b'\x5a')
+        self.writeCharacteristic(29, self.SAMPLE_RATE.to_bytes(1, "big"))
         
     def read_sensors(self) -> Optional[np.ndarray]:
         """Gets a sample of capacitance data.
@@ -58,18 +155,207 @@ class StretchSensePeripheral(btle.Peripheral, ABC):
         of 1 second. Then retrieves the capacitatance data from
         the delegate and returns it if it is a valid data set.
 
+        If the link drops, or no notification has arrived for
+        SILENCE_TIMEOUT seconds, the glove is reconnected and
+        set up again before returning None. The missing period is recorded
+        in the gaps list once the stream resumes.
+
         Returns:
             A numpy array with n capacitance readings where n = the number of
             sensors on the glove or None.
+
+        Raises:
+            ReconnectFailedError if the glove cannot be reconnected to.
         """
 
-        if self.waitForNotifications(1.0):
-            # Read capacitance values from delegate
-            cap = self._delegate.capacitance
-            
-            # Return values if it has the correct dimensions
+        timings = self.timings
+        if timings is not None:
+            start_ns = time.monotonic_ns()
+
+        try:
+            notified = self.waitForNotifications(1.0)
+        except btle.BTLEDisconnectError:
+            # Link dropped, reconnect and resume the stream
+            self._reconnect()
+            return None
+
+        if timings is not None:
+            timings.record("ble_wait", time.monotonic_ns() - start_ns)
+
+        if not notified:
+            self.timeouts += 1
+            self._check_silence()
+            return None
+
+        # Record the notification, closing any open gap
+        self._on_notification()
+
+        # Read capacitance values from delegate
+        cap = self._delegate.capacitance
+        
+        # Return values if it has the correct dimensions
+        if len(cap) == self.NUM_SENSORS:
+            return cap
+        self.frames_dropped += 1
+
+    def read_sensors_batch(self,
+                           max_frames: int,
+                           timeout: float = 0.0,
+                           out: Optional[np.ndarray] = None,
+                           out_timestamps: Optional[np.ndarray] = None
+                           ) -> Tuple[np.ndarray, np.ndarray]:
+        """Gets every pending sample of capacitance data in one call.
+
+        Keeps taking notifications until max_frames valid samples have
+        been read, or until no notification arrives before the timeout
+        runs out. With the default timeout of 0, only the notifications
+        already waiting are read.
+
+        If the link drops, the glove is reconnected and the samples read
+        so far are returned. A call with a timeout that reads nothing
+        reconnects if no notification has arrived for SILENCE_TIMEOUT
+        seconds, however short the calls' timeouts are.
+
+        Args:
+            max_frames:
+                The maximum number of samples to read.
+            timeout:
+                The number of seconds from the start of the call after which
+                no more notifications are waited for.
+            out:
+                An optional array of shape (max_frames, NUM_SENSORS) to read
+                the samples into, so that repeated calls do not allocate.
+            out_timestamps:
+                An optional int64 array of shape (max_frames,) to read the
+                arrival times into.
+
+        Returns:
+            A tuple of an array of shape (n, NUM_SENSORS) containing the n
+            samples read, and an int64 array of shape (n,) containing the
+            time.monotonic_ns() at which each sample arrived. Both are views
+            of the output arrays.
+
+        Raises:
+            ReconnectFailedError if the glove cannot be reconnected to.
+        """
+
+        # Preallocate the outputs
+        if out is None:
+            out = np.empty((max_frames, self.NUM_SENSORS))
+        if out_timestamps is None:
+            out_timestamps = np.empty(max_frames, dtype=np.int64)
+
+        delegate = self._delegate
+        deadline = time.monotonic() + timeout
+        num_frames = 0
+        while num_frames < max_frames:
+            remaining = max(0.0, deadline - time.monotonic())
+            try:
+                notified = self.waitForNotifications(remaining)
+            except btle.BTLEDisconnectError:
+                # Link dropped, reconnect and return what was read
+                self._reconnect()
+                break
+
+            if not notified:
+                if num_frames == 0 and timeout > 0:
+                    self.timeouts += 1
+                    self._check_silence()
+                break
+
+            self._on_notification()
+
+            # Keep the sample if it has the correct dimensions
+            cap = delegate.capacitance
             if len(cap) == self.NUM_SENSORS:
-                return cap
+                out[num_frames] = cap
+                out_timestamps[num_frames] = delegate.timestamp_ns
+                num_frames += 1
+            else:
+                self.frames_dropped += 1
+
+        return out[:num_frames], out_timestamps[:num_frames]
+
+    @property
+    def address(self) -> str:
+        """The Bluetooth address of this peripheral."""
+
+        return self._address
+
+    @property
+    def last_notification_ns(self) -> int:
+        """The time.monotonic_ns() at which the latest notification arrived."""
+
+        return self._delegate.timestamp_ns
+
+    def _on_notification(self) -> None:
+        """Updates the supervision state after a notification is received."""
+
+        now = time.monotonic()
+
+        if self._gap_open:
+            # First notification after a reconnect, so record the gap
+            duration = now - self._last_notification
+            lost_frames = max(0, round(duration * self.SAMPLE_RATE) - 1)
+            self.gaps.append(Gap(self._last_notification_wall,
+                                 duration,
+                                 lost_frames,
+                                 self.frames_received))
+            self._gap_open = False
+            print(f"stream resumed after {duration:.2f}s gap, "
+                  f"~{lost_frames} frames lost")
+
+        self._silent_since = now
+        self._last_notification = now
+        self._last_notification_wall = str(datetime.now())
+        self.frames_received += 1
+
+    def _check_silence(self) -> None:
+        """Treats a long enough silence as a dropped link, going by the time
+        since the last notification rather than the number of reads that
+        timed out, so that reads with short timeouts do not reconnect early.
+
+        Raises:
+            ReconnectFailedError if the glove cannot be reconnected to.
+        """
+
+        if time.monotonic() - self._silent_since >= self.SILENCE_TIMEOUT:
+            self._reconnect()
+
+    def _reconnect(self) -> None:
+        """Reconnects to the glove with exponential backoff.
+
+        Raises:
+            ReconnectFailedError if every attempt fails.
+        """
+
+        print(f"lost connection to {self._address}, reconnecting")
+        self._gap_open = True
+
+        delay = self.INITIAL_BACKOFF
+        for attempt in range(1, self.MAX_RECONNECT_ATTEMPTS + 1):
+            # Tear down what is left of the old connection
+            try:
+                self.disconnect()
+            except btle.BTLEException:
+                pass
+
+            try:
+                # Reconnect and turn notifications back on
+                self.connect(self._address, "random")
+                self.setup()
+                print(f"reconnected to {self._address} "
+                      f"(attempt {attempt})")
+                self._silent_since = time.monotonic()
+                return
+            except btle.BTLEException as err:
+                print(f"reconnect attempt {attempt} failed: {err}")
+
+            # Wait before trying again
+            time.sleep(delay)
+            delay = min(delay * 2, self.MAX_BACKOFF)
+
+        raise ReconnectFailedError(self._address, self.MAX_RECONNECT_ATTEMPTS)
             
 class StretchSenseGlove(StretchSensePeripheral):
     """Represents a particular Stretchsense glove."""
@@ -81,4 +367,4 @@ class StretchSenseGlove(StretchSensePeripheral):
         self._SERVICE_UUID: str = '00001701-7374-7265-7563-6873656e7365'
         with open("src/config.yaml") as config:
             configyaml = yaml.load(config, Loader=yaml.loader.FullLoader)
-            self.NUM_SENSORS: int = configyaml["general"]["num_sensors"]
\ No newline at end of file
+            self.NUM_SENSORS: int = configyaml["general"]["num_sensors"]
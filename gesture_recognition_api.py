@@ -1,11 +1,25 @@
 """Contains the API to read and return gesture commands."""
 
+import copy
+import logging
+import time
+import numpy as np
 import torch
-from typing import List
+from threading import Event, Thread
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
 
 import yaml
-from src.models import feed_forward
+from src import artifact
+from src import change_detector
+from src import filters
+from src import inference
+from src import prediction_cache
+from src import registry
+from src import timing
 from data_collection.peripheral import bluetooth_handler
+from data_collection.peripheral import stretchsense_peripheral as ssp
+
+logger = logging.getLogger(__name__)
 
 class NoPeripheralFoundError(Exception):
     """Raised when there is no peripheral to connect to."""
@@ -13,8 +27,82 @@ class NoPeripheralFoundError(Exception):
     def __init__(self):
         super().__init__()
 
+class StampedGesture(NamedTuple):
+    """A predicted gesture with the times it passed through the pipeline.
+
+    Attributes:
+        index:
+            The index of the predicted gesture in the gesture list.
+        notified_ns:
+            The time.monotonic_ns() at which the BLE notification the
+            prediction was made from arrived.
+        predicted_ns:
+            The time.monotonic_ns() at which the prediction was made.
+    """
+
+    index: int
+    notified_ns: int
+    predicted_ns: int
+
 class API:
-    """API that gets input from user and outputs predicted gesture."""
+    """API that gets input from user and outputs predicted gesture.
+
+    Args:
+        num_threads:
+            The number of threads torch uses for inference, or None to leave
+            torch's default. This setting is process wide.
+        warmup_runs:
+            The number of predictions run on each model when it is loaded so
+            the first real prediction does not pay lazy initialisation costs.
+        max_loaded_models:
+            The maximum number of models kept loaded for use_model().
+        artifact_path:
+            The path of a model artifact to load in setup() instead of the
+            model named in the config file. The artifact carries its own
+            gesture list, so the config file is not read.
+    """
+
+    def __init__(self,
+                 num_threads: Optional[int] = 1,
+                 warmup_runs: int = 100,
+                 max_loaded_models: int = 4,
+                 artifact_path: Optional[str] = None):
+        self._artifact_path: Optional[str] = artifact_path
+
+        # The loaded models, and the one currently used for predictions.
+        # Swapping the active model is a single reference assignment, and
+        # every prediction reads it once, so a prediction never mixes the
+        # model of one entry with the gestures of another.
+        self._registry = registry.ModelRegistry(max_loaded_models,
+                                                num_threads=num_threads,
+                                                warmup_runs=warmup_runs)
+        self._active: registry.LoadedModel
+
+        # Per-stage timings, None while disabled
+        self._timings: Optional[timing.StageTimings] = None
+
+        # Set to stop the periodic stats log
+        self._stop_log = Event()
+
+        # Output buffers for predict_batch, grown as needed
+        self._batch_probs: Optional[torch.Tensor] = None
+        self._batch_confidences: Optional[torch.Tensor] = None
+        self._batch_indices: Optional[torch.Tensor] = None
+
+        # The model output, gesture index and gesture list of the latest
+        # prediction, swapped in as one tuple so readers on other threads
+        # see a consistent set
+        self._last_prediction: Optional[
+            Tuple[torch.Tensor, int, List[str]]] = None
+
+        # Cache of predictions for rounded readings, None while disabled
+        self._cache: Optional[prediction_cache.PredictionCache] = None
+
+        # Skips the model until the hand settles, None while disabled
+        self._gate: Optional[change_detector.GatedPredictor] = None
+
+        # Filters every frame read, None while no filter is set
+        self._filter: Optional[filters.StreamingFilter] = None
 
     def setup(self) -> None:
         """Prepares for gesture recognition.
@@ -27,11 +115,8 @@ class API:
         # Attempt to connect to peripheral
         if self._connect_peripheral():
             # If peripheral connected, 
-            # Load the trained model
+            # Load the trained model along with its list of gestures
             self._load_model()
-
-            # Load the list of gestures
-            self._load_gestures()
         else:
             # If no peripheral connected, raise error
             raise NoPeripheralFoundError()
@@ -56,61 +141,503 @@ class API:
     def _load_model(self) -> None:
         """Gets the trained model.
         
-        Instantiate a specified model and load its parameters from a specified
-        .pth file from the trained_models directory.
+        Loads the model named in the config file from the trained_models
+        directory, along with the list of gestures and the filter in the
+        config file, and makes it the active model. A filter recorded in the
+        model's artifact is used over the config file's. If an artifact path
+        was given, loads that instead without reading the config file.
         """
 
-        # Get params from config file
-        num_sensors = 0
-        num_gestures = 0
-        learning_cap = 0
-        modelpath = ""
+        if self._artifact_path is not None:
+            self.use_artifact(self._artifact_path)
+            return
+
+        # Get the model name and gestures from config file
         with open("src/config.yaml") as config:
             configyaml = yaml.load(config, Loader=yaml.loader.FullLoader)
+            name = configyaml["filenames"]["trained_model"]
+            gestures = configyaml["general"]["gestures"]
+            filter_config = filters.FilterConfig.from_dict(
+                configyaml.get("filter"))
 
-            num_sensors = configyaml["general"]["num_sensors"]
-            num_gestures = len(configyaml["general"]["gestures"])
-            learning_cap = configyaml["hyperparams"]["learning_capacity"]
-            modelpath = f"trained_models/{configyaml['filenames']['trained_model']}.pth"
+        # A filter recorded in the model's artifact takes precedence
+        self.use_filter(filter_config)
+        self.use_model(name, gestures)
 
-        # Instantiate model
-        model = feed_forward.FeedForwardModel(num_sensors,
-                                            num_gestures,
-                                            learning_cap)
+    def use_model(self,
+                  name: str,
+                  gestures: Optional[List[str]] = None,
+                  data_path: Optional[str] = None) -> None:
+        """Switches the model used for predictions.
 
-        # Load in parameters from trained model
-        model.load_state_dict(torch.load(modelpath))
+        Loads the model if it is not already loaded. The switch is atomic:
+        a prediction in progress finishes with the old model, and the next
+        one uses the new model. The peripheral stays connected. If the
+        model's artifact records the filter its training data went through,
+        that filter is used too, as with use_artifact().
 
-        # Return the model
-        self._model = model
+        Args:
+            name:
+                The name of the model's file in the trained_models directory,
+                without the extension. An artifact is preferred over a .pth
+                file.
+            gestures:
+                The list of gestures the model was trained with. If not
+                given, it is read from the model's artifact, or from the
+                data file with the same name.
+            data_path:
+                The data file a .pth model was trained on, if it is not
+                named after the model, to read the gestures from.
 
-    def _load_gestures(self) -> None:
-        """Gets the list of gestures the model was trained with."""
+        Raises:
+            ValueError if the gestures do not match the model, or none are
+            given for a .pth model and it has no data file, or if the model
+            keeps state across frames while caching or gating is enabled.
+        """
 
-        # Getting list from config file
-        gestures = []
-        with open("src/config.yaml") as config:
-            configyaml = yaml.load(config, Loader=yaml.loader.FullLoader)
-            gestures = configyaml["general"]["gestures"]
+        self._activate(self._registry.get(name, gestures, data_path))
+        self._use_recorded_filter()
+
+    def use_artifact(self, path: str) -> None:
+        """Switches to a model saved as an artifact.
+
+        The artifact's weights are memory-mapped and its gesture list is
+        used, so no config or data file is read. If the artifact records
+        the filter its training data went through, that filter is used too.
+        The switch is atomic, as with use_model().
+
+        Args:
+            path:
+                The path of the artifact file.
+
+        Raises:
+            ValueError if the model keeps state across frames while caching
+            or gating is enabled.
+        """
+
+        self._activate(self._registry.get_artifact(path))
+        self._use_recorded_filter()
+
+    def _activate(self, loaded: registry.LoadedModel) -> None:
+        """Makes a loaded model the active one, unless it keeps state
+        across frames and the prediction cache or gating, which skip
+        frames, is enabled."""
+
+        if self._cache is not None:
+            self._check_stateless("caching", loaded.model)
+        if self._gate is not None:
+            self._check_stateless("gating", loaded.model)
+        self._active = loaded
+
+    def _use_recorded_filter(self) -> None:
+        """Switches to the filter the active model's artifact records its
+        training data went through, if it records one."""
+
+        if "filter" in self._active.metadata:
+            self.use_filter(filters.FilterConfig.from_dict(
+                self._active.metadata["filter"]))
+
+    def use_filter(self, config: filters.FilterConfig) -> None:
+        """Sets the filter every frame read from the glove goes through.
+
+        The filter should match the one the model's training data went
+        through, which is the filter section of the config file, so setup()
+        sets it from there. Its state restarts from the next frame read.
+
+        Args:
+            config:
+                The FilterConfig to filter with. One that leaves readings
+                unchanged turns filtering off.
+        """
+
+        if config.enabled:
+            self._filter = filters.StreamingFilter(
+                self._peripheral.NUM_SENSORS, config)
+        else:
+            self._filter = None
+
+    def enroll_gesture(self, name: str, num_frames: int = 90) -> int:
+        """Teaches the active model a new gesture from the glove.
+
+        Reads num_frames frames while the gesture is held and adds them to
+        the model, or to the gesture if the model already knows it. Only
+        models with an enroll() method, like the NearestCentroidModel,
+        support this. The gesture is enrolled into a copy of the model,
+        which is then swapped in atomically like use_model(), so a
+        prediction never mixes the old model with the new gesture list. The
+        copy is not saved unless save_artifact() is called.
+
+        Args:
+            name:
+                The name of the gesture.
+            num_frames:
+                The number of frames to enroll the gesture from.
+
+        Returns:
+            The index of the gesture.
+
+        Raises:
+            ValueError if the active model does not support enrollment.
+        """
+
+        active = self._active
+        if not hasattr(active.model, "enroll"):
+            raise ValueError(f"{type(active.model).__name__} cannot enroll "
+                             f"gestures")
+
+        # Read the frames of the held gesture
+        frames = np.empty((num_frames, self._peripheral.NUM_SENSORS),
+                          dtype=np.float32)
+        num_read = 0
+        while num_read < num_frames:
+            batch, _ = self._peripheral.read_sensors_batch(
+                num_frames - num_read, timeout=1.0, out=frames[num_read:])
+            num_read += len(batch)
+        stream_filter = self._filter
+        if stream_filter is not None:
+            frames = stream_filter.process(frames).astype(np.float32)
+
+        gestures = list(active.gestures)
+        index = gestures.index(name) if name in gestures else None
+        model = copy.deepcopy(active.model)
+        index = model.enroll(frames, index)
+        if index == len(gestures):
+            gestures.append(name)
+
+        session = inference.InferenceSession(model,
+                                             self._peripheral.NUM_SENSORS,
+                                             num_threads=None)
+        self._active = active._replace(gestures=gestures,
+                                       model=model,
+                                       session=session)
+        return index
+
+    def save_artifact(self, path: str) -> None:
+        """Saves the active model, with its gesture list, as an artifact."""
+
+        active = self._active
+        stream_filter = self._filter
+        filter_config = (stream_filter.config if stream_filter is not None
+                         else filters.FilterConfig())
+        artifact.save(path, active.model, active.gestures,
+                      metadata={"saved_from": active.path,
+                                "filter": filter_config._asdict()})
+
+    @property
+    def model_name(self) -> str:
+        """The name of the model used for predictions."""
+
+        return self._active.name
+
+    def enable_stats(self, log_interval: Optional[float] = None) -> None:
+        """Starts timing every stage of reading a gesture.
+
+        Times the notification wait and decode in the peripheral, and the
+        drain of old readings, tensor build, forward pass and argmax here.
+        Must be called after setup().
+
+        Args:
+            log_interval:
+                If given, the number of seconds between log lines
+                summarising the timings.
+        """
+
+        self._timings = timing.StageTimings()
+        self._peripheral.set_timings(self._timings)
+
+        if log_interval is not None:
+            self._stop_log.clear()
+            Thread(target=self._log_stats,
+                   args=(log_interval,),
+                   daemon=True).start()
+
+    def disable_stats(self) -> None:
+        """Stops timing and stops the periodic log."""
+
+        self._timings = None
+        self._peripheral.set_timings(None)
+        self._stop_log.set()
+
+    def enable_cache(self,
+                     resolution: float = 1.0,
+                     capacity: int = 4096) -> None:
+        """Caches the predictions of the read_gesture methods.
+
+        Readings are rounded to a grid of the given resolution and the model
+        is run on the rounded reading, so identical rounded readings, as
+        while a gesture is held, reuse one prediction. The cache is cleared
+        whenever the model is swapped. Check how often rounding changes the
+        predictions on recorded data with PredictionCache.agreement().
+
+        Args:
+            resolution:
+                The spacing of the grid readings are rounded to.
+            capacity:
+                The most predictions kept.
+
+        Raises:
+            ValueError if the active model keeps state across frames, like
+            the TemporalConvModel, so its predictions depend on more than
+            the latest reading.
+        """
+
+        self._check_stateless("caching")
+        self._cache = prediction_cache.PredictionCache(resolution, capacity)
+
+    def disable_cache(self) -> None:
+        """Stops caching predictions."""
+
+        self._cache = None
+
+    def enable_gating(self,
+                      move_threshold: float = 5.0,
+                      settle_threshold: float = 1.5,
+                      settle_frames: int = 5,
+                      on_event: Optional[Callable[
+                          [change_detector.SegmentEvent], None]] = None
+                      ) -> change_detector.ChangeDetector:
+        """Runs the model only when the hand has moved and then settled.
+
+        Every frame read by the read_gesture methods is fed to a
+        ChangeDetector, and the last decision is returned until the hand
+        comes to rest in a new pose. Meant for the fast read methods, which
+        see every frame; read_gesture() skips the frames it drains.
+
+        The new decision arrives settle_frames frames after the hand stops,
+        which stats() reports under "gating" along with the fraction of
+        frames skipped.
+
+        Args:
+            move_threshold:
+                How far the readings must move from where they settled to
+                count as a move.
+            settle_threshold:
+                The largest frame to frame change that counts as still.
+            settle_frames:
+                The number of still frames in a row after which the hand has
+                settled.
+            on_event:
+                An optional function called with every SegmentEvent.
+
+        Returns:
+            The ChangeDetector, whose events attribute holds the recent
+            segment boundaries.
+
+        Raises:
+            ValueError if the active model keeps state across frames, like
+            the TemporalConvModel, which has to see every frame.
+        """
+
+        self._check_stateless("gating")
+        detector = change_detector.ChangeDetector(
+            self._peripheral.NUM_SENSORS,
+            move_threshold=move_threshold,
+            settle_threshold=settle_threshold,
+            settle_frames=settle_frames,
+            on_event=on_event)
+        self._gate = change_detector.GatedPredictor(detector)
+        return detector
+
+    def disable_gating(self) -> None:
+        """Runs the model on every frame again."""
+
+        self._gate = None
+
+    def _check_stateless(self,
+                         feature: str,
+                         model: Optional[torch.nn.Module] = None) -> None:
+        """Raises a ValueError if a model, by default the active one, keeps
+        state across frames, which feature would skip."""
+
+        if model is None:
+            model = self._active.model
+        if hasattr(model, "reset_state"):
+            raise ValueError(f"{feature} cannot be used with "
+                             f"{type(model).__name__}, which keeps state "
+                             f"across frames")
+
+    def stats(self) -> Dict[str, Dict]:
+        """Gets a snapshot of the timings collected since enable_stats().
+
+        Returns:
+            A dictionary with a "stages" dictionary of histogram summaries
+            keyed by stage name and a "counters" dictionary, or an empty
+            dictionary if timing is disabled. If the active model keeps its
+            own stats, like the CascadeModel's escalation rate, they are
+            added under "model", the prediction cache's hit and miss
+            counts are added under "cache" while it is enabled, and the
+            frames skipped and decision delay are added under "gating"
+            while it is enabled.
+        """
+
+        timings = self._timings
+        snapshot = timings.snapshot() if timings is not None else {}
+
+        active = getattr(self, "_active", None)
+        model_stats = getattr(active.model, "stats", None) if active else None
+        if model_stats is not None:
+            snapshot["model"] = model_stats()
+
+        cache = self._cache
+        if cache is not None:
+            snapshot["cache"] = cache.stats()
+
+        gate = self._gate
+        if gate is not None:
+            snapshot["gating"] = gate.stats()
+        return snapshot
+
+    def _log_stats(self, interval: float) -> None:
+        """Logs a summary of the timings every interval seconds."""
+
+        while not self._stop_log.wait(interval):
+            timings = self._timings
+            if timings is None:
+                return
+            logger.info(timings.summary_line())
+
+    def serve_metrics(self, port: int = 9108):
+        """Serves metrics in the Prometheus text format on localhost.
+
+        Enables the stage timings if they are not already enabled, since the
+        prediction latency quantiles are taken from them.
+
+        Args:
+            port:
+                The port to listen on.
+
+        Returns:
+            The started MetricsServer. Call stop() on it to shut it down.
+        """
+
+        import metrics_server
+
+        if self._timings is None:
+            self.enable_stats()
+
+        server = metrics_server.MetricsServer(self, port=port)
+        server.start()
+        return server
+
+    def serve_gestures(self,
+                       path: Optional[str] = None,
+                       port: int = 9109,
+                       queue_size: int = 1024):
+        """Publishes every frame and prediction to local clients.
+
+        The server reads from the glove on its own thread, so the read
+        methods should not be used while it runs. Clients connect with
+        gesture_server.GestureClient.
+
+        Args:
+            path:
+                The path of a Unix domain socket to listen on. If not given,
+                listens on localhost TCP instead.
+            port:
+                The TCP port to listen on.
+            queue_size:
+                The number of messages queued for each client before the
+                oldest are dropped.
+
+        Returns:
+            The started GestureServer. Call stop() on it to shut it down.
+        """
+
+        import gesture_server
+
+        server = gesture_server.GestureServer(self,
+                                              path=path,
+                                              port=port,
+                                              queue_size=queue_size)
+        server.start()
+        return server
+
+    def publish_shared(self,
+                       name: str = "stretchsense_frames",
+                       capacity: int = 256):
+        """Publishes every frame and prediction in shared memory.
+
+        Processes on the same machine read them with
+        shared_frames.SharedFrameReader, without sockets or copies through
+        the kernel. The publisher reads from the glove on its own thread,
+        so the read methods should not be used while it runs.
+
+        Args:
+            name:
+                The name of the shared memory block.
+            capacity:
+                The number of recent frames kept.
+
+        Returns:
+            The started SharedFramePublisher. Call stop() on it to shut it
+            down and remove the block.
+        """
+
+        import shared_frames
+
+        publisher = shared_frames.SharedFramePublisher(self, name, capacity)
+        publisher.start()
+        return publisher
 
-        # Updating gestures field
-        self._gestures = gestures
+    @property
+    def peripheral(self):
+        """The connected StretchSense peripheral."""
+
+        return self._peripheral
+
+    @property
+    def last_prediction(self) -> Optional[Tuple[str, float]]:
+        """The latest predicted gesture and the model's confidence in it.
+
+        Returns:
+            A tuple of the gesture name and its softmax probability, or None
+            if nothing has been predicted yet.
+        """
+
+        last_prediction = self._last_prediction
+        if last_prediction is None:
+            return None
+
+        output, resultidx, gestures = last_prediction
+        confidence = torch.softmax(output.detach(), dim=-1)[resultidx].item()
+        return gestures[resultidx], confidence
+
+    @property
+    def gestures(self) -> List[str]:
+        """The list of gestures the model was trained with."""
+
+        return self._active.gestures
+
+    @property
+    def gaps(self) -> List[ssp.Gap]:
+        """The periods during which the connection to the peripheral dropped.
+
+        If the link drops while reading, the peripheral reconnects on its
+        own and reading resumes. A ReconnectFailedError is raised by the
+        read methods if it cannot be reconnected to.
+        """
+
+        return self._peripheral.gaps
 
     def read_gesture(self) -> str:
         """Gets the current gesture as a string."""
 
+        start_ns = time.monotonic_ns()
+
         # Get input data from the peripheral
         testdata = self._get_input()
 
         # Generate the prediction using the model
-        output = self._model(torch.tensor(testdata))
-        resultidx = torch.argmax(output).item()
-        result = self._gestures[resultidx]
+        _, result = self._predict(testdata)
+
+        timings = self._timings
+        if timings is not None:
+            timings.record("read_gesture", time.monotonic_ns() - start_ns)
         
         # Return the prediction
         return result
 
-    def _get_input(self) -> List[int]:
+    def _get_input(self) -> np.ndarray:
         """Gets the input data from the connected peripheral.
         
         Args:
@@ -118,35 +645,207 @@ class API:
                 The Stretchsense peripheral whose sensor data needs to be read.
 
         Returns:
-            A list of integers representing the sensor data.
+            A numpy array representing the sensor data.
         """
 
-        # Clear old sensor readings
-        for _ in range(300):
-            self._peripheral.read_sensors()
+        # Clear old sensor readings, waiting up to twice as long as 300
+        # readings should take at the glove's sampling rate
+        start_ns = time.monotonic_ns()
+        drained, _ = self._peripheral.read_sensors_batch(
+            300, timeout=600 / self._peripheral.SAMPLE_RATE)
+
+        # Run the drained readings through the filter, and through models
+        # that keep state across frames, to keep them current
+        stream_filter = self._filter
+        if stream_filter is not None:
+            drained = stream_filter.process(drained)
+        if len(drained) and hasattr(self._active.model, "reset_state"):
+            self.predict_batch(drained)
+
+        timings = self._timings
+        if timings is not None:
+            timings.record("drain", time.monotonic_ns() - start_ns)
 
         # Take new sensor readings until a non-nil reading is obtained
         data = None
         while data is None:
             data = self._peripheral.read_sensors()
 
-        # Convert to list and return
-        return data.tolist()
+        if stream_filter is not None:
+            data = stream_filter.update(data)
+        return data
 
     def read_gesture_fast(self) -> str:
         """Gets the gesture as a string. Faster but poor accuracy."""
+        start_ns = time.monotonic_ns()
+
         # Get input data from the peripheral
         testdata = self._get_input_fast()
 
         # Generate the prediction using the model
-        output = self._model(torch.tensor(testdata))
-        resultidx = torch.argmax(output).item()
-        result = self._gestures[resultidx]
+        _, result = self._predict(testdata)
+
+        timings = self._timings
+        if timings is not None:
+            timings.record("read_gesture_fast",
+                           time.monotonic_ns() - start_ns)
         
         # Return the prediction
         return result
 
-    def _get_input_fast(self) -> List[int]:
+    def predict_batch(self, frames) -> Tuple[np.ndarray, List[str], np.ndarray]:
+        """Predicts the gestures for many frames in one forward pass.
+
+        The returned arrays are views of buffers that are reused, so they
+        are overwritten by the next call. For a model that keeps state
+        across frames, like the TemporalConvModel, the frames are taken as
+        the next frames of the stream. The frames are not filtered, so
+        frames read straight from the peripheral should go through
+        filter_batch() first.
+
+        Args:
+            frames:
+                An array or tensor of shape (n, num_sensors).
+
+        Returns:
+            A tuple of an array of the n predicted gesture indices, a list
+            of the n predicted gesture names, and an array of shape
+            (n, num_gestures) of the probability of every gesture.
+        """
+
+        num_frames = len(frames)
+        active = self._active
+        num_gestures = len(active.gestures)
+
+        # Grow the output buffers if needed
+        if (self._batch_indices is None
+                or len(self._batch_indices) < num_frames
+                or self._batch_probs.shape[1] != num_gestures):
+            self._batch_probs = torch.empty(num_frames, num_gestures)
+            self._batch_confidences = torch.empty(num_frames)
+            self._batch_indices = torch.empty(num_frames, dtype=torch.int64)
+
+        indices, _, probs = active.model.predict_batch(
+            frames,
+            self._batch_probs[:num_frames],
+            self._batch_confidences[:num_frames],
+            self._batch_indices[:num_frames])
+
+        indices = indices.numpy()
+        names = [active.gestures[idx] for idx in indices.tolist()]
+        return indices, names, probs.numpy()
+
+    def filter_batch(self, frames: np.ndarray) -> np.ndarray:
+        """Runs frames read straight from the peripheral through the filter
+        set with use_filter(), as the next frames of the stream.
+
+        Args:
+            frames:
+                An array of shape (n, num_sensors).
+
+        Returns:
+            A new array of the filtered frames, or frames itself if no
+            filter is set.
+        """
+
+        stream_filter = self._filter
+        if stream_filter is None:
+            return frames
+        return stream_filter.process(frames)
+
+    def read_gesture_voted(self, window: int = 45) -> str:
+        """Gets the gesture most often predicted over a window of frames.
+
+        Reads the next window of frames from the peripheral, predicts them
+        all in one batch and returns the majority vote.
+
+        Args:
+            window:
+                The number of frames to vote over.
+
+        Returns:
+            The name of the most often predicted gesture.
+        """
+
+        start_ns = time.monotonic_ns()
+
+        # Read a full window
+        frames = np.empty((window, self._peripheral.NUM_SENSORS))
+        num_frames = 0
+        while num_frames < window:
+            batch, _ = self._peripheral.read_sensors_batch(
+                window - num_frames, timeout=1.0, out=frames[num_frames:])
+            num_frames += len(batch)
+        frames = self.filter_batch(frames)
+
+        # Vote
+        indices, names, _ = self.predict_batch(frames)
+        winner = int(np.argmax(np.bincount(indices)))
+
+        # Take the name from the batch so it matches the model that
+        # predicted it, even if the model was swapped meanwhile
+        result = names[int(np.flatnonzero(indices == winner)[0])]
+
+        timings = self._timings
+        if timings is not None:
+            timings.record("read_gesture_voted",
+                           time.monotonic_ns() - start_ns)
+
+        return result
+
+    def read_gesture_index_fast(self) -> int:
+        """Gets the index of the gesture in the gesture list. Faster but poor
+        accuracy."""
+
+        resultidx, _ = self._predict(self._get_input_fast())
+        return resultidx
+
+    def read_stamped_gesture_fast(self) -> StampedGesture:
+        """Gets the gesture index along with the times the sensor data
+        arrived and the prediction was made. Faster but poor accuracy."""
+
+        testdata = self._get_input_fast()
+        notified_ns = self._peripheral.last_notification_ns
+        resultidx, _ = self._predict(testdata)
+        return StampedGesture(resultidx, notified_ns, time.monotonic_ns())
+
+    def _predict(self, testdata: np.ndarray) -> Tuple[int, str]:
+        """Runs the active model on a set of sensor data.
+
+        Args:
+            testdata:
+                A numpy array representing the sensor data.
+
+        Returns:
+            A tuple of the index of the predicted gesture in the gesture list
+            and the name of the gesture.
+        """
+
+        active = self._active
+        gate = self._gate
+        if gate is not None:
+            resultidx, output = gate.predict(
+                active, testdata,
+                lambda frame: self._run_model(active, frame),
+                self._peripheral.last_notification_ns,
+                self._timings)
+        else:
+            resultidx, output = self._run_model(active, testdata)
+        self._last_prediction = (output, resultidx, active.gestures)
+        return resultidx, active.gestures[resultidx]
+
+    def _run_model(self,
+                   active: registry.LoadedModel,
+                   testdata: np.ndarray) -> Tuple[int, torch.Tensor]:
+        """Runs a model on a set of sensor data, through the prediction
+        cache if it is enabled."""
+
+        cache = self._cache
+        if cache is not None:
+            return cache.predict(active, testdata, self._timings)
+        return active.session.predict(testdata, self._timings)
+
+    def _get_input_fast(self) -> np.ndarray:
         """Gets the input data from the connected peripheral.
 
         Gets the data without clearing the old readings to increase speed
@@ -157,7 +856,7 @@ class API:
                 The Stretchsense peripheral whose sensor data needs to be read.
 
         Returns:
-            A list of integers representing the sensor data.
+            A numpy array representing the sensor data.
         """
 
          # Take new sensor readings until a non-nil reading is obtained
@@ -165,5 +864,7 @@ class API:
         while data is None:
             data = self._peripheral.read_sensors()
 
-        # Convert to list and return
-        return data.tolist()
\ No newline at end of file
+        stream_filter = self._filter
+        if stream_filter is not None:
+            data = stream_filter.update(data)
+        return data
@@ -0,0 +1,480 @@
+"""Fans one glove's frames and predictions out to many local clients.
+
+Only one process can own the glove's BLE connection. The GestureServer owns
+it through an API, reads and predicts every frame once, and publishes the
+results over a Unix domain socket or localhost TCP, so a teleop controller,
+a game and a logger can all use the same glove.
+
+Every message starts with a header of:
+    kind (uint8), payload length (uint16), time.monotonic_ns() (uint64)
+all little endian, followed by the payload:
+    HELLO     server to client on connect, UTF-8 JSON with the number of
+              sensors, the gesture list and the model name
+    SUBSCRIBE client to server, a uint8 bit mask of FRAMES, GESTURES and
+              CHANGES_ONLY
+    FRAME     sequence number (uint32), then a float32 per sensor
+    GESTURE   sequence number (uint32), gesture index (uint16), confidence
+              (float32)
+    MODEL     server to client when the model is swapped, the same JSON as
+              HELLO
+The sequence number counts frames, so a FRAME and the GESTURE predicted
+from it share one, and a jump in it shows the client fell behind.
+
+Each client has a bounded queue that the producer appends to without
+blocking. When a client does not keep up, its oldest messages are dropped.
+"""
+
+import json
+import logging
+import os
+import socket
+import struct
+import time
+from collections import deque
+from threading import Condition, Event, Lock, Thread
+from typing import Any, Deque, Dict, List, NamedTuple, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+HEADER = struct.Struct("<BHQ")
+GESTURE_PAYLOAD = struct.Struct("<IHf")
+SEQ = struct.Struct("<I")
+
+# Message kinds
+HELLO = 1
+SUBSCRIBE = 2
+FRAME = 3
+GESTURE = 4
+MODEL = 5
+
+# Subscription flags
+FRAMES = 1
+GESTURES = 2
+CHANGES_ONLY = 4
+
+DEFAULT_PORT = 9109
+
+class Message(NamedTuple):
+    """A message received by a GestureClient.
+
+    Attributes:
+        kind:
+            FRAME, GESTURE, HELLO or MODEL.
+        timestamp_ns:
+            The time.monotonic_ns() at which the frame arrived from the
+            glove, or at which the HELLO or MODEL message was sent.
+        seq:
+            The sequence number of the frame, or -1 for HELLO and MODEL.
+        frame:
+            For FRAME, an array of the sensor readings, otherwise None.
+        gesture:
+            For GESTURE, the name of the predicted gesture, otherwise None.
+        index:
+            For GESTURE, the index of the predicted gesture, otherwise -1.
+        confidence:
+            For GESTURE, the softmax probability of the predicted gesture,
+            otherwise 0.
+        info:
+            For HELLO and MODEL, the decoded JSON payload, otherwise None.
+    """
+
+    kind: int
+    timestamp_ns: int
+    seq: int
+    frame: Optional[np.ndarray] = None
+    gesture: Optional[str] = None
+    index: int = -1
+    confidence: float = 0.0
+    info: Optional[Dict[str, Any]] = None
+
+def _encode(kind: int, timestamp_ns: int, payload: bytes) -> bytes:
+    """Frames a payload with its header."""
+
+    return HEADER.pack(kind, len(payload), timestamp_ns) + payload
+
+class _Client:
+    """A connected client, its subscription and its outgoing queue."""
+
+    def __init__(self, conn: socket.socket, queue_size: int):
+        self.conn = conn
+        self.flags = FRAMES | GESTURES
+        self.last_index = -1
+        self.dropped = 0
+        self.closed = False
+
+        self._queue: Deque[bytes] = deque(maxlen=queue_size)
+        self._ready = Condition()
+
+    def put(self, message: bytes) -> None:
+        """Queues a message without blocking, dropping the oldest if the
+        queue is full."""
+
+        with self._ready:
+            if len(self._queue) == self._queue.maxlen:
+                self.dropped += 1
+            self._queue.append(message)
+            self._ready.notify()
+
+    def close(self) -> None:
+        """Wakes the sender so it exits."""
+
+        with self._ready:
+            self.closed = True
+            self._ready.notify()
+
+    def send_loop(self) -> None:
+        """Sends queued messages until the client disconnects."""
+
+        try:
+            while True:
+                with self._ready:
+                    while not self._queue and not self.closed:
+                        self._ready.wait()
+                    if self.closed:
+                        return
+
+                    # Send everything queued in one write
+                    messages = list(self._queue)
+                    self._queue.clear()
+                self.conn.sendall(b"".join(messages))
+        except OSError:
+            pass
+        finally:
+            self.closed = True
+            self.conn.close()
+
+    def receive_loop(self) -> None:
+        """Applies the client's subscription messages."""
+
+        reader = self.conn.makefile("rb")
+        try:
+            while not self.closed:
+                header = reader.read(HEADER.size)
+                if len(header) < HEADER.size:
+                    break
+                kind, length, _ = HEADER.unpack(header)
+                payload = reader.read(length)
+                if kind == SUBSCRIBE and len(payload) == 1:
+                    self.flags = payload[0]
+        except OSError:
+            pass
+        finally:
+            self.close()
+
+class GestureServer:
+    """Reads and predicts every frame from an API's glove once and publishes
+    them to every connected client.
+
+    Frames are read as they arrive, and every frame waiting when one
+    arrives is predicted with it in a single batch, so the server keeps up
+    with the glove however many clients are connected.
+
+    Args:
+        api:
+            The set up API that owns the glove. The server reads from the
+            glove on its own thread, so nothing else should read from it.
+        path:
+            The path of a Unix domain socket to listen on. If not given,
+            listens on localhost TCP instead.
+        host:
+            The address to listen on for TCP.
+        port:
+            The TCP port to listen on.
+        queue_size:
+            The number of messages queued for each client before the oldest
+            are dropped.
+        max_batch:
+            The most frames read and predicted in one batch.
+    """
+
+    def __init__(self,
+                 api,
+                 path: Optional[str] = None,
+                 host: str = "127.0.0.1",
+                 port: int = DEFAULT_PORT,
+                 queue_size: int = 1024,
+                 max_batch: int = 64):
+        self._api = api
+        self._path: Optional[str] = path
+        self._queue_size: int = queue_size
+        self._max_batch: int = max_batch
+
+        if path is not None:
+            if os.path.exists(path):
+                os.unlink(path)
+            self._listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self._listener.bind(path)
+        else:
+            self._listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self._listener.setsockopt(socket.SOL_SOCKET,
+                                      socket.SO_REUSEADDR, 1)
+            self._listener.bind((host, port))
+        self._listener.listen()
+
+        # Replaced rather than mutated, so the producer can iterate over it
+        # without holding the lock
+        self._clients: List[_Client] = []
+        self._clients_lock = Lock()
+        self._model_name: Optional[str] = None
+        self._seq: int = 0
+        self._stop = Event()
+
+        self._accept_thread = Thread(target=self._accept_loop, daemon=True)
+        self._produce_thread = Thread(target=self._produce_loop, daemon=True)
+
+    @property
+    def address(self):
+        """The socket path or (host, port) the server is listening on."""
+
+        return self._listener.getsockname()
+
+    @property
+    def clients(self) -> int:
+        """The number of connected clients."""
+
+        return len(self._clients)
+
+    @property
+    def dropped(self) -> int:
+        """The number of messages dropped for clients that fell behind,
+        summed over the connected clients."""
+
+        return sum(client.dropped for client in self._clients)
+
+    def start(self) -> None:
+        """Starts accepting clients and publishing on background threads."""
+
+        self._accept_thread.start()
+        self._produce_thread.start()
+
+    def stop(self) -> None:
+        """Stops publishing and disconnects every client."""
+
+        self._stop.set()
+        try:
+            # Wakes the accept thread
+            self._listener.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self._listener.close()
+        self._produce_thread.join()
+        for client in self._clients:
+            client.close()
+        if self._path is not None and os.path.exists(self._path):
+            os.unlink(self._path)
+
+    def _hello(self, kind: int) -> bytes:
+        """Encodes a description of the glove and the active model."""
+
+        info = {"num_sensors": self._api.peripheral.NUM_SENSORS,
+                "gestures": self._api.gestures,
+                "model": self._api.model_name}
+        return _encode(kind, time.monotonic_ns(), json.dumps(info).encode())
+
+    def _accept_loop(self) -> None:
+        """Accepts clients and starts their sender and receiver threads."""
+
+        while not self._stop.is_set():
+            try:
+                conn, _ = self._listener.accept()
+            except OSError:
+                return
+
+            client = _Client(conn, self._queue_size)
+            client.put(self._hello(HELLO))
+            with self._clients_lock:
+                self._clients = self._clients + [client]
+            Thread(target=client.send_loop, daemon=True).start()
+            Thread(target=client.receive_loop, daemon=True).start()
+
+    def _produce_loop(self) -> None:
+        """Reads, predicts and publishes frames until stopped."""
+
+        peripheral = self._api.peripheral
+        frames = np.empty((self._max_batch, peripheral.NUM_SENSORS))
+        timestamps = np.empty(self._max_batch, dtype=np.int64)
+
+        while not self._stop.is_set():
+            # Wait for one frame, then take every frame already waiting
+            first, _ = peripheral.read_sensors_batch(
+                1, timeout=1.0, out=frames[:1], out_timestamps=timestamps[:1])
+            if len(first) == 0:
+                continue
+            rest, _ = peripheral.read_sensors_batch(
+                self._max_batch - 1,
+                out=frames[1:],
+                out_timestamps=timestamps[1:])
+            num_frames = 1 + len(rest)
+
+            self._publish(frames[:num_frames], timestamps[:num_frames])
+
+    def _publish(self, frames: np.ndarray, timestamps: np.ndarray) -> None:
+        """Predicts a batch of frames and queues the results for every
+        client."""
+
+        # Drop clients that have disconnected
+        clients = self._clients
+        if any(client.closed for client in clients):
+            with self._clients_lock:
+                self._clients = [client for client in self._clients
+                                 if not client.closed]
+                clients = self._clients
+
+        # Tell clients when the model changes
+        model_name = self._api.model_name
+        if model_name != self._model_name:
+            if self._model_name is not None:
+                message = self._hello(MODEL)
+                for client in clients:
+                    client.put(message)
+            self._model_name = model_name
+
+        indices, _, probs = self._api.predict_batch(
+            self._api.filter_batch(frames))
+        confidences = probs[np.arange(len(indices)), indices]
+        frames32 = frames.astype("<f4")
+
+        for row, timestamp_ns in enumerate(timestamps.tolist()):
+            seq = self._seq & 0xFFFFFFFF
+            self._seq += 1
+            index = int(indices[row])
+
+            frame_message = None
+            gesture_message = _encode(
+                GESTURE, timestamp_ns,
+                GESTURE_PAYLOAD.pack(seq, index, float(confidences[row])))
+
+            for client in clients:
+                flags = client.flags
+                if flags & FRAMES:
+                    if frame_message is None:
+                        frame_message = _encode(
+                            FRAME, timestamp_ns,
+                            SEQ.pack(seq) + frames32[row].tobytes())
+                    client.put(frame_message)
+                if flags & GESTURES:
+                    if flags & CHANGES_ONLY and index == client.last_index:
+                        continue
+                    client.last_index = index
+                    client.put(gesture_message)
+
+class GestureClient:
+    """Connects to a GestureServer and reads its messages.
+
+    Args:
+        path:
+            The path of the server's Unix domain socket. If not given,
+            connects over TCP instead.
+        host:
+            The server's TCP address.
+        port:
+            The server's TCP port.
+        subscribe:
+            A bit mask of FRAMES, GESTURES and CHANGES_ONLY choosing the
+            messages to receive.
+    """
+
+    def __init__(self,
+                 path: Optional[str] = None,
+                 host: str = "127.0.0.1",
+                 port: int = DEFAULT_PORT,
+                 subscribe: int = FRAMES | GESTURES):
+        if path is not None:
+            self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self._sock.connect(path)
+        else:
+            self._sock = socket.create_connection((host, port))
+            self._sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._reader = self._sock.makefile("rb")
+
+        self.subscribe(subscribe)
+
+        # The server describes the glove and the model first
+        hello = self.read()
+        self.num_sensors: int = hello.info["num_sensors"]
+        self.gestures: List[str] = hello.info["gestures"]
+        self.model: str = hello.info["model"]
+
+    def subscribe(self, flags: int) -> None:
+        """Changes the messages received.
+
+        Args:
+            flags:
+                A bit mask of FRAMES, GESTURES and CHANGES_ONLY.
+        """
+
+        self._sock.sendall(_encode(SUBSCRIBE, time.monotonic_ns(),
+                                   bytes((flags,))))
+
+    def read(self) -> Message:
+        """Blocks until the next message arrives.
+
+        Returns:
+            The Message.
+
+        Raises:
+            ConnectionError if the server has closed the connection.
+        """
+
+        header = self._reader.read(HEADER.size)
+        if len(header) < HEADER.size:
+            raise ConnectionError("gesture server closed the connection")
+        kind, length, timestamp_ns = HEADER.unpack(header)
+        payload = self._reader.read(length)
+
+        if kind == FRAME:
+            seq, = SEQ.unpack_from(payload)
+            frame = np.frombuffer(payload, dtype="<f4", offset=SEQ.size)
+            return Message(kind, timestamp_ns, seq, frame=frame)
+
+        if kind == GESTURE:
+            seq, index, confidence = GESTURE_PAYLOAD.unpack(payload)
+            return Message(kind, timestamp_ns, seq,
+                           gesture=self.gestures[index],
+                           index=index,
+                           confidence=confidence)
+
+        # HELLO or MODEL
+        info = json.loads(payload)
+        if kind == MODEL:
+            self.gestures = info["gestures"]
+            self.model = info["model"]
+        return Message(kind, timestamp_ns, -1, info=info)
+
+    def __iter__(self):
+        """Yields messages until the server closes the connection."""
+
+        try:
+            while True:
+                yield self.read()
+        except ConnectionError:
+            return
+
+    def close(self) -> None:
+        """Disconnects from the server."""
+
+        self._reader.close()
+        self._sock.close()
+
+if __name__ == "__main__":
+    import argparse
+
+    from gesture_recognition_api import API
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--unix", help="Unix domain socket path to listen on")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT,
+                        help="localhost TCP port to listen on")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    api = API()
+    api.setup()
+    server = api.serve_gestures(path=args.unix, port=args.port)
+    logger.info("Serving gestures on %s", server.address)
+    try:
+        Event().wait()
+    except KeyboardInterrupt:
+        server.stop()
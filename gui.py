@@ -1,12 +1,127 @@
 import tkinter as tk
+import tkinter.messagebox
+import numpy as np
 import yaml
 
+# How often the progress of a running collection or training is checked, in
+# milliseconds
+POLL_INTERVAL_MS = 50
+
+# How often the live plot is redrawn, in milliseconds, about the refresh
+# rate of a display
+REDRAW_INTERVAL_MS = 16
+
+# The number of readings the live plot shows, 4 seconds at the glove's 90 Hz
+PLOT_FRAMES = 360
+
+# The number of redraws between updates of the sample rate and drop counters
+STATS_INTERVAL = 15
+
+
+class SensorPlot(tk.Canvas):
+    """A live plot of the recent readings of every sensor.
+
+    Each sensor is drawn in its own lane, scaled to the range of its
+    readings on screen. The lines are created once and moved in place with
+    coords() on every redraw, rather than deleted and created again, and at
+    most one point is drawn for every two pixels across however many
+    readings are shown, so a redraw costs the same at any sampling rate.
+
+    Args:
+        master:
+            The widget to place the plot in.
+        num_sensors:
+            The number of sensors to plot.
+        num_frames:
+            The number of most recent readings shown.
+        width:
+            The width of the plot in pixels.
+        lane_height:
+            The height of each sensor's lane in pixels.
+    """
+
+    COLOURS = ("#1f77b4", "#ff7f0e", "#2ca02c", "#d62728", "#9467bd",
+               "#8c564b", "#e377c2", "#7f7f7f", "#bcbd22", "#17becf")
+
+    def __init__(self,
+                 master: tk.Widget,
+                 num_sensors: int,
+                 num_frames: int,
+                 width: int = 400,
+                 lane_height: int = 40):
+        super().__init__(master,
+                         width=width,
+                         height=num_sensors * lane_height,
+                         background="white")
+        self._num_frames = num_frames
+        self._frames_drawn = 0
+
+        # Buffers the readings are copied into and the points built in
+        self._frames = np.empty((num_frames, num_sensors))
+        self._timestamps = np.empty(num_frames, dtype=np.int64)
+        num_points = min(num_frames, width // 2)
+        self._points = np.empty((num_sensors, num_points, 2))
+        self._points[:, :, 0] = np.linspace(0, width, num_points)
+
+        # The readings drawn, once num_frames have arrived
+        self._picked = np.linspace(0, num_frames - 1, num_points).astype(int)
+
+        # The top and height of the part of each lane drawn in
+        margin = lane_height // 8
+        self._lane_tops = (np.arange(num_sensors) * lane_height
+                           + margin)[:, None]
+        self._lane_span = lane_height - 2 * margin
+
+        self._lines = []
+        for sensor in range(num_sensors):
+            if sensor:
+                self.create_line(0, sensor * lane_height,
+                                 width, sensor * lane_height,
+                                 fill="#dddddd")
+            self.create_text(4, sensor * lane_height + 2,
+                             text=f"sensor{sensor + 1}",
+                             anchor="nw",
+                             fill="#999999")
+            self._lines.append(self.create_line(
+                0, 0, 0, 0, fill=self.COLOURS[sensor % len(self.COLOURS)]))
+
+    def redraw(self, buffer) -> None:
+        """Moves the lines to the newest readings of a LiveBuffer, if any
+        arrived since the last redraw."""
+
+        if buffer.frames_written == self._frames_drawn:
+            return
+        self._frames_drawn = buffer.frames_written
+
+        frames, _ = buffer.latest(self._num_frames,
+                                  self._frames,
+                                  self._timestamps)
+        if len(frames) < 2:
+            return
+        if len(frames) == self._num_frames:
+            picked = frames[self._picked]
+        else:
+            picked = frames[np.linspace(0, len(frames) - 1,
+                                        self._points.shape[1]).astype(int)]
+
+        # Scale every lane to its sensor's range, highest reading at the top
+        low = picked.min(axis=0)
+        span = picked.max(axis=0) - low
+        span[span == 0] = 1
+        self._points[:, :, 1] = self._lane_tops + self._lane_span * (
+            1 - (picked - low) / span).T
+
+        for line, points in zip(self._lines, self._points):
+            self.coords(line, points.ravel().tolist())
+
 
 class View(tk.Tk):
     """The Graphical User Interface.
     
     Provides a GUI to facilitate the configuration, data collection, and
-    model training processes.
+    model training processes. Collection and training run on the
+    controller's worker thread, and the window polls their progress, so it
+    stays responsive and can pause or cancel them.
 
     Args:
         controller:
@@ -28,6 +143,12 @@ class View(tk.Tk):
         # Start from config frame
         self._switch_to(self._config_frame)
 
+        # Whether the running job is paused
+        self._paused = False
+
+        # Stop any running job with the window
+        self.protocol("WM_DELETE_WINDOW", self._close)
+
     def main(self) -> None:
         """Creates the GUI."""
 
@@ -133,7 +254,11 @@ class View(tk.Tk):
         self.destroy()
 
     def _save_config(self) -> None:
-        config_dict = {
+        # Keep the settings the GUI does not edit, like the filter
+        with open("src/config.yaml") as configyaml:
+            config_dict = yaml.load(configyaml, Loader=yaml.loader.FullLoader) or {}
+
+        edited = {
             'filenames': {
                 'data': self._data.get(),
                 'trained_model': self._trained_model.get()
@@ -151,6 +276,9 @@ class View(tk.Tk):
                 'num_sets': int(self._num_sets.get())
                 }
             }
+        for section, values in edited.items():
+            config_dict.setdefault(section, {}).update(values)
+
         with open("src/config.yaml", 'w') as configyaml:
             yaml.dump(config_dict, configyaml, default_flow_style=False)
 
@@ -222,27 +350,157 @@ class View(tk.Tk):
         self._instructions_frame = tk.Frame(self)
         self._instructions_frame.grid(row=0, column=0, sticky="nsew")
 
+        # Set the description
+        tk.Label(self._instructions_frame,
+                 text="Current Gesture:").grid(row=0,
+                                               column=0)
+
         # String variable used as a container for the current gesture
         self.curr_text = tk.StringVar()
         tk.Label(self._instructions_frame,
                  textvariable=self.curr_text).grid(row=1, column=0)
 
+        # Number of reps collected
+        self._reps_text = tk.StringVar()
+        tk.Label(self._instructions_frame,
+                 textvariable=self._reps_text).grid(row=2, column=0)
+
+        self._collect_pause_btn = self._make_job_buttons(
+            self._instructions_frame, 3)
+
+        # The live plot of the readings, made once the number of sensors is
+        # known, with the sample rate and drop counters
+        self._plot = None
+        self._plotting = False
+        self._redraws = 0
+        self._stream_text = tk.StringVar()
+        tk.Label(self._instructions_frame,
+                 textvariable=self._stream_text).grid(row=5, column=0,
+                                                      columnspan=2)
+
+    def _make_job_buttons(self, frame: tk.Frame, row: int) -> tk.Button:
+        """Creates the pause and cancel buttons of a running job.
+
+        Args:
+            frame:
+                The frame to add the buttons to.
+            row:
+                The row to add them at.
+
+        Returns:
+            The pause button, whose text switches to resume while paused.
+        """
+
+        pause_btn = tk.Button(frame, text="PAUSE", command=self._toggle_pause)
+        pause_btn.grid(row=row, column=0)
+        cancel_btn = tk.Button(frame,
+                               text="CANCEL",
+                               command=self._controller.cancel)
+        cancel_btn.grid(row=row, column=1)
+        return pause_btn
+
+    def _toggle_pause(self) -> None:
+        """Pauses or resumes the running job."""
+
+        if self._paused:
+            self._controller.resume()
+        else:
+            self._controller.pause()
+        self._paused = not self._paused
+        text = "RESUME" if self._paused else "PAUSE"
+        self._collect_pause_btn.config(text=text)
+        self._train_pause_btn.config(text=text)
+
+    def _start_job(self) -> None:
+        """Resets the pause button and starts polling the job's progress."""
+
+        self._paused = False
+        self._collect_pause_btn.config(text="PAUSE")
+        self._train_pause_btn.config(text="PAUSE")
+        self.after(POLL_INTERVAL_MS, self._poll_progress)
+
+    def _poll_progress(self) -> None:
+        """Shows the progress of the running job, until it ends."""
+
+        for message in self._controller.poll_progress():
+            kind = message[0]
+            if kind == "gesture":
+                self.curr_text.set(message[1])
+            elif kind == "reps":
+                _, collected, total = message
+                self._reps_text.set(f"{collected} / {total} reps collected")
+            elif kind == "epoch":
+                _, epoch, total, result = message
+                if result is not None:
+                    self._validation_accuracy = result["validation_accuracy"]
+                text = f"epoch {epoch + 1} / {total}"
+                if self._validation_accuracy is not None:
+                    text += (", validation accuracy "
+                             f"{self._validation_accuracy:.4f}")
+                self._train_text.set(text)
+            elif kind == "collected":
+                self._plotting = False
+
+                # Train next, or let the user collect again if cancelled
+                self._switch_to(self._trainer_frame if message[1]
+                                else self._data_collector_frame)
+                return
+            elif kind == "trained":
+                self._train_btn.config(state=tk.NORMAL)
+                if message[1]:
+                    self._switch_to(self._final_frame)
+                else:
+                    self._train_text.set("Training cancelled")
+                return
+            elif kind == "error":
+                self._plotting = False
+                tk.messagebox.showerror("Error", message[1])
+                self._train_btn.config(state=tk.NORMAL)
+                self._switch_to(self._config_frame)
+                return
+
+        self.after(POLL_INTERVAL_MS, self._poll_progress)
+
     def _collect_data(self) -> None:
         """Displays the data collection instructions."""
         
         # Switch to instructions frame
         self._switch_to(self._instructions_frame)
-
-        # Set the description
-        tk.Label(self._instructions_frame,
-                 text="Current Gesture:").grid(row=0,
-                                               column=0)
-
-        # Run the data collector
-        self._controller.run_data_collector()
-
-        # Switch to trainer frame
-        self._switch_to(self._trainer_frame)
+        self.curr_text.set("")
+        self._reps_text.set("")
+
+        # Plot the readings as they arrive
+        buffer = self._controller.get_live_buffer()
+        if self._plot is not None:
+            self._plot.destroy()
+        self._plot = SensorPlot(self._instructions_frame,
+                                buffer.num_sensors,
+                                PLOT_FRAMES)
+        self._plot.grid(row=4, column=0, columnspan=2)
+        self._stream_text.set("")
+        self._plotting = True
+        self.after(REDRAW_INTERVAL_MS, self._redraw_plot)
+
+        # Run the data collector on the controller's worker thread
+        self._controller.start_data_collector()
+        self._start_job()
+
+    def _redraw_plot(self) -> None:
+        """Redraws the live plot, and now and then the sample rate and drop
+        counters, until the collection ends."""
+
+        if not self._plotting:
+            return
+
+        buffer = self._controller.get_live_buffer()
+        self._plot.redraw(buffer)
+        self._redraws += 1
+        if self._redraws % STATS_INTERVAL == 0:
+            self._stream_text.set(
+                f"{buffer.rate():.1f} Hz, "
+                f"{self._controller.get_frames_dropped()} dropped")
+
+        self.after(REDRAW_INTERVAL_MS, self._redraw_plot)
     
     def _make_trainer_frame(self) -> None:
         """Create the frame used to let user initiate model training."""
@@ -257,19 +515,38 @@ class View(tk.Tk):
                                              column=0)
     
         # Button to begin training
-        train_btn = tk.Button(self._trainer_frame,
+        self._train_btn = tk.Button(self._trainer_frame,
                                     text="TRAIN",
                                     command=self._train)
-        train_btn.grid(row=1, column=0)
+        self._train_btn.grid(row=1, column=0)
+
+        # Epoch and validation accuracy of the training
+        self._train_text = tk.StringVar()
+        tk.Label(self._trainer_frame,
+                 textvariable=self._train_text).grid(row=2, column=0,
+                                                     columnspan=2)
+        self._validation_accuracy = None
+
+        self._train_pause_btn = self._make_job_buttons(self._trainer_frame, 3)
 
     def _train(self) -> None:
         """Train and save a model."""
 
-        # Train the model
-        self._controller.train()
+        # Show the training progress
+        self._switch_to(self._trainer_frame)
+        self._train_btn.config(state=tk.DISABLED)
+        self._train_text.set("Loading data")
+        self._validation_accuracy = None
+
+        # Train the model on the controller's worker thread
+        self._controller.start_training()
+        self._start_job()
 
-        # Switch to the final frame
-        self._switch_to(self._final_frame)
+    def _close(self) -> None:
+        """Cancels any running job and closes the window."""
+
+        self._controller.cancel()
+        self.destroy()
 
     def _make_final_frame(self) -> None:
         """Create the final frame, indicating the completion of setup."""
@@ -288,4 +565,3 @@ class View(tk.Tk):
                              text="EXIT",
                              command=self.destroy)
         exit_btn.grid(row=1, column=0)
-
@@ -0,0 +1,145 @@
+"""Serves gesture recognition metrics in the Prometheus text format."""
+
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Lock, Thread
+from typing import List, Optional, Tuple
+
+# Quantiles of each latency histogram that are exported
+QUANTILES = (0.5, 0.9, 0.99)
+
+class MetricsServer:
+    """An HTTP server exposing an API's metrics at /metrics.
+
+    Exports, per glove, the notifications received and their rate, frames
+    dropped for having the wrong number of readings, and notification
+    timeouts. Also exports latency quantiles of every timed stage and the
+    current predicted gesture with its confidence.
+
+    Args:
+        api:
+            The set up API to export the metrics of.
+        host:
+            The address to listen on. Defaults to localhost only.
+        port:
+            The port to listen on.
+    """
+
+    def __init__(self, api, host: str = "127.0.0.1", port: int = 9108):
+        self._api = api
+
+        # The notification count at the previous scrape, for the rate
+        self._last_scrape: Optional[Tuple[float, int]] = None
+        self._lock = Lock()
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path != "/metrics":
+                    self.send_error(404)
+                    return
+                body = server.render().encode()
+                self.send_response(200)
+                self.send_header("Content-Type",
+                                 "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                # Scrapes are too frequent to log
+                pass
+
+        self._httpd = ThreadingHTTPServer((host, port), Handler)
+        self._thread = Thread(target=self._httpd.serve_forever, daemon=True)
+
+    @property
+    def port(self) -> int:
+        """The port the server is listening on."""
+
+        return self._httpd.server_address[1]
+
+    def start(self) -> None:
+        """Starts serving on a background thread."""
+
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stops serving."""
+
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def render(self) -> str:
+        """Renders the current metrics in the Prometheus text format."""
+
+        lines: List[str] = []
+
+        def metric(name: str, kind: str, help_text: str,
+                   samples: List[Tuple[str, float]]) -> None:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                lines.append(f"{name}{labels} {value}")
+
+        # Glove counters
+        peripheral = self._api.peripheral
+        glove = f'{{glove="{peripheral.address}"}}'
+        notifications = peripheral.frames_received
+        metric("gesture_notifications_total", "counter",
+               "Notifications received from the glove.",
+               [(glove, notifications)])
+        metric("gesture_notification_rate_hz", "gauge",
+               "Notifications per second since the previous scrape.",
+               [(glove, self._notification_rate(notifications))])
+        metric("gesture_frames_dropped_total", "counter",
+               "Notifications without a reading for every sensor.",
+               [(glove, peripheral.frames_dropped)])
+        metric("gesture_notification_timeouts_total", "counter",
+               "Waits for a notification that timed out.",
+               [(glove, peripheral.timeouts)])
+        metric("gesture_reconnects_total", "counter",
+               "Times the connection dropped and was reconnected.",
+               [(glove, len(peripheral.gaps))])
+
+        # Latency quantiles of every timed stage
+        stats = self._api.stats()
+        for stage, summary in stats.get("stages", {}).items():
+            name = f"gesture_{stage}_latency_seconds"
+            samples = [(f'{{quantile="{q}"}}',
+                        summary[f"p{int(q * 100)}_ms"] / 1e3)
+                       for q in QUANTILES]
+            metric(name, "summary", f"Latency of the {stage} stage.",
+                   samples)
+
+            # The sum and count samples carry a suffix instead of labels
+            lines.append(f"{name}_sum "
+                         f"{summary['mean_ms'] * summary['count'] / 1e3}")
+            lines.append(f"{name}_count {summary['count']}")
+
+        # Current prediction
+        prediction = self._api.last_prediction
+        if prediction is not None:
+            gesture, confidence = prediction
+            label = f'{{gesture="{gesture}"}}'
+            metric("gesture_predicted", "gauge",
+                   "1 for the latest predicted gesture.",
+                   [(label, 1)])
+            metric("gesture_prediction_confidence", "gauge",
+                   "Softmax probability of the latest predicted gesture.",
+                   [(label, confidence)])
+
+        return "\n".join(lines) + "\n"
+
+    def _notification_rate(self, notifications: int) -> float:
+        """Calculates the notification rate since the previous scrape."""
+
+        now = time.monotonic()
+        with self._lock:
+            last_scrape = self._last_scrape
+            self._last_scrape = (now, notifications)
+
+        if last_scrape is None or now <= last_scrape[0]:
+            return 0.0
+        return (notifications - last_scrape[1]) / (now - last_scrape[0])
@@ -1,16 +1,78 @@
 """Allow user to set up the gesture recognition model with a GUI."""
+import queue
+import threading
+from typing import Any, List, Optional, Tuple
 import yaml
 import gui
 from data_collection import data_collector
+from src import artifact
 from src import train
-from src.models import feed_forward
 import torch
 
+class PendingJob:
+    """Stands in for a trainer that is still being loaded on the worker
+    thread, holding any pause or cancel until it can be passed on.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._job = None
+        self._paused = False
+        self._cancelled = False
+
+    def attach(self, job) -> None:
+        """Passes the pause or cancel made so far on to the loaded job, and
+        every later one straight to it."""
+
+        with self._lock:
+            self._job = job
+            if self._cancelled:
+                job.cancel()
+            elif self._paused:
+                job.pause()
+
+    def pause(self) -> None:
+        """Pauses the trainer, now or once it is loaded."""
+
+        with self._lock:
+            self._paused = True
+            if self._job is not None:
+                self._job.pause()
+
+    def resume(self) -> None:
+        """Resumes the trainer after pause()."""
+
+        with self._lock:
+            self._paused = False
+            if self._job is not None:
+                self._job.resume()
+
+    def cancel(self) -> None:
+        """Cancels the trainer, now or once it is loaded."""
+
+        with self._lock:
+            self._cancelled = True
+            if self._job is not None:
+                self._job.cancel()
+
 class Controller:
     """Class to control the View(GUI).
     
     Enables the data collector, bluetooth handler, and the trainer to
     communicate with the GUI and vice versa. 
+
+    Data collection and training run on a worker thread, so the GUI stays
+    responsive. They report their progress as messages on a queue, which
+    the GUI drains with poll_progress() from its own thread:
+        ("gesture", name):            a new gesture is to be made.
+        ("reps", collected, total):   reps collected so far.
+        ("epoch", epoch, total, result):
+                                      an epoch finished, with its validation
+                                      results or None.
+        ("collected", completed):     collection ended, completed being
+                                      False if it was cancelled.
+        ("trained", completed):       training ended, likewise.
+        ("error", message):           the job failed.
     """
 
     def __init__(self):
@@ -18,6 +80,10 @@ class Controller:
         self._collector: data_collector.DataCollector
         self._trainer: train.Trainer
 
+        # The running collector or trainer, and its progress messages
+        self._job = None
+        self._progress: queue.Queue = queue.Queue()
+
         # Instantiating the View(GUI)
         self._view = gui.View(self)
 
@@ -109,20 +175,126 @@ class Controller:
     def update_text(self, text: str):
         """Updates the current gesture being trained."""
 
-        self._view.curr_text.set(text)
-        self._view.update_idletasks()
+        self._progress.put(("gesture", text))
+
+    def update_progress(self, collected: int, total: int) -> None:
+        """Updates the number of reps collected."""
+
+        self._progress.put(("reps", collected, total))
+
+    def get_live_buffer(self):
+        """Gets the LiveBuffer of the collector's most recent readings."""
+
+        return self._collector.live
+
+    def get_frames_dropped(self) -> int:
+        """Gets the number of readings lost since connecting."""
+
+        return self._collector.frames_dropped
+
+    def poll_progress(self) -> List[Tuple[Any, ...]]:
+        """Takes the progress messages that arrived since the last call,
+        without blocking."""
+
+        messages = []
+        while True:
+            try:
+                messages.append(self._progress.get_nowait())
+            except queue.Empty:
+                return messages
 
     def run_data_collector(self) -> None:
         """Calls collector's collect data method to begin data collection."""
 
         self._collector.collect_data()
 
-    def train(self) -> None:
-        """Loads, trains, and saves a model."""
+    def start_data_collector(self) -> None:
+        """Runs the data collection on a worker thread."""
+
+        self._collector.reset()
+        self._start(self._collector, self._collect)
+
+    def _collect(self) -> None:
+        """Collects data, then reports whether it was completed."""
+
+        self.run_data_collector()
+        self._progress.put(("collected", not self._collector.cancelled))
+
+    def train(self, pending: Optional[PendingJob] = None) -> None:
+        """Loads, trains, and saves a model.
+
+        Nothing is saved if the training is cancelled.
+
+        Args:
+            pending:
+                The PendingJob to hand the trainer to once it is loaded, if
+                training was started with start_training().
+        """
 
         self._load_trainer()
-        self._trainer.train()
+        if pending is not None:
+            pending.attach(self._trainer)
+        self._trainer.train(
+            on_epoch=lambda epoch, result: self._progress.put(
+                ("epoch", epoch, self._num_epochs, result)))
+        if self._trainer.cancelled:
+            return
         torch.save(self._model.state_dict(), self._model_path)
+        self._trainer.save_artifact(self._artifact_path, self._gestures)
+
+    def start_training(self) -> None:
+        """Runs the training on a worker thread.
+
+        The trainer is loaded on the worker thread, as loading the data
+        takes a while, so a PendingJob takes any pause or cancel meanwhile.
+        """
+
+        pending = PendingJob()
+        self._start(pending, lambda: self._train(pending))
+
+    def _train(self, pending: PendingJob) -> None:
+        """Trains, then reports whether it was completed."""
+
+        self.train(pending)
+        self._progress.put(("trained", not self._trainer.cancelled))
+
+    def _start(self, job, work) -> None:
+        """Runs work on a daemon thread, reporting any error it raises.
+
+        Args:
+            job:
+                The collector, or PendingJob of the trainer, that pause(),
+                resume() and cancel() act on.
+            work:
+                The function to run.
+        """
+
+        def run():
+            try:
+                work()
+            except Exception as error:
+                self._progress.put(("error", str(error)))
+
+        self._job = job
+        threading.Thread(target=run, daemon=True).start()
+
+    def pause(self) -> None:
+        """Pauses the running collection or training."""
+
+        if self._job is not None:
+            self._job.pause()
+
+    def resume(self) -> None:
+        """Resumes the paused collection or training."""
+
+        if self._job is not None:
+            self._job.resume()
+
+    def cancel(self) -> None:
+        """Cancels the running collection or training."""
+
+        if self._job is not None:
+            self._job.cancel()
 
     def _load_trainer(self):
         """Loads a model and a trainer with the current parameters in config.
@@ -136,33 +308,38 @@ class Controller:
         # Set up parameters
         num_sensors = 0
         num_gestures = 0
-        learning_cap = 0
+        hyperparams = {}
         data = ""
         batch_size = 0
         num_epochs = 0
         lr = 0
         self._model_path = ""
+        self._artifact_path = ""
+        self._gestures = []
         with open("src/config.yaml") as config:
             configyaml = yaml.load(config, Loader=yaml.loader.FullLoader)
 
             # General parameters
             num_sensors = configyaml["general"]["num_sensors"]
-            num_gestures = len(configyaml["general"]["gestures"])
+            self._gestures = configyaml["general"]["gestures"]
+            num_gestures = len(self._gestures)
 
             # Hyperparameters for machine learning
-            learning_cap = configyaml["hyperparams"]["learning_capacity"]
+            hyperparams = configyaml["hyperparams"]
             batch_size = configyaml["hyperparams"]["batch_size"]
             num_epochs = configyaml["hyperparams"]["num_epochs"]
             lr = configyaml["hyperparams"]["lr"]
+            self._num_epochs = num_epochs
 
             # File paths
             data = f"data/{configyaml['filenames']['data']}.csv"
             self._model_path = f"trained_models/{configyaml['filenames']['trained_model']}.pth"
+            self._artifact_path = f"trained_models/{configyaml['filenames']['trained_model']}{artifact.EXTENSION}"
 
         # Instantiate model
-        self._model = feed_forward.FeedForwardModel(num_sensors,
-                                            num_gestures,
-                                            learning_cap)
+        self._model = train.build_model(hyperparams,
+                                        num_sensors,
+                                        num_gestures)
 
         # Choose optimiser function
         optimiser_function = torch.optim.SGD
@@ -173,7 +350,8 @@ class Controller:
                         num_epochs,
                         lr,
                         self._model,
-                        optimiser_function)
+                        optimiser_function,
+                        hyperparams.get("split_seed"))
 
 if __name__ == "__main__":
     controller = Controller()
@@ -0,0 +1,466 @@
+"""Publishes a glove's recent frames and predictions in shared memory.
+
+An alternative to the gesture server for processes on the same machine.
+The publisher owns the glove through an API and writes every frame, with
+the gesture predicted from it, into a ring of slots in a
+multiprocessing.shared_memory block. Readers in other processes attach to
+the block by name and read the newest frame, or a window of recent frames,
+straight from memory with no socket, lock or system call.
+
+Each slot is guarded by a sequence counter, seqlock style. The writer makes
+the counter odd, writes the slot, then makes it even. A reader copies the
+slot and checks the counter was the same even number before and after, and
+retries otherwise, so it never sees a half written frame and never blocks
+the writer.
+
+The block is laid out as:
+    header      HEADER_FIELDS uint64s: magic, number of sensors, number of
+                slots, frames written, metadata sequence, metadata length
+    metadata    METADATA_BYTES of UTF-8 JSON with the gesture list and the
+                model name, guarded by the metadata sequence
+    slots       the ring, see slot_dtype()
+"""
+
+import json
+import sys
+import time
+from multiprocessing import resource_tracker, shared_memory
+from threading import Event, Thread
+from typing import Any, Dict, List, NamedTuple, Optional
+
+import numpy as np
+
+MAGIC = 0x53534652414D4532  # "SSFRAME2"
+HEADER_FIELDS = 6
+METADATA_BYTES = 4096
+
+# Indices of the header fields
+_MAGIC, _NUM_SENSORS, _CAPACITY, _HEAD, _META_SEQ, _META_LEN = range(6)
+
+# The blocks created by publishers in this process
+_created = set()
+
+def slot_dtype(num_sensors: int) -> np.dtype:
+    """The layout of one slot of the ring.
+
+    Aligned like a C struct, so the slot is padded to a multiple of 8 bytes
+    and the seq of every slot is 8 byte aligned, which keeps its loads and
+    stores single, untorn accesses.
+    """
+
+    return np.dtype([("seq", "<u8"),
+                     ("notified_ns", "<i8"),
+                     ("predicted_ns", "<i8"),
+                     ("index", "<i4"),
+                     ("confidence", "<f4"),
+                     ("frame", "<f4", (num_sensors,))], align=True)
+
+class SharedFrame(NamedTuple):
+    """A frame and its prediction read from shared memory.
+
+    Attributes:
+        seq:
+            The number of frames published before this one.
+        notified_ns:
+            The time.monotonic_ns() at which the frame arrived from the
+            glove.
+        predicted_ns:
+            The time.monotonic_ns() at which its gesture was predicted.
+        index:
+            The index of the predicted gesture in the gesture list.
+        confidence:
+            The softmax probability of the predicted gesture.
+        frame:
+            An array of the sensor readings.
+    """
+
+    seq: int
+    notified_ns: int
+    predicted_ns: int
+    index: int
+    confidence: float
+    frame: np.ndarray
+
+class _Block:
+    """Views of the header, metadata and ring of a shared memory block."""
+
+    def __init__(self, shm: shared_memory.SharedMemory, num_sensors: int,
+                 capacity: int):
+        self.shm = shm
+        self.header = np.ndarray(HEADER_FIELDS, dtype="<u8", buffer=shm.buf)
+        self.metadata = np.ndarray(METADATA_BYTES, dtype=np.uint8,
+                                   buffer=shm.buf,
+                                   offset=self.header.nbytes)
+        self.ring = np.ndarray(capacity, dtype=slot_dtype(num_sensors),
+                               buffer=shm.buf,
+                               offset=self.header.nbytes + METADATA_BYTES)
+
+        # Each field of the ring as its own array, so a store is one write
+        self.seq = self.ring["seq"]
+        self.notified_ns = self.ring["notified_ns"]
+        self.predicted_ns = self.ring["predicted_ns"]
+        self.index = self.ring["index"]
+        self.confidence = self.ring["confidence"]
+        self.frame = self.ring["frame"]
+
+    @staticmethod
+    def size(num_sensors: int, capacity: int) -> int:
+        """The number of bytes a block needs."""
+
+        return (HEADER_FIELDS * 8 + METADATA_BYTES
+                + capacity * slot_dtype(num_sensors).itemsize)
+
+    def release(self) -> None:
+        """Drops the views so the block can be closed."""
+
+        del self.header, self.metadata, self.ring, self.seq
+        del self.notified_ns, self.predicted_ns, self.index
+        del self.confidence, self.frame
+
+class SharedFramePublisher:
+    """Writes an API's frames and predictions into shared memory.
+
+    Reads and predicts every frame from the glove once on a background
+    thread, like the GestureServer, and writes them into the ring.
+
+    Args:
+        api:
+            The set up API that owns the glove. The publisher reads from the
+            glove on its own thread, so nothing else should read from it.
+        name:
+            The name of the shared memory block readers attach to.
+        capacity:
+            The number of recent frames kept in the ring.
+        max_batch:
+            The most frames read and predicted in one batch.
+    """
+
+    def __init__(self,
+                 api,
+                 name: str = "stretchsense_frames",
+                 capacity: int = 256,
+                 max_batch: int = 64):
+        self._api = api
+        self._max_batch: int = max_batch
+        self._capacity: int = capacity
+        self._num_sensors: int = api.peripheral.NUM_SENSORS
+
+        self._shm = shared_memory.SharedMemory(
+            name, create=True,
+            size=_Block.size(self._num_sensors, capacity))
+        _created.add(self._shm.name)
+        self._block = _Block(self._shm, self._num_sensors, capacity)
+        self._block.ring.fill(0)
+
+        header = self._block.header
+        header[_NUM_SENSORS] = self._num_sensors
+        header[_CAPACITY] = capacity
+        header[_HEAD] = 0
+        header[_META_SEQ] = 0
+        self._model_name: Optional[str] = None
+        self._write_metadata()
+
+        # Written last, so a reader never attaches to a half set up block
+        header[_MAGIC] = MAGIC
+
+        self._stop = Event()
+        self._thread = Thread(target=self._produce_loop, daemon=True)
+
+    @property
+    def name(self) -> str:
+        """The name of the shared memory block."""
+
+        return self._shm.name
+
+    def start(self) -> None:
+        """Starts publishing on a background thread."""
+
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stops publishing and removes the shared memory block.
+
+        Readers already attached keep their mapping until they close it.
+        """
+
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join()
+        self._block.release()
+        self._shm.close()
+        self._shm.unlink()
+        _created.discard(self._shm.name)
+
+    def write(self,
+              frames: np.ndarray,
+              timestamps: np.ndarray,
+              indices: np.ndarray,
+              confidences: np.ndarray) -> None:
+        """Writes a batch of frames and their predictions into the ring.
+
+        Args:
+            frames:
+                An array of shape (n, num_sensors) of sensor readings.
+            timestamps:
+                An int64 array of shape (n,) of the time.monotonic_ns() at
+                which each frame arrived.
+            indices:
+                An array of shape (n,) of predicted gesture indices.
+            confidences:
+                An array of shape (n,) of the predicted gestures'
+                probabilities.
+        """
+
+        block = self._block
+        header = block.header
+        predicted_ns = time.monotonic_ns()
+        head = int(header[_HEAD])
+
+        for row in range(len(frames)):
+            slot = head % self._capacity
+
+            # Odd while writing, even once written
+            block.seq[slot] = 2 * head + 1
+            block.notified_ns[slot] = timestamps[row]
+            block.predicted_ns[slot] = predicted_ns
+            block.index[slot] = indices[row]
+            block.confidence[slot] = confidences[row]
+            block.frame[slot] = frames[row]
+            block.seq[slot] = 2 * head + 2
+
+            head += 1
+            header[_HEAD] = head
+
+    def _write_metadata(self) -> None:
+        """Writes the gesture list and model name under the metadata
+        sequence."""
+
+        self._model_name = self._api.model_name
+        info = json.dumps({"gestures": self._api.gestures,
+                           "model": self._model_name}).encode()
+        if len(info) > METADATA_BYTES:
+            raise ValueError("gesture list too long for the metadata region")
+
+        header = self._block.header
+        header[_META_SEQ] += 1
+        self._block.metadata[:len(info)] = np.frombuffer(info, np.uint8)
+        header[_META_LEN] = len(info)
+        header[_META_SEQ] += 1
+
+    def _produce_loop(self) -> None:
+        """Reads, predicts and writes frames until stopped."""
+
+        peripheral = self._api.peripheral
+        frames = np.empty((self._max_batch, self._num_sensors))
+        timestamps = np.empty(self._max_batch, dtype=np.int64)
+
+        while not self._stop.is_set():
+            # Wait for one frame, then take every frame already waiting
+            first, _ = peripheral.read_sensors_batch(
+                1, timeout=1.0, out=frames[:1], out_timestamps=timestamps[:1])
+            if len(first) == 0:
+                continue
+            rest, _ = peripheral.read_sensors_batch(
+                self._max_batch - 1,
+                out=frames[1:],
+                out_timestamps=timestamps[1:])
+            num_frames = 1 + len(rest)
+
+            # Describe the new model before publishing its predictions
+            if self._api.model_name != self._model_name:
+                self._write_metadata()
+
+            indices, _, probs = self._api.predict_batch(
+                self._api.filter_batch(frames[:num_frames]))
+            confidences = probs[np.arange(num_frames), indices]
+            self.write(frames[:num_frames], timestamps[:num_frames],
+                       indices, confidences)
+
+class SharedFrameReader:
+    """Reads frames and predictions published by a SharedFramePublisher in
+    another process.
+
+    Also has the setup(), gestures and read_stamped_gesture_fast() of the
+    API, so it can stand in for one as a gesture source, e.g. for the
+    VirgoTeleopController.
+
+    Args:
+        name:
+            The name of the shared memory block to attach to.
+        poll_interval:
+            The number of seconds between checks for a new frame while
+            waiting for one.
+    """
+
+    def __init__(self,
+                 name: str = "stretchsense_frames",
+                 poll_interval: float = 0.0005):
+        # Attaching would otherwise register the block to be removed when
+        # this process exits, pulling it out from under a publisher in
+        # another process
+        if sys.version_info >= (3, 13):
+            self._shm = shared_memory.SharedMemory(name, track=False)
+        else:
+            self._shm = shared_memory.SharedMemory(name)
+            if self._shm.name not in _created:
+                # There is no track argument before Python 3.13, so undo the
+                # registration. The tracker knows the block by its private
+                # _name, which keeps the leading "/" that name drops.
+                resource_tracker.unregister(self._shm._name, "shared_memory")
+
+        self._poll_interval: float = poll_interval
+
+        header = np.ndarray(HEADER_FIELDS, dtype="<u8", buffer=self._shm.buf)
+        if header[_MAGIC] != MAGIC:
+            raise ValueError(f"{name} is not a shared frame block")
+        self._num_sensors: int = int(header[_NUM_SENSORS])
+        self._capacity: int = int(header[_CAPACITY])
+        del header
+
+        self._block = _Block(self._shm, self._num_sensors, self._capacity)
+        self._meta_seq: int = -1
+        self._info: Dict[str, Any] = {}
+
+        # The head when the last gesture was returned by
+        # read_stamped_gesture_fast()
+        self._last_head: int = 0
+
+    @property
+    def head(self) -> int:
+        """The number of frames published so far."""
+
+        return int(self._block.header[_HEAD])
+
+    @property
+    def gestures(self) -> List[str]:
+        """The list of gestures the publisher's model was trained with."""
+
+        return self._metadata()["gestures"]
+
+    @property
+    def model_name(self) -> str:
+        """The name of the publisher's model."""
+
+        return self._metadata()["model"]
+
+    def setup(self) -> None:
+        """Does nothing, the publisher owns the glove."""
+
+    def latest(self) -> Optional[SharedFrame]:
+        """Reads the newest frame.
+
+        Returns:
+            The SharedFrame, or None if nothing has been published yet.
+        """
+
+        while True:
+            head = self.head
+            if head == 0:
+                return None
+            frame = self._read_slot(head - 1)
+            if frame is not None:
+                return frame
+
+    def window(self, size: int, out: Optional[np.ndarray] = None) -> np.ndarray:
+        """Reads the newest frames.
+
+        Args:
+            size:
+                The number of frames to read. At most the ring's capacity.
+            out:
+                An optional float32 array of shape (size, num_sensors) to
+                read the frames into.
+
+        Returns:
+            An array of up to size frames, oldest first. Fewer are returned
+            if fewer have been published.
+        """
+
+        if out is None:
+            out = np.empty((size, self._num_sensors), dtype=np.float32)
+        block = self._block
+
+        while True:
+            head = self.head
+            first = max(0, head - min(size, self._capacity))
+            slots = np.arange(first, head) % self._capacity
+            expected = 2 * np.arange(first, head, dtype=np.uint64) + 2
+
+            # Copy, then check no slot was rewritten meanwhile
+            before = block.seq[slots]
+            np.take(block.frame, slots, axis=0, out=out[:len(slots)])
+            after = block.seq[slots]
+            if (np.array_equal(before, expected)
+                    and np.array_equal(after, expected)):
+                return out[:len(slots)]
+
+    def wait_newer(self, seq: int, timeout: Optional[float] = None
+                   ) -> Optional[SharedFrame]:
+        """Waits for a frame newer than the one with the given sequence
+        number and reads the newest frame.
+
+        Args:
+            seq:
+                The sequence number of the last frame seen, or -1.
+            timeout:
+                The most seconds to wait, or None to wait forever.
+
+        Returns:
+            The newest SharedFrame, or None if the timeout ran out.
+        """
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.head <= seq + 1:
+            if deadline is not None and time.monotonic() >= deadline:
+                return None
+            time.sleep(self._poll_interval)
+        return self.latest()
+
+    def read_stamped_gesture_fast(self) -> SharedFrame:
+        """Waits for a new frame and returns it, with the index,
+        notified_ns and predicted_ns of a StampedGesture."""
+
+        frame = self.wait_newer(self._last_head - 1)
+        self._last_head = frame.seq + 1
+        return frame
+
+    def close(self) -> None:
+        """Detaches from the shared memory block."""
+
+        self._block.release()
+        self._shm.close()
+
+    def _read_slot(self, seq: int) -> Optional[SharedFrame]:
+        """Copies a slot out, or returns None if it was being rewritten."""
+
+        block = self._block
+        slot = seq % self._capacity
+        expected = 2 * seq + 2
+
+        if block.seq[slot] != expected:
+            return None
+        frame = SharedFrame(seq,
+                            int(block.notified_ns[slot]),
+                            int(block.predicted_ns[slot]),
+                            int(block.index[slot]),
+                            float(block.confidence[slot]),
+                            block.frame[slot].copy())
+        if block.seq[slot] != expected:
+            return None
+        return frame
+
+    def _metadata(self) -> Dict[str, Any]:
+        """Reads the metadata if the publisher has changed it."""
+
+        header = self._block.header
+        while True:
+            meta_seq = int(header[_META_SEQ])
+            if meta_seq == self._meta_seq:
+                return self._info
+            if meta_seq % 2:
+                continue
+            info = bytes(self._block.metadata[:int(header[_META_LEN])])
+            if int(header[_META_SEQ]) == meta_seq:
+                self._info = json.loads(info)
+                self._meta_seq = meta_seq
+                return self._info
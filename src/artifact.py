@@ -0,0 +1,194 @@
+"""Self-describing single file model artifacts.
+
+An artifact bundles everything needed to use a trained model: its
+architecture and dimensions, the gesture names, the normalisation stats of
+the data it was trained on, training metadata and the weights. Loading one
+needs neither the config file nor a matching model class setup.
+
+The file is laid out as:
+    MAGIC (8 bytes)
+    header length (uint64, little endian)
+    header (UTF-8 JSON)
+    padding, then each tensor's raw little endian data, every tensor
+    starting on an ALIGNMENT byte boundary
+so the weights can be memory-mapped in place rather than read and copied.
+"""
+
+import json
+import struct
+from typing import Any, Dict, List, NamedTuple, Optional
+
+import numpy as np
+import torch
+
+from .models import cascade
+from .models import ensemble
+from .models import feed_forward
+from .models import logistic_regression
+from .models import nearest_centroid
+from .models import temporal_conv
+
+MAGIC = b"SSGMOD1\x00"
+ALIGNMENT = 64
+EXTENSION = ".model"
+
+# The model classes an artifact can hold, by name
+ARCHITECTURES = {
+    "FeedForwardModel": feed_forward.FeedForwardModel,
+    "LogisticRegressionModel": logistic_regression.LogisticRegressionModel,
+    "CascadeModel": cascade.CascadeModel,
+    "NearestCentroidModel": nearest_centroid.NearestCentroidModel,
+    "TemporalConvModel": temporal_conv.TemporalConvModel,
+    "EnsembleModel": ensemble.EnsembleModel,
+}
+
+class Artifact(NamedTuple):
+    """A model loaded from an artifact.
+
+    Attributes:
+        model:
+            The model, with weights backed by the memory-mapped file.
+        gestures:
+            The list of gestures the model was trained with, in index order.
+        num_sensors:
+            The number of sensors the model takes readings from.
+        normalization:
+            A dictionary with the per-sensor "mean" and "std" of the data the
+            model was trained on.
+        metadata:
+            A dictionary of training metadata.
+    """
+
+    model: torch.nn.Module
+    gestures: List[str]
+    num_sensors: int
+    normalization: Dict[str, List[float]]
+    metadata: Dict[str, Any]
+
+def _align(offset: int) -> int:
+    """Rounds an offset up to the next ALIGNMENT boundary."""
+
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+def save(path: str,
+         model: torch.nn.Module,
+         gestures: List[str],
+         normalization: Optional[Dict[str, List[float]]] = None,
+         metadata: Optional[Dict[str, Any]] = None) -> None:
+    """Writes a trained model to an artifact.
+
+    Args:
+        path:
+            The path of the artifact file to write.
+        model:
+            The trained model. Its class must be in ARCHITECTURES and
+            provide artifact_dims().
+        gestures:
+            The list of gestures the model was trained with.
+        normalization:
+            A dictionary with the per-sensor "mean" and "std" of the training
+            data.
+        metadata:
+            A dictionary of JSON serialisable training metadata.
+
+    Raises:
+        ValueError if the model's class is not supported.
+    """
+
+    architecture = type(model).__name__
+    if architecture not in ARCHITECTURES:
+        raise ValueError(f"cannot save a {architecture} as an artifact")
+
+    # Lay the tensors out one after another, each aligned
+    tensors = {name: tensor.detach().cpu().contiguous().to(torch.float32)
+               .numpy().astype("<f4", copy=False)
+               for name, tensor in model.state_dict().items()}
+    table = {}
+    offset = 0
+    for name, array in tensors.items():
+        table[name] = {"dtype": "<f4",
+                       "shape": list(array.shape),
+                       "offset": offset}
+        offset = _align(offset + array.nbytes)
+
+    dims = model.artifact_dims()
+    header = json.dumps({
+        "architecture": architecture,
+        "dims": dims,
+        "num_sensors": dims["num_sensors"],
+        "gestures": list(gestures),
+        "normalization": normalization or {},
+        "metadata": metadata or {},
+        "tensors": table,
+    }).encode()
+
+    # The tensor data starts on the first aligned offset after the header
+    data_start = _align(len(MAGIC) + 8 + len(header))
+
+    with open(path, "wb") as artifact_file:
+        artifact_file.write(MAGIC)
+        artifact_file.write(struct.pack("<Q", len(header)))
+        artifact_file.write(header)
+        for name, array in tensors.items():
+            artifact_file.seek(data_start + table[name]["offset"])
+            artifact_file.write(array.tobytes())
+
+def load(path: str) -> Artifact:
+    """Loads a model from an artifact by memory-mapping its weights.
+
+    The file is mapped copy-on-write, so the weights are read from the page
+    cache on first use and never written back to the file.
+
+    Args:
+        path:
+            The path of the artifact file.
+
+    Returns:
+        The loaded Artifact.
+
+    Raises:
+        ValueError if the file is not an artifact or holds an unsupported
+        architecture.
+    """
+
+    mapped = np.memmap(path, dtype=np.uint8, mode="c")
+    if bytes(mapped[:len(MAGIC)]) != MAGIC:
+        raise ValueError(f"{path} is not a model artifact")
+
+    header_length, = struct.unpack("<Q", bytes(mapped[len(MAGIC):len(MAGIC) + 8]))
+    header_start = len(MAGIC) + 8
+    header = json.loads(bytes(mapped[header_start:header_start + header_length]))
+    data_start = _align(header_start + header_length)
+
+    architecture = header["architecture"]
+    if architecture not in ARCHITECTURES:
+        raise ValueError(f"{path} holds an unsupported {architecture}")
+    model = ARCHITECTURES[architecture](**header["dims"])
+
+    # Point every parameter at its slice of the mapped file
+    for name, entry in header["tensors"].items():
+        array = np.ndarray(entry["shape"],
+                           dtype=entry["dtype"],
+                           buffer=mapped,
+                           offset=data_start + entry["offset"])
+        _assign(model, name, torch.from_numpy(array))
+
+    return Artifact(model.eval(),
+                    header["gestures"],
+                    header["num_sensors"],
+                    header["normalization"],
+                    header["metadata"])
+
+def _assign(model: torch.nn.Module, name: str, tensor: torch.Tensor) -> None:
+    """Replaces a parameter or buffer of a model without copying."""
+
+    *module_names, attr = name.split(".")
+    module = model
+    for module_name in module_names:
+        module = getattr(module, module_name)
+
+    if attr in module._parameters:
+        module._parameters[attr] = torch.nn.Parameter(tensor,
+                                                      requires_grad=False)
+    else:
+        module._buffers[attr] = tensor
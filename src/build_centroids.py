@@ -0,0 +1,46 @@
+"""Script for building a nearest centroid model straight from a recorded
+data set, with no training.
+
+Run from the repository root with:
+    $ python3 -m src.build_centroids data/virgo.csv
+"""
+
+import argparse
+import os
+import time
+
+from . import artifact
+from . import dataset
+from .models import nearest_centroid
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("data", help="path to a raw data .csv file")
+    parser.add_argument("--out", help="artifact to save, defaults to "
+                        "trained_models/<data name>_centroid.model")
+    args = parser.parse_args()
+
+    ds = dataset.CapacitanceDataset(args.data)
+
+    start = time.perf_counter()
+    model = nearest_centroid.NearestCentroidModel.from_dataset(ds)
+    elapsed = time.perf_counter() - start
+
+    # The gesture names, in index order
+    gestures = dataset.gesture_names(args.data)
+
+    out = args.out
+    if out is None:
+        name = os.path.splitext(os.path.basename(args.data))[0]
+        out = os.path.join("trained_models",
+                           f"{name}_centroid{artifact.EXTENSION}")
+    artifact.save(out, model, gestures,
+                  {"mean": model.mean.tolist(), "std": model.scale.tolist()},
+                  {"data_file": args.data, "num_samples": len(ds),
+                   "filter": ds.filter_config._asdict()})
+
+    print(f"built from {len(ds)} samples of {len(gestures)} gestures in "
+          f"{elapsed * 1e3:.2f} ms, saved {out}")
+
+if __name__ == "__main__":
+    main()
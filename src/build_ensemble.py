@@ -0,0 +1,98 @@
+"""Script for building an ensemble from several trained feed forward models.
+
+Stacks trained FeedForwardModels, for instance trained with different seeds
+or learning capacities, into an EnsembleModel that averages them, and saves
+it as an artifact. Prints the accuracy and cost per frame of each model and
+of the ensemble on a recorded data set.
+
+The accuracy is only held out if every model was trained on the data set by
+the Trainer with the same split_seed hyperparameter, which their artifacts
+record. It is then measured on the validation split they all left out.
+Otherwise it is measured on the whole data set, and labelled as not held
+out.
+
+Run from the repository root with:
+    $ python3 -m src.build_ensemble trained_models/virgo.pth trained_models/virgo_64.pth data/virgo.csv
+"""
+
+import argparse
+import os
+import sys
+
+from . import artifact
+from . import dataset
+from . import inference
+from . import timing
+from . import train
+from .evaluate import load_model, training_filter, training_metadata
+from .models import ensemble
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("models", nargs="+",
+                        help="trained FeedForwardModels")
+    parser.add_argument("data", help="path to a raw data .csv file")
+    parser.add_argument("--out", help="artifact to save, defaults to "
+                        "trained_models/<data name>_ensemble.model")
+    args = parser.parse_args()
+
+    members = [load_model(path) for path in args.models]
+    model = ensemble.EnsembleModel.from_models(members)
+    num_sensors = model.artifact_dims()["num_sensors"]
+
+    # The data, filtered as in training
+    filter_configs = {training_filter(path) for path in args.models}
+    if len(filter_configs) > 1:
+        sys.exit("the models were trained on differently filtered data")
+    ds = dataset.CapacitanceDataset(args.data, filter_configs.pop())
+    if ds.inputs.shape[1] != num_sensors:
+        sys.exit(f"{args.data} has {ds.inputs.shape[1]} sensors, but the "
+                 f"models take {num_sensors}")
+    gestures = dataset.gesture_names(args.data)
+
+    # Only the validation split every model left out is held out
+    split_seeds = set()
+    for path in args.models:
+        metadata = training_metadata(path)
+        same_data = (os.path.normpath(metadata.get("data_file", ""))
+                     == os.path.normpath(args.data)
+                     and metadata.get("split_block") == dataset.SPLIT_BLOCK)
+        split_seeds.add(metadata.get("split_seed") if same_data else None)
+    if len(split_seeds) == 1 and None not in split_seeds:
+        split_seed = split_seeds.pop()
+        _, held_out = train.split_indices(ds.blocks, split_seed)
+        inputs, labels = ds.inputs[held_out], ds.labels[held_out].long()
+        print(f"{len(labels)} held out frames from {args.data}, the "
+              f"validation split of seed {split_seed}\n")
+    else:
+        split_seed = None
+        inputs, labels = ds.inputs, ds.labels.long()
+        print(f"all {len(labels)} frames from {args.data}, NOT held out: the "
+              f"models were not all trained on it with the same split_seed, "
+              f"so they may have been trained on these frames\n")
+
+    frames = inputs.numpy()
+    print(f"{'model':<40}{'accuracy':>10}{'us/frame':>10}")
+    for path, part in [*zip(args.models, members), ("ensemble", model)]:
+        predictions = part.predict_batch(inputs)[0]
+        accuracy = (predictions == labels).double().mean().item()
+        latency = timing.per_frame_us(
+            inference.InferenceSession(part, num_sensors).predict, frames)
+        print(f"{path:<40}{accuracy:>10.4f}{latency:>10.1f}")
+
+    out = args.out
+    if out is None:
+        name = os.path.splitext(os.path.basename(args.data))[0]
+        out = os.path.join("trained_models",
+                           f"{name}_ensemble{artifact.EXTENSION}")
+    artifact.save(out, model, gestures, metadata={
+        "data_file": args.data,
+        "filter": ds.filter_config._asdict(),
+        "split_seed": split_seed,
+        "split_block": dataset.SPLIT_BLOCK,
+        "members": args.models,
+    })
+    print(f"\nsaved {out}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""Script for building a calibrated cascade from two trained models.
+
+Combines a trained LogisticRegressionModel and FeedForwardModel into a
+CascadeModel, tunes its confidence threshold on the validation split both
+models were trained without to reach a target accuracy, and saves it as an
+artifact. Prints the accuracy of each model and of the cascade, the
+escalation rate, and the cost per frame of each.
+
+Both models must have been trained on the data set by the Trainer with the
+same split_seed hyperparameter, which their artifacts record, e.g. with
+architecture logistic_regression for the fast one.
+
+Run from the repository root with:
+    $ python3 -m src.calibrate trained_models/virgo_lr.pth trained_models/virgo.pth data/virgo.csv --target 0.99
+"""
+
+import argparse
+import os
+import sys
+
+from . import artifact
+from . import dataset
+from . import inference
+from . import timing
+from . import train
+from .evaluate import load_model, training_filter, training_metadata
+from .models import cascade
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("fast", help="trained LogisticRegressionModel")
+    parser.add_argument("accurate", help="trained FeedForwardModel")
+    parser.add_argument("data", help="path to a raw data .csv file")
+    parser.add_argument("--target", type=float, default=0.99,
+                        help="accuracy to reach on the validation split")
+    parser.add_argument("--out", help="artifact to save, defaults to "
+                        "trained_models/<data name>_cascade.model")
+    args = parser.parse_args()
+
+    model = cascade.CascadeModel.from_models(load_model(args.fast),
+                                             load_model(args.accurate))
+    num_sensors = model.artifact_dims()["num_sensors"]
+
+    # Both models must have left out the same validation split of the data
+    splits = [training_metadata(path) for path in (args.fast, args.accurate)]
+    for path, metadata in zip((args.fast, args.accurate), splits):
+        if (metadata.get("split_seed") is None
+                or metadata.get("split_block") != dataset.SPLIT_BLOCK
+                or os.path.normpath(metadata.get("data_file", ""))
+                != os.path.normpath(args.data)):
+            sys.exit(f"{path} has no artifact recording a training split of "
+                     f"{args.data}, train it there with a split_seed")
+    if splits[0]["split_seed"] != splits[1]["split_seed"]:
+        sys.exit(f"{args.fast} and {args.accurate} were trained on different "
+                 f"splits, train them with the same split_seed")
+
+    # That split, filtered as in training
+    filter_configs = {training_filter(path)
+                      for path in (args.fast, args.accurate)}
+    if len(filter_configs) > 1:
+        sys.exit(f"{args.fast} and {args.accurate} were trained on "
+                 f"differently filtered data")
+    ds = dataset.CapacitanceDataset(args.data, filter_configs.pop())
+    if ds.inputs.shape[1] != num_sensors:
+        sys.exit(f"{args.data} has {ds.inputs.shape[1]} sensors, but the "
+                 f"models take {num_sensors}")
+    _, held_out = train.split_indices(ds.blocks, splits[0]["split_seed"])
+    inputs, labels = ds.inputs[held_out], ds.labels[held_out].long()
+    gestures = dataset.gesture_names(args.data)
+
+    result = model.calibrate(inputs, labels, args.target)
+
+    # Accuracy and cost of each model on the held out split
+    frames = inputs.numpy()
+    macs = model.macs()
+    print(f"{len(labels)} validation frames from {args.data}, split seed "
+          f"{splits[0]['split_seed']}\n")
+    print(f"{'model':<20}{'accuracy':>10}{'MACs':>10}{'us/frame':>10}")
+    for name, part, part_macs in (("logistic regression", model.fast,
+                                   macs["fast"]),
+                                  ("feed forward", model.accurate,
+                                   macs["accurate"])):
+        predictions = part.predict_batch(inputs)[0]
+        accuracy = (predictions == labels).double().mean().item()
+        latency = timing.per_frame_us(
+            inference.InferenceSession(part, num_sensors).predict, frames)
+        print(f"{name:<20}{accuracy:>10.4f}{part_macs:>10d}{latency:>10.1f}")
+
+    model.reset_stats()
+    latency = timing.per_frame_us(
+        inference.InferenceSession(model, num_sensors).predict, frames)
+    stats = model.stats()
+    print(f"{'cascade':<20}{result['accuracy']:>10.4f}"
+          f"{stats['macs_per_frame']:>10.1f}{latency:>10.1f}")
+    print(f"\nthreshold {result['threshold']:.4f} for a target of "
+          f"{args.target}, {result['escalation_rate']:.1%} of frames "
+          f"escalated, {stats['relative_cost']:.2f}x the MACs of the feed "
+          f"forward network alone")
+
+    out = args.out
+    if out is None:
+        name = os.path.splitext(os.path.basename(args.data))[0]
+        out = os.path.join("trained_models",
+                           f"{name}_cascade{artifact.EXTENSION}")
+    artifact.save(out, model, gestures, metadata={
+        "data_file": args.data,
+        "filter": ds.filter_config._asdict(),
+        "split_seed": splits[0]["split_seed"],
+        "split_block": dataset.SPLIT_BLOCK,
+        "target_accuracy": args.target,
+        "calibrated_accuracy": result["accuracy"],
+        "escalation_rate": result["escalation_rate"],
+        "fast": args.fast,
+        "accurate": args.accurate,
+    })
+    print(f"saved {out}")
+
+if __name__ == "__main__":
+    main()
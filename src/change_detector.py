@@ -0,0 +1,275 @@
+"""Detects when the hand moves and settles in a stream of readings.
+
+Used to run the model only once per held pose rather than on every frame.
+The stream alternates between two states:
+
+    steady:   the hand is held. A move is detected when the readings drift
+              move_threshold away from where they settled, or when a CUSUM
+              of the frame to frame change, less an allowance for noise,
+              reaches move_threshold, which catches moves made of many
+              small steps.
+    moving:   the hand is moving. It settles once settle_frames frames in a
+              row each change by less than settle_threshold.
+
+Each transition is a segment boundary, reported as a SegmentEvent. The
+detector keeps O(1) state per frame in preallocated arrays.
+
+GatedPredictor puts a detector in front of the model, reusing the last
+decision for every frame but those at which the hand settles.
+"""
+
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, NamedTuple, Optional, Tuple
+
+import numpy as np
+import torch
+
+from . import timing
+
+MOVED = "moved"
+SETTLED = "settled"
+
+class SegmentEvent(NamedTuple):
+    """A segment boundary in the stream of readings.
+
+    Attributes:
+        kind:
+            MOVED when the hand started moving, SETTLED when it came to
+            rest.
+        frame_index:
+            The index of the frame the boundary was detected at.
+        timestamp_ns:
+            The time.monotonic_ns() at which that frame arrived.
+        delay_ns:
+            For SETTLED, the time from the last frame that moved to the
+            detection, i.e. the latency the detector adds to the decision.
+            0 for MOVED.
+    """
+
+    kind: str
+    frame_index: int
+    timestamp_ns: int
+    delay_ns: int = 0
+
+class ChangeDetector:
+    """A streaming move and settle detector for sensor readings.
+
+    Args:
+        num_sensors:
+            The number of sensors in each frame.
+        move_threshold:
+            How far, in reading units on any one sensor, the readings must
+            move from where they settled, or the CUSUM must climb, for a
+            move to be detected.
+        settle_threshold:
+            The largest frame to frame change on any sensor that counts as
+            still.
+        settle_frames:
+            The number of still frames in a row after which the hand has
+            settled.
+        drift:
+            The frame to frame change the CUSUM allows for noise.
+        max_events:
+            The number of recent events kept in events.
+        on_event:
+            An optional function called with every SegmentEvent.
+
+    Attributes:
+        events:
+            The most recent SegmentEvents, oldest first.
+        frames:
+            The number of frames seen.
+        delay:
+            A LatencyHistogram of the delay of every SETTLED event.
+    """
+
+    def __init__(self,
+                 num_sensors: int,
+                 move_threshold: float = 5.0,
+                 settle_threshold: float = 1.5,
+                 settle_frames: int = 5,
+                 drift: float = 1.0,
+                 max_events: int = 1000,
+                 on_event: Optional[Callable[[SegmentEvent], None]] = None):
+        self.move_threshold: float = move_threshold
+        self.settle_threshold: float = settle_threshold
+        self.settle_frames: int = settle_frames
+        self.drift: float = drift
+        self.on_event = on_event
+
+        # Where the readings settled, the previous frame, and scratch space
+        # for the per-sensor differences
+        self._reference = np.zeros(num_sensors)
+        self._previous = np.zeros(num_sensors)
+        self._difference = np.zeros(num_sensors)
+
+        # Start moving, so the first pose held is reported as settled
+        self.moving: bool = True
+        self._cusum: float = 0.0
+        self._still_frames: int = 0
+        self._last_moved_ns: int = 0
+
+        self.events: Deque[SegmentEvent] = deque(maxlen=max_events)
+        self.frames: int = 0
+        self.delay = timing.LatencyHistogram()
+
+    def update(self,
+               frame: np.ndarray,
+               timestamp_ns: Optional[int] = None) -> Optional[SegmentEvent]:
+        """Feeds in the next frame.
+
+        Args:
+            frame:
+                An array of shape (num_sensors,) of sensor readings.
+            timestamp_ns:
+                The time.monotonic_ns() at which the frame arrived. Defaults
+                to now.
+
+        Returns:
+            The SegmentEvent detected at this frame, or None.
+        """
+
+        if timestamp_ns is None:
+            timestamp_ns = time.monotonic_ns()
+        index = self.frames
+        self.frames += 1
+
+        # Largest change on any sensor since the previous frame
+        difference = self._difference
+        np.subtract(frame, self._previous, out=difference)
+        np.abs(difference, out=difference)
+        step = difference.max() if index else np.inf
+        self._previous[:] = frame
+
+        event = None
+        if self.moving:
+            if step < self.settle_threshold:
+                self._still_frames += 1
+            else:
+                self._still_frames = 0
+                self._last_moved_ns = timestamp_ns
+
+            if self._still_frames >= self.settle_frames:
+                self.moving = False
+                self._reference[:] = frame
+                self._cusum = 0.0
+                delay_ns = timestamp_ns - self._last_moved_ns
+                self.delay.record(delay_ns)
+                event = SegmentEvent(SETTLED, index, timestamp_ns, delay_ns)
+        else:
+            # Drift from where the readings settled
+            np.subtract(frame, self._reference, out=difference)
+            np.abs(difference, out=difference)
+            displacement = difference.max()
+            self._cusum = max(0.0, self._cusum + step - self.drift)
+
+            if (displacement > self.move_threshold
+                    or self._cusum > self.move_threshold):
+                self.moving = True
+                self._still_frames = 0
+                self._last_moved_ns = timestamp_ns
+                event = SegmentEvent(MOVED, index, timestamp_ns)
+
+        if event is not None:
+            self.events.append(event)
+            if self.on_event is not None:
+                self.on_event(event)
+        return event
+
+    def stats(self) -> Dict[str, float]:
+        """Returns the number of frames seen, of segments settled, and a
+        summary of the delay added to each decision."""
+
+        return {"frames": self.frames,
+                "settled_segments": self.delay.count,
+                "decision_delay": self.delay.snapshot()}
+
+class GatedPredictor:
+    """Runs the model only when the hand has settled in a new pose.
+
+    Every frame is fed to a ChangeDetector. The model is run on the frame at
+    which a SETTLED event is detected, and on the first frame seen with a
+    model, and every other frame reuses the last decision. While the hand is
+    moving the decision therefore stays that of the previous pose, and the
+    new decision arrives ChangeDetector.delay after the hand stops.
+
+    Args:
+        detector:
+            The ChangeDetector to gate on.
+
+    Attributes:
+        frames:
+            The number of frames seen.
+        inferences:
+            The number of frames the model was run on.
+    """
+
+    def __init__(self, detector: ChangeDetector):
+        self.detector: ChangeDetector = detector
+
+        # The last decision and the model it was made with
+        self._decision: Optional[Tuple[int, torch.Tensor]] = None
+        self._owner = None
+
+        self.frames: int = 0
+        self.inferences: int = 0
+
+    def predict(self,
+                owner,
+                frame: np.ndarray,
+                predict: Callable[[np.ndarray],
+                                  Tuple[int, torch.Tensor]],
+                timestamp_ns: Optional[int] = None,
+                timings: Optional[timing.StageTimings] = None
+                ) -> Tuple[int, torch.Tensor]:
+        """Predicts the gesture for a frame, or reuses the last decision.
+
+        Args:
+            owner:
+                The LoadedModel predict runs. A new decision is made
+                whenever a different one is passed, so the decision of a
+                swapped out model is never returned.
+            frame:
+                An array of shape (num_sensors,) of sensor readings.
+            predict:
+                Runs the model on a frame, returning the index of the
+                predicted gesture and the model's output.
+            timestamp_ns:
+                The time.monotonic_ns() at which the frame arrived. Defaults
+                to now.
+            timings:
+                The StageTimings to record the gate into, or None to skip
+                timing.
+
+        Returns:
+            A tuple of the index of the predicted gesture and the model's
+            output of the last decision.
+        """
+
+        start_ns = time.monotonic_ns()
+        event = self.detector.update(frame, timestamp_ns)
+        self.frames += 1
+
+        decision = self._decision
+        if (decision is None or owner is not self._owner
+                or (event is not None and event.kind == SETTLED)):
+            index, output = predict(frame)
+            decision = (index, output.clone())
+            self._decision = decision
+            self._owner = owner
+            self.inferences += 1
+        elif timings is not None:
+            timings.record("gate_skip", time.monotonic_ns() - start_ns)
+
+        return decision
+
+    def stats(self) -> Dict[str, float]:
+        """Returns the number of frames seen and run through the model, the
+        fraction skipped, and the detector's stats."""
+
+        stats = self.detector.stats()
+        stats.update({"inferences": self.inferences,
+                      "skipped_fraction":
+                          1 - self.inferences / max(self.frames, 1)})
+        return stats
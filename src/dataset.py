@@ -1,18 +1,111 @@
+import numpy as np
 import pandas as pd
 import torch
 import yaml
 from torch.utils.data import Dataset
-from typing import Tuple
+from typing import List, Optional, Tuple
+
+from . import filters
+
+# The most seconds between consecutive readings of one contiguous segment
+MAX_FRAME_INTERVAL = 0.1
+
+# The most consecutive readings of a segment put on the same side of the
+# split into training and validation together
+SPLIT_BLOCK = 50
+
+def segment_bounds(labels: np.ndarray,
+                   timestamps: Optional[np.ndarray] = None,
+                   max_interval: float = MAX_FRAME_INTERVAL) -> np.ndarray:
+    """Splits a recording into contiguous segments of one gesture.
+
+    A segment ends wherever the gesture changes, and, if the arrival times
+    are known, wherever readings are further apart than max_interval, as
+    when the collection paused between gestures or the link dropped.
+
+    Args:
+        labels:
+            An array of shape (n,) of the gesture index of every reading.
+        timestamps:
+            An optional datetime64 array of shape (n,) of when each reading
+            arrived.
+        max_interval:
+            The most seconds between consecutive readings of a segment.
+
+    Returns:
+        An int64 array of the index each segment starts at, followed by n,
+        so segment i is readings bounds[i] to bounds[i + 1] - 1.
+    """
+
+    breaks = labels[1:] != labels[:-1]
+    if timestamps is not None:
+        intervals = np.diff(timestamps) / np.timedelta64(1, "s")
+        breaks |= (intervals > max_interval) | (intervals < 0)
+    return np.concatenate(([0], np.flatnonzero(breaks) + 1,
+                           [len(labels)])).astype(np.int64)
+
+def gesture_names(filepath: str) -> List[str]:
+    """Reads the gesture names of a raw data file in gesture index order."""
+
+    data_file = pd.read_csv(filepath, usecols=[0, 1])
+    names = data_file.drop_duplicates().sort_values(data_file.columns[0])
+    return names.iloc[:, 1].tolist()
+
+def split_blocks(bounds: np.ndarray,
+                 block_size: int = SPLIT_BLOCK) -> np.ndarray:
+    """Cuts every segment of a recording into blocks of consecutive readings.
+
+    Neighbouring readings are nearly the same, so splitting single readings
+    into training and validation would validate on near copies of the
+    training data. Splitting whole blocks leaves only the readings either
+    side of a block boundary alike.
+
+    Args:
+        bounds:
+            The segment_bounds() of the recording.
+        block_size:
+            The most readings in a block. The last block of a segment may
+            be shorter.
+
+    Returns:
+        An int64 array of shape (n,) of the block index of every reading.
+    """
+
+    lengths = np.diff(bounds)
+    offsets = np.repeat(bounds[:-1], lengths)
+    first_blocks = np.cumsum(np.concatenate(
+        ([0], -(-lengths[:-1] // block_size))))
+    return (np.repeat(first_blocks, lengths)
+            + (np.arange(bounds[-1]) - offsets) // block_size).astype(np.int64)
 
 class CapacitanceDataset(Dataset):
     """Encapsulates a data set of capacitance values and labels.
     
+    The readings are passed through the filter set in the config file, the
+    same one applied to the glove's stream at inference, unless another is
+    given, like the one a trained model's artifact records.
+
     Args:
         filepath:
             A String containing the name of the path to the raw data file.
+        filter_config:
+            An optional FilterConfig to filter the readings with instead of
+            the config file's.
+
+    Attributes:
+        filter_config:
+            The FilterConfig the readings were filtered with.
+        segments:
+            The segment_bounds() of the recording, split wherever the
+            gesture changes or, if the file has a timestamp column, the
+            readings pause.
+        blocks:
+            The split_blocks() of the recording, the block index of every
+            sample.
     """
 
-    def __init__(self, filepath: str):
+    def __init__(self, filepath: str,
+                 filter_config: Optional[filters.FilterConfig] = None):
         # Load in the raw data as a pandas DataFrame object
         data_file = pd.read_csv(filepath)
 
@@ -21,12 +114,32 @@ class CapacitanceDataset(Dataset):
         with open("src/config.yaml") as config:
             configyaml = yaml.load(config, Loader=yaml.loader.FullLoader)
             num_sensors = configyaml["general"]["num_sensors"]
+            if filter_config is None:
+                filter_config = filters.FilterConfig.from_dict(
+                    configyaml.get("filter"))
+        self.filter_config = filter_config
 
         # Split up the data into the target labels (i.e. the gesture indices)
         # and the inputs (i.e. the sensor data)
         labels = data_file.iloc[:, 0].values # Gesture index
         inputs = data_file.iloc[:, 2:2+num_sensors].values # Sensors
 
+        # Find where the recording is not contiguous
+        timestamps = None
+        if "timestamp" in data_file.columns:
+            # Parsed by numpy, which takes the times written without
+            # microseconds when they are 0 alongside the others
+            timestamps = data_file["timestamp"].to_numpy(
+                dtype="datetime64[ns]")
+        self.segments = segment_bounds(labels, timestamps)
+        self.blocks = split_blocks(self.segments)
+
+        if self.filter_config.enabled:
+            # Restarting at each segment, so readings either side of a
+            # pause in the recording are not smoothed together
+            inputs = filters.filter_frames(inputs, self.filter_config,
+                                           self.segments[1:-1])
+
         # Converting to torch tensors
         self.inputs = torch.tensor(inputs, dtype=torch.float32)
         self.labels = torch.tensor(labels)
@@ -44,4 +157,53 @@ class CapacitanceDataset(Dataset):
         by the torch DataLoader.
         """
 
-        return self.inputs[idx], self.labels[idx]
\ No newline at end of file
+        return self.inputs[idx], self.labels[idx]
+
+class WindowDataset(Dataset):
+    """Sliding windows of consecutive samples of a CapacitanceDataset.
+
+    Used to train models that look at recent frames, like the
+    TemporalConvModel. The windows are strided views of the data set's
+    inputs, so no samples are copied however many windows overlap them.
+    Windows are only cut inside the data set's segments, so none spans two
+    gestures or a pause in the recording.
+
+    Args:
+        frames:
+            The CapacitanceDataset to cut the windows from.
+        window:
+            The number of consecutive samples in each window.
+
+    Attributes:
+        starts:
+            The index of the first sample of each window.
+        labels:
+            The label of the last sample of each window.
+        blocks:
+            An array of shape (n, 2) of the split_blocks() index of the
+            first and last sample of each window.
+    """
+
+    def __init__(self, frames: CapacitanceDataset, window: int):
+        # Every window of the whole data set, of which only those inside
+        # a segment are used
+        self._windows = frames.inputs.unfold(0, window, 1)
+        bounds = frames.segments
+        self.starts = torch.cat([
+            torch.arange(start, max(start, stop - window + 1))
+            for start, stop in zip(bounds[:-1].tolist(), bounds[1:].tolist())])
+        self.labels = frames.labels[self.starts + window - 1]
+        starts = self.starts.numpy()
+        self.blocks = np.stack((frames.blocks[starts],
+                                frames.blocks[starts + window - 1]), axis=1)
+
+    def __len__(self) -> int:
+        """Returns the number of windows."""
+
+        return len(self.labels)
+
+    def __getitem__(self, idx: int) -> Tuple[torch.tensor, torch.tensor]:
+        """Gets a window of shape (num_sensors, window) and its label, or
+        a batch of them for a list or tensor of indices."""
+
+        return self._windows[self.starts[idx]], self.labels[idx]
@@ -0,0 +1,349 @@
+"""Script for evaluating a trained model against a recorded data set.
+
+Streams the data set in chunks so recordings larger than memory can be
+evaluated, runs batched inference on each chunk and accumulates a
+confusion matrix. Prints the per-gesture precision and recall, the overall
+accuracy and the number of rows evaluated per second.
+
+Run from the repository root with:
+    $ python3 -m src.evaluate trained_models/virgo.pth data/virgo.csv
+"""
+
+import argparse
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import torch
+
+from . import artifact
+from . import dataset
+from . import filters
+from .models import feed_forward
+from .models import logistic_regression
+from .models import temporal_conv
+
+def load_model(model_path: str) -> torch.nn.Module:
+    """Loads a trained model, working out its type and size from its
+    parameters.
+
+    Args:
+        model_path:
+            The path to the .pth file of a FeedForwardModel, a
+            LogisticRegressionModel or a TemporalConvModel, or to an
+            artifact.
+
+    Returns:
+        The model with its parameters loaded.
+    """
+
+    if model_path.endswith(artifact.EXTENSION):
+        return artifact.load(model_path).model
+
+    state_dict = torch.load(model_path)
+    if "model.weight" in state_dict:
+        return logistic_regression.LogisticRegressionModel.from_state_dict(
+            state_dict)
+    if "convs.0.weight" in state_dict:
+        return temporal_conv.TemporalConvModel.from_state_dict(state_dict)
+    return feed_forward.FeedForwardModel.from_state_dict(state_dict)
+
+def training_metadata(model_path: str) -> Dict[str, Any]:
+    """Reads the training metadata of a model from its artifact, the one
+    next to it for a .pth file, or returns an empty dictionary if it has
+    none."""
+
+    path = os.path.splitext(model_path)[0] + artifact.EXTENSION
+    if not os.path.exists(path):
+        return {}
+    return artifact.load(path).metadata
+
+def training_filter(model_path: str) -> filters.FilterConfig:
+    """Gets the FilterConfig a model's training data went through, as its
+    artifact records, or the one in the config file if it records none."""
+
+    recorded = training_metadata(model_path).get("filter")
+    if recorded is None:
+        return filters.load_config()
+    return filters.FilterConfig.from_dict(recorded)
+
+def confusion_counts(model: torch.nn.Module,
+                     inputs: np.ndarray,
+                     labels: np.ndarray,
+                     num_gestures: int,
+                     starts: np.ndarray = np.empty(0, dtype=np.int64)
+                     ) -> torch.Tensor:
+    """Counts the predictions of a model on a chunk of data.
+
+    Args:
+        model:
+            The model to evaluate.
+        inputs:
+            An array of shape (n, num_sensors) of sensor data.
+        labels:
+            An array of shape (n,) of the correct gesture indices.
+        num_gestures:
+            The number of gestures the model predicts.
+        starts:
+            The indices within the chunk that segments start at. A model
+            that keeps state across frames, like the TemporalConvModel, is
+            restarted at each, so its stream never runs from one segment
+            into the next, as its training windows never do.
+
+    Returns:
+        An int64 tensor of shape (num_gestures, num_gestures) where entry
+        [i, j] is the number of samples of gesture i predicted as gesture j.
+    """
+
+    if hasattr(model, "reset_state"):
+        pieces = []
+        for idx, piece in enumerate(np.split(inputs, starts)):
+            if idx > 0:
+                model.reset_state()
+            if len(piece):
+                pieces.append(model.predict_batch(piece)[0])
+        predictions = torch.cat(pieces)
+    else:
+        predictions, _, _ = model.predict_batch(inputs)
+    labels = torch.tensor(labels, dtype=torch.int64)
+
+    # Count every (label, prediction) pair in one pass
+    return torch.bincount(labels * num_gestures + predictions,
+                          minlength=num_gestures * num_gestures
+                          ).view(num_gestures, num_gestures)
+
+# The model loaded in each worker process
+_worker_model: Optional[torch.nn.Module] = None
+
+def _init_worker(model_path: str) -> None:
+    """Loads the model once per worker process."""
+
+    global _worker_model
+    torch.set_num_threads(1)
+    _worker_model = load_model(model_path)
+
+def _worker_confusion_counts(inputs: np.ndarray,
+                             labels: np.ndarray,
+                             num_gestures: int) -> np.ndarray:
+    """Counts the predictions on a chunk in a worker process."""
+
+    return confusion_counts(_worker_model, inputs, labels,
+                            num_gestures).numpy()
+
+def check_data(data_path: str,
+               num_sensors: int,
+               num_gestures: int,
+               chunk_size: int = 100000) -> None:
+    """Checks that a raw data csv file fits a model before evaluating it.
+
+    Args:
+        data_path:
+            The path to the raw data csv file.
+        num_sensors:
+            The number of sensors the model takes.
+        num_gestures:
+            The number of gestures the model predicts.
+        chunk_size:
+            The number of gesture indices read at a time.
+
+    Raises:
+        ValueError if the file does not have num_sensors sensor columns, or
+        has gesture indices outside 0 to num_gestures - 1.
+    """
+
+    columns = pd.read_csv(data_path, nrows=0).columns
+    data_sensors = sum(1 for column in columns[2:] if column != "timestamp")
+    if data_sensors != num_sensors:
+        raise ValueError(f"{data_path} has {data_sensors} sensor columns, "
+                         f"but the model takes {num_sensors} sensors")
+
+    low, high = 0, num_gestures - 1
+    for chunk in pd.read_csv(data_path, usecols=[0], chunksize=chunk_size):
+        labels = chunk.iloc[:, 0]
+        low, high = min(low, labels.min()), max(high, labels.max())
+    if low < 0 or high >= num_gestures:
+        raise ValueError(f"{data_path} has gesture indices from {low} to "
+                         f"{high}, but the model predicts {num_gestures} "
+                         f"gestures, 0 to {num_gestures - 1}")
+
+def read_chunks(data_path: str,
+                num_sensors: int,
+                chunk_size: int,
+                gesture_names: Dict[int, str],
+                filter_config: filters.FilterConfig = filters.FilterConfig()
+                ) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+    """Reads a raw data csv file a chunk at a time.
+
+    Args:
+        data_path:
+            The path to the raw data csv file.
+        num_sensors:
+            The number of sensor columns.
+        chunk_size:
+            The number of rows in each chunk.
+        gesture_names:
+            A dictionary that the name of every gesture index seen is added
+            to.
+        filter_config:
+            The FilterConfig to filter the readings with. The filter runs
+            across chunk boundaries as if the file were read in one go, and
+            restarts at every segment, as in the CapacitanceDataset.
+
+    Yields:
+        A tuple of the sensor data and gesture index arrays of each chunk,
+        and the indices within it that segments start at.
+    """
+
+    stream_filter = filters.StreamingFilter(num_sensors, filter_config)
+
+    # The last row of the previous chunk, to tell whether its segment
+    # carries on into the next chunk
+    last_labels = np.empty(0, dtype=np.int64)
+    last_timestamps = np.empty(0, dtype="datetime64[ns]")
+
+    for chunk in pd.read_csv(data_path, chunksize=chunk_size):
+        labels = chunk.iloc[:, 0].to_numpy()
+        inputs = chunk.iloc[:, 2:2 + num_sensors].to_numpy(dtype=np.float32)
+        timestamps = None
+        if "timestamp" in chunk.columns:
+            timestamps = np.concatenate((
+                last_timestamps,
+                chunk["timestamp"].to_numpy(dtype="datetime64[ns]")))
+            last_timestamps = timestamps[-1:]
+        starts = dataset.segment_bounds(
+            np.concatenate((last_labels, labels)),
+            timestamps)[1:-1] - len(last_labels)
+        last_labels = labels[-1:]
+        if filter_config.enabled:
+            inputs = stream_filter.process_segments(
+                inputs, starts).astype(np.float32)
+
+        # Remember the names of the gestures
+        for idx, name in chunk.iloc[:, :2].drop_duplicates().itertuples(
+                index=False):
+            gesture_names.setdefault(int(idx), name)
+
+        yield inputs, labels, starts
+
+def evaluate(model_path: str,
+             data_path: str,
+             chunk_size: int = 100000,
+             workers: int = 0,
+             filter_config: filters.FilterConfig = filters.FilterConfig()
+             ) -> Tuple[torch.Tensor, Dict[int, str], float]:
+    """Evaluates a trained model on a raw data csv file.
+
+    Args:
+        model_path:
+            The path to the trained model's .pth or artifact file.
+        data_path:
+            The path to the raw data csv file.
+        chunk_size:
+            The number of rows read and predicted at a time.
+        workers:
+            The number of worker processes to predict chunks in, or 0 to
+            predict in this process. Models that keep state across frames
+            need every chunk's predecessor, so must be predicted in this
+            process.
+        filter_config:
+            The FilterConfig to filter the readings with, which should be
+            the one the model was trained with.
+
+    Returns:
+        A tuple of the confusion matrix, a dictionary of the gesture names
+        keyed by gesture index, and the number of seconds taken.
+
+    Raises:
+        ValueError if the data set does not fit the model, as checked by
+        check_data(), or workers are given for a model that keeps state
+        across frames.
+    """
+
+    model = load_model(model_path)
+    if workers and hasattr(model, "reset_state"):
+        raise ValueError(f"{type(model).__name__} keeps state across "
+                         f"frames, so its chunks cannot be split across "
+                         f"workers")
+
+    dims = model.artifact_dims()
+    num_sensors = dims["num_sensors"]
+    num_gestures = dims["num_gestures"]
+    check_data(data_path, num_sensors, num_gestures, chunk_size)
+
+    confusion = torch.zeros(num_gestures, num_gestures, dtype=torch.int64)
+    gesture_names: Dict[int, str] = {}
+    chunks = read_chunks(data_path, num_sensors, chunk_size, gesture_names,
+                         filter_config)
+
+    start = time.perf_counter()
+    if workers == 0:
+        for inputs, labels, starts in chunks:
+            confusion += confusion_counts(model, inputs, labels, num_gestures,
+                                          starts)
+    else:
+        with ProcessPoolExecutor(workers,
+                                 initializer=_init_worker,
+                                 initargs=(model_path,)) as pool:
+            # Keep a bounded number of chunks in flight so memory use does
+            # not grow with the size of the file
+            pending = deque()
+            for inputs, labels, _ in chunks:
+                if len(pending) >= 2 * workers:
+                    confusion += torch.from_numpy(pending.popleft().result())
+                pending.append(pool.submit(_worker_confusion_counts,
+                                           inputs, labels, num_gestures))
+            for future in pending:
+                confusion += torch.from_numpy(future.result())
+
+    return confusion, gesture_names, time.perf_counter() - start
+
+def report(confusion: torch.Tensor,
+           gesture_names: Dict[int, str],
+           elapsed: float) -> None:
+    """Prints the per-gesture precision and recall, the overall accuracy and
+    the throughput of an evaluation."""
+
+    # Only one conversion off the tensors, after all chunks are counted
+    correct = confusion.diagonal()
+    precision = (correct / confusion.sum(dim=0).clamp(min=1)).tolist()
+    recall = (correct / confusion.sum(dim=1).clamp(min=1)).tolist()
+    total = confusion.sum().item()
+    accuracy = correct.sum().item() / max(total, 1)
+
+    print(f"{'gesture':<20}{'precision':>10}{'recall':>10}{'support':>10}")
+    for idx, support in enumerate(confusion.sum(dim=1).tolist()):
+        name = gesture_names.get(idx, str(idx))
+        print(f"{name:<20}{precision[idx]:>10.4f}{recall[idx]:>10.4f}"
+              f"{support:>10d}")
+
+    print("\nconfusion matrix (rows: gesture, columns: prediction):")
+    print(confusion.numpy())
+    print(f"\naccuracy: {accuracy:.4f}")
+    print(f"{total} rows in {elapsed:.2f}s ({total / elapsed:.0f} rows/s)")
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("model", help="path to a trained .pth or .model file")
+    parser.add_argument("data", help="path to a raw data .csv file")
+    parser.add_argument("--chunk-size", type=int, default=100000,
+                        help="rows read and predicted at a time")
+    parser.add_argument("--workers", type=int, default=0,
+                        help="worker processes to split chunks across")
+    args = parser.parse_args()
+
+    # Filter the readings the way the training data was
+    try:
+        confusion, gesture_names, elapsed = evaluate(
+            args.model, args.data, args.chunk_size, args.workers,
+            training_filter(args.model))
+    except ValueError as error:
+        sys.exit(f"cannot evaluate {args.model}: {error}")
+    report(confusion, gesture_names, elapsed)
+
+if __name__ == "__main__":
+    main()
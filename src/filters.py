@@ -0,0 +1,266 @@
+"""Filters raw capacitance frames before they reach the model.
+
+Three stages, each optional, run in this order:
+
+    clamp:    readings are clipped to [clamp_min, clamp_max], so a corrupt
+              notification cannot throw the later stages off.
+    median:   each reading is replaced by the median of the last
+              median_window readings of that sensor, removing single frame
+              spikes.
+    low-pass: a first order IIR filter, y += alpha * (x - y), smoothing the
+              remaining noise. alpha of 1 passes the readings through.
+
+The same StreamingFilter runs one frame at a time on the glove's stream and
+over whole recordings at once in the CapacitanceDataset, so the model is
+trained on readings filtered exactly as they will be at inference.
+"""
+
+from typing import Any, Dict, NamedTuple, Optional, Sequence
+
+import numpy as np
+import yaml
+from numpy.lib.stride_tricks import sliding_window_view
+
+# Frames processed per matrix multiply by the vectorised low-pass filter
+BLOCK_SIZE = 64
+
+class FilterConfig(NamedTuple):
+    """The settings of a StreamingFilter. The defaults pass readings through
+    unchanged.
+
+    Attributes:
+        alpha:
+            The low-pass filter's weight on each new reading, in (0, 1].
+        median_window:
+            The number of readings the median is taken over.
+        clamp_min:
+            The lowest reading kept, or None for no lower bound.
+        clamp_max:
+            The highest reading kept, or None for no upper bound.
+    """
+
+    alpha: float = 1.0
+    median_window: int = 1
+    clamp_min: Optional[float] = None
+    clamp_max: Optional[float] = None
+
+    @classmethod
+    def from_dict(cls, settings: Optional[Dict[str, Any]]) -> "FilterConfig":
+        """Makes a config from the filter section of the config file, or
+        from artifact metadata. Missing settings take their defaults."""
+
+        settings = settings or {}
+        return cls(**{key: settings[key] for key in cls._fields
+                      if settings.get(key) is not None})
+
+    @property
+    def enabled(self) -> bool:
+        """Whether any stage changes the readings."""
+
+        return (self.alpha < 1 or self.median_window > 1
+                or self.clamp_min is not None or self.clamp_max is not None)
+
+def load_config(path: str = "src/config.yaml") -> FilterConfig:
+    """Reads the filter section of the config file."""
+
+    with open(path) as config:
+        configyaml = yaml.load(config, Loader=yaml.loader.FullLoader)
+    return FilterConfig.from_dict(configyaml.get("filter"))
+
+class StreamingFilter:
+    """Filters a stream of frames, one at a time or in batches.
+
+    The state is kept in arrays allocated once, so filtering a frame costs
+    the same however long the stream has run. The state starts from the
+    first frame seen, as if the stream had always held that reading.
+
+    Args:
+        num_sensors:
+            The number of sensors in each frame.
+        config:
+            The FilterConfig to filter with.
+    """
+
+    def __init__(self, num_sensors: int, config: FilterConfig = FilterConfig()):
+        if not 0 < config.alpha <= 1:
+            raise ValueError(f"alpha must be in (0, 1], not {config.alpha}")
+        if config.median_window < 1:
+            raise ValueError("median_window must be at least 1")
+
+        self.config: FilterConfig = config
+        self.num_sensors: int = num_sensors
+
+        # The last median_window clamped frames, oldest at _position
+        self._window = np.zeros((config.median_window, num_sensors))
+        self._position: int = 0
+
+        # Scratch space to sort the window in, cheaper than np.median
+        self._sorted = np.zeros((config.median_window, num_sensors))
+
+        # The low-pass output, and the filter's output buffer
+        self._smoothed = np.zeros(num_sensors)
+        self._output = np.zeros(num_sensors)
+
+        self._started: bool = False
+
+        # The low-pass filter over a block of frames as one matrix multiply:
+        # y[k] = sum_j<=k alpha (1-alpha)^(k-j) x[j] + (1-alpha)^(k+1) y[-1]
+        decay = 1 - config.alpha
+        powers = np.arange(BLOCK_SIZE)
+        lags = powers[:, None] - powers[None, :]
+        self._block_weights = np.where(
+            lags >= 0, config.alpha * decay ** np.maximum(lags, 0), 0.0)
+        self._block_carry = decay ** (powers + 1)
+
+    def reset(self) -> None:
+        """Forgets the stream, so the next frame restarts the state."""
+
+        self._started = False
+        self._position = 0
+
+    def _start(self, frame: np.ndarray) -> None:
+        """Fills the state as if the stream had always held frame."""
+
+        self._window[:] = frame
+        self._smoothed[:] = frame
+        self._position = 0
+        self._started = True
+
+    def _clamp(self, frames: np.ndarray, out: np.ndarray) -> np.ndarray:
+        """Clips readings into the configured range."""
+
+        config = self.config
+        if config.clamp_min is None and config.clamp_max is None:
+            out[...] = frames
+            return out
+        return np.clip(frames, config.clamp_min, config.clamp_max, out=out)
+
+    def update(self, frame: np.ndarray) -> np.ndarray:
+        """Filters the next frame.
+
+        Args:
+            frame:
+                An array of shape (num_sensors,) of sensor readings.
+
+        Returns:
+            The filtered frame. The array is reused, so it is overwritten by
+            the next call.
+        """
+
+        config = self.config
+        output = self._output
+        self._clamp(frame, output)
+        if not self._started:
+            self._start(output)
+
+        if config.median_window > 1:
+            self._window[self._position] = output
+            self._position = (self._position + 1) % config.median_window
+
+            ordered = self._sorted
+            ordered[:] = self._window
+            ordered.sort(axis=0)
+            middle = config.median_window // 2
+            if config.median_window % 2:
+                output[:] = ordered[middle]
+            else:
+                np.add(ordered[middle - 1], ordered[middle], out=output)
+                output *= 0.5
+
+        if config.alpha < 1:
+            smoothed = self._smoothed
+            smoothed += config.alpha * (output - smoothed)
+            output[:] = smoothed
+
+        return output
+
+    def process(self, frames: np.ndarray) -> np.ndarray:
+        """Filters a batch of consecutive frames, vectorised over the batch.
+
+        Gives the same result as calling update() on each frame in turn, up
+        to floating point rounding, and leaves the same state behind, so
+        batches and single frames can be mixed.
+
+        Args:
+            frames:
+                An array of shape (n, num_sensors) of sensor readings.
+
+        Returns:
+            A new array of shape (n, num_sensors) of filtered readings.
+        """
+
+        config = self.config
+        output = np.empty(frames.shape)
+        if len(frames) == 0:
+            return output
+        self._clamp(frames, output)
+        if not self._started:
+            self._start(output[0])
+
+        if config.median_window > 1:
+            # The previous median_window - 1 frames, then the batch
+            window = config.median_window
+            ordered = np.roll(self._window, -self._position, axis=0)
+            history = np.concatenate([ordered[1:], output])
+            output = np.median(
+                sliding_window_view(history, window, axis=0), axis=-1)
+            self._window[:] = history[-window:]
+            self._position = 0
+
+        if config.alpha < 1:
+            smoothed = self._smoothed
+            for start in range(0, len(output), BLOCK_SIZE):
+                block = output[start:start + BLOCK_SIZE]
+                size = len(block)
+                block[:] = (self._block_weights[:size, :size] @ block
+                            + self._block_carry[:size, None] * smoothed)
+                smoothed[:] = block[-1]
+
+        return output
+
+    def process_segments(self,
+                         frames: np.ndarray,
+                         starts: Sequence[int]) -> np.ndarray:
+        """Filters a batch of frames holding several separate stretches of
+        a stream, restarting the state at the start of each, as after a
+        pause in the recording.
+
+        Args:
+            frames:
+                An array of shape (n, num_sensors) of sensor readings.
+            starts:
+                The increasing indices of the frames that start a stretch.
+                The frames before the first carry on the stream so far.
+
+        Returns:
+            A new array of shape (n, num_sensors) of filtered readings.
+        """
+
+        output = np.empty(frames.shape)
+        bounds = [0, *starts, len(frames)]
+        for idx, (start, stop) in enumerate(zip(bounds[:-1], bounds[1:])):
+            if idx > 0:
+                self.reset()
+            output[start:stop] = self.process(frames[start:stop])
+        return output
+
+def filter_frames(frames: np.ndarray,
+                  config: FilterConfig,
+                  starts: Sequence[int] = ()) -> np.ndarray:
+    """Filters a whole recording at once, as a new StreamingFilter would.
+
+    Args:
+        frames:
+            An array of shape (n, num_sensors) of consecutive readings.
+        config:
+            The FilterConfig to filter with.
+        starts:
+            The indices of the readings after a pause in the recording, at
+            which the filter restarts.
+
+    Returns:
+        A new array of shape (n, num_sensors) of filtered readings.
+    """
+
+    return StreamingFilter(frames.shape[1], config).process_segments(
+        np.asarray(frames, dtype=np.float64), starts)
@@ -0,0 +1,107 @@
+"""Low latency single frame inference with a trained model."""
+
+import time
+from typing import Optional, Tuple
+
+import numpy as np
+import torch
+
+from . import timing
+
+class InferenceSession:
+    """Runs a trained model on one frame at a time.
+
+    The input tensor is allocated once and filled in place from each
+    NumPy frame, the forward pass runs under torch.inference_mode() with no
+    autograd bookkeeping, and warm-up runs at construction pay the lazy
+    initialisation costs so the first real prediction is as fast as the
+    rest.
+
+    A model with a step() method, like the TemporalConvModel, keeps state
+    across frames, and each frame is passed to step() to advance it.
+
+    Args:
+        model:
+            The trained model.
+        num_sensors:
+            The number of sensors in each frame.
+        num_threads:
+            The number of threads torch uses for intra-op parallelism, or
+            None to leave it unchanged. This setting is process wide. A
+            single thread gives the lowest latency for models this small.
+        warmup_runs:
+            The number of predictions to run on a zero frame at start-up.
+    """
+
+    def __init__(self,
+                 model: torch.nn.Module,
+                 num_sensors: int,
+                 num_threads: Optional[int] = 1,
+                 warmup_runs: int = 100):
+        self.model: torch.nn.Module = model.eval()
+        self._forward = getattr(model, "step", model)
+
+        if num_threads is not None:
+            torch.set_num_threads(num_threads)
+
+        # The input tensor and a NumPy view of its memory to fill it through
+        self._input: torch.Tensor = torch.zeros(1, num_sensors)
+        self._input_np: np.ndarray = self._input.numpy()
+
+        self.warm_up(warmup_runs)
+
+    def warm_up(self, runs: int) -> None:
+        """Runs the model on a zero frame to trigger lazy initialisation."""
+
+        self._input_np.fill(0)
+        for _ in range(runs):
+            self.predict(self._input_np[0])
+
+        # Keep models that count their predictions from counting these, and
+        # models that keep state from starting from the zero frame
+        reset_stats = getattr(self.model, "reset_stats", None)
+        if reset_stats is not None:
+            reset_stats()
+        reset_state = getattr(self.model, "reset_state", None)
+        if reset_state is not None:
+            reset_state()
+
+    def predict(self,
+                frame: np.ndarray,
+                timings: Optional[timing.StageTimings] = None
+                ) -> Tuple[int, torch.Tensor]:
+        """Predicts the gesture for a single frame.
+
+        Args:
+            frame:
+                An array of shape (num_sensors,) of sensor readings.
+            timings:
+                The StageTimings to record the fill, forward and argmax
+                times into, or None to skip timing.
+
+        Returns:
+            A tuple of the index of the predicted gesture and the model's
+            output for the frame.
+        """
+
+        if timings is None:
+            self._input_np[0] = frame
+            with torch.inference_mode():
+                output = self._forward(self._input)[0]
+            return int(output.numpy().argmax()), output
+
+        # Same as above, timing each step
+        start_ns = time.monotonic_ns()
+        self._input_np[0] = frame
+        fill_ns = time.monotonic_ns()
+        with torch.inference_mode():
+            output = self._forward(self._input)[0]
+        forward_ns = time.monotonic_ns()
+        resultidx = int(output.numpy().argmax())
+        argmax_ns = time.monotonic_ns()
+
+        timings.record("tensor", fill_ns - start_ns)
+        timings.record("forward", forward_ns - fill_ns)
+        timings.record("argmax", argmax_ns - forward_ns)
+        timings.record("predict", argmax_ns - start_ns)
+        return resultidx, output
@@ -0,0 +1,225 @@
+import math
+from typing import Dict
+import torch
+
+from .feed_forward import FeedForwardModel
+from .logistic_regression import LogisticRegressionModel
+from . import prediction
+
+class CascadeModel(torch.nn.Module, prediction.BatchPredictor):
+    """A logistic regression backed by a feed forward network.
+
+    Every sample goes through the cheap logistic regression first. Its
+    answer is kept when its softmax confidence reaches the threshold, and
+    only the samples it is unsure of are passed on to the feed forward
+    network. Both models are trained separately, then the threshold is
+    tuned with calibrate().
+
+    Args:
+        num_sensors:
+            The number of sensors to be read.
+        num_gestures:
+            The number of gestures to be trained.
+        learning_capacity:
+            The size of the feed forward network's hidden layer.
+        threshold:
+            The confidence the logistic regression needs for its answer to
+            be kept. 0 never escalates, above 1 always escalates.
+
+    Attributes:
+        frames:
+            The number of samples predicted since the last reset_stats().
+        escalated:
+            How many of them were passed on to the feed forward network.
+    """
+    def __init__(self,
+                 num_sensors: int,
+                 num_gestures: int,
+                 learning_capacity: int,
+                 threshold: float = 1.1):
+        super().__init__()
+
+        self.fast = LogisticRegressionModel(num_sensors, num_gestures)
+        self.accurate = FeedForwardModel(num_sensors,
+                                         num_gestures,
+                                         learning_capacity)
+        self.register_buffer("threshold", torch.tensor(float(threshold)))
+
+        self.frames: int = 0
+        self.escalated: int = 0
+
+    @classmethod
+    def from_models(cls,
+                    fast: LogisticRegressionModel,
+                    accurate: FeedForwardModel,
+                    threshold: float = 1.1) -> "CascadeModel":
+        """Builds a cascade from two trained models.
+
+        Args:
+            fast:
+                The trained logistic regression.
+            accurate:
+                The trained feed forward network, for the same sensors and
+                gestures.
+            threshold:
+                The initial confidence threshold.
+
+        Returns:
+            A CascadeModel with both models' parameters loaded.
+        """
+
+        dims = accurate.artifact_dims()
+        if fast.artifact_dims() != {"num_sensors": dims["num_sensors"],
+                                    "num_gestures": dims["num_gestures"]}:
+            raise ValueError("the models have different numbers of sensors "
+                             "or gestures")
+
+        model = cls(**dims, threshold=threshold)
+        model.fast.load_state_dict(fast.state_dict())
+        model.accurate.load_state_dict(accurate.state_dict())
+        return model
+
+    def artifact_dims(self) -> Dict[str, int]:
+        """Returns the constructor arguments needed to rebuild this model.
+
+        The threshold is saved with the parameters."""
+
+        return self.accurate.artifact_dims()
+
+    def forward(self, input_: torch.tensor) -> torch.tensor:
+        """Apply the cascade to transform the input data.
+
+        Returns the logistic regression's output for the samples it is
+        confident about and the feed forward network's for the rest.
+        """
+
+        logits = self.fast(input_)
+
+        # A single sample is checked in plain Python, which costs a fraction
+        # of the tensor operations below. The softmax confidence is
+        # 1 / sum(exp(logit - max logit)).
+        if logits.dim() == 1 or len(logits) == 1:
+            row = logits.detach().reshape(-1).tolist()
+            top = max(row)
+            total = sum(math.exp(value - top) for value in row)
+            self.frames += 1
+            if total * self.threshold.item() <= 1.0:
+                return logits
+            self.escalated += 1
+            return self.accurate(input_)
+
+        confidence = torch.softmax(logits, dim=-1).amax(dim=-1)
+        escalate = confidence < self.threshold
+
+        num_frames = escalate.numel()
+        num_escalated = int(escalate.sum())
+        self.frames += num_frames
+        self.escalated += num_escalated
+
+        # Skip the indexing when every sample goes the same way
+        if num_escalated == 0:
+            return logits
+        if num_escalated == num_frames:
+            return self.accurate(input_)
+
+        logits = logits.clone()
+        logits[escalate] = self.accurate(input_[escalate])
+        return logits
+
+    def calibrate(self,
+                  inputs: torch.Tensor,
+                  labels: torch.Tensor,
+                  target_accuracy: float) -> Dict[str, float]:
+        """Sets the lowest threshold that still reaches a target accuracy.
+
+        The lower the threshold, the fewer samples are escalated. If the
+        target cannot be reached, the threshold with the best accuracy is
+        used instead.
+
+        Args:
+            inputs:
+                A tensor of shape (n, num_sensors) of validation data, not
+                used to train either model.
+            labels:
+                A tensor of shape (n,) of the correct gesture indices.
+            target_accuracy:
+                The accuracy the cascade should reach on the data, from 0
+                to 1.
+
+        Returns:
+            A dictionary of the chosen "threshold", and the "accuracy" and
+            "escalation_rate" the cascade has with it on the data.
+        """
+
+        with torch.inference_mode():
+            fast_probs = torch.softmax(self.fast(inputs), dim=1)
+            confidence, fast_predictions = fast_probs.max(dim=1)
+            fast_correct = (fast_predictions == labels).double()
+            accurate_correct = (self.accurate(inputs).argmax(dim=1)
+                                == labels).double()
+
+        # Accepting the k most confident samples from the logistic
+        # regression and escalating the rest, for every k at once
+        order = torch.argsort(confidence, descending=True)
+        num_frames = len(labels)
+        fast_kept = torch.cat([torch.zeros(1, dtype=torch.float64),
+                               fast_correct[order].cumsum(0)])
+        accurate_kept = torch.cat([torch.zeros(1, dtype=torch.float64),
+                                   accurate_correct[order].cumsum(0)])
+        accuracy = (fast_kept + accurate_correct.sum() - accurate_kept) \
+            / num_frames
+
+        # Only cut between different confidences, a threshold cannot split
+        # samples with the same one
+        sorted_confidence = confidence[order]
+        valid = torch.ones(num_frames + 1, dtype=torch.bool)
+        valid[1:-1] = sorted_confidence[1:] < sorted_confidence[:-1]
+
+        reaches = valid & (accuracy >= target_accuracy)
+        if reaches.any():
+            # The most samples accepted while reaching the target
+            accepted = int(torch.nonzero(reaches).max())
+        else:
+            accepted = int(torch.argmax(torch.where(
+                valid, accuracy, torch.full_like(accuracy, -1.0))))
+
+        threshold = (sorted_confidence[accepted - 1].item() if accepted > 0
+                     else 1.1)
+        self.threshold.fill_(threshold)
+        return {"threshold": threshold,
+                "accuracy": accuracy[accepted].item(),
+                "escalation_rate": 1 - accepted / num_frames}
+
+    def macs(self) -> Dict[str, int]:
+        """Counts the multiply-accumulates per sample of each model."""
+
+        dims = self.artifact_dims()
+        fast = dims["num_sensors"] * dims["num_gestures"]
+        accurate = dims["learning_capacity"] * (dims["num_sensors"]
+                                                + dims["num_gestures"])
+        return {"fast": fast, "accurate": accurate}
+
+    def stats(self) -> Dict[str, float]:
+        """Reports how often samples were escalated and what they cost.
+
+        Returns:
+            A dictionary of the number of "frames" predicted, the number
+            "escalated", the "escalation_rate", the mean multiply-accumulates
+            per frame in "macs_per_frame", and "relative_cost", the ratio of
+            that to running the feed forward network on every frame.
+        """
+
+        macs = self.macs()
+        rate = self.escalated / max(self.frames, 1)
+        macs_per_frame = macs["fast"] + rate * macs["accurate"]
+        return {"frames": self.frames,
+                "escalated": self.escalated,
+                "escalation_rate": rate,
+                "macs_per_frame": macs_per_frame,
+                "relative_cost": macs_per_frame / macs["accurate"]}
+
+    def reset_stats(self) -> None:
+        """Resets the frame and escalation counts."""
+
+        self.frames = 0
+        self.escalated = 0
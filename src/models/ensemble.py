@@ -0,0 +1,155 @@
+from typing import Dict, List
+import torch
+import torch.nn.functional as F
+
+from .feed_forward import FeedForwardModel
+from . import prediction
+
+class EnsembleModel(torch.nn.Module, prediction.BatchPredictor):
+    """The average of several trained feed forward networks.
+
+    The members' weights are stacked into 3D tensors with one slice per
+    member, so every member can be evaluated by one batched matrix multiply
+    per layer rather than a loop over the networks. Since averaging the
+    members' outputs is linear, forward() goes further and folds the stacks
+    into the weights of a single, wider network: the hidden layers side by
+    side, and the output layers joined and divided by num_members. A frame
+    then costs two matrix multiplies, the same as one network.
+
+    Members trained with a smaller learning_capacity are padded with zero
+    hidden units, which contribute nothing, so networks of different sizes
+    can be combined.
+
+    Args:
+        num_sensors:
+            The number of sensors to be read.
+        num_gestures:
+            The number of gestures.
+        learning_capacity:
+            The size of the largest member's hidden layer.
+        num_members:
+            The number of networks averaged.
+    """
+    def __init__(self,
+                 num_sensors: int,
+                 num_gestures: int,
+                 learning_capacity: int,
+                 num_members: int):
+        super().__init__()
+
+        self.register_buffer("hidden_weight",
+                             torch.zeros(num_members, learning_capacity,
+                                         num_sensors))
+        self.register_buffer("hidden_bias",
+                             torch.zeros(num_members, learning_capacity))
+        self.register_buffer("output_weight",
+                             torch.zeros(num_members, num_gestures,
+                                         learning_capacity))
+        self.register_buffer("output_bias",
+                             torch.zeros(num_members, num_gestures))
+
+        # The single wider network, see _update_joined()
+        self.register_buffer("joined_hidden_weight",
+                             torch.zeros(num_members * learning_capacity,
+                                         num_sensors))
+        self.register_buffer("joined_hidden_bias",
+                             torch.zeros(num_members * learning_capacity))
+        self.register_buffer("joined_output_weight",
+                             torch.zeros(num_gestures,
+                                         num_members * learning_capacity))
+        self.register_buffer("joined_output_bias", torch.zeros(num_gestures))
+
+    @classmethod
+    def from_models(cls, models: List[FeedForwardModel]) -> "EnsembleModel":
+        """Builds an ensemble from trained feed forward networks.
+
+        Args:
+            models:
+                The trained networks, for the same sensors and gestures.
+
+        Returns:
+            An EnsembleModel averaging the networks.
+        """
+
+        dims = [model.artifact_dims() for model in models]
+        num_sensors = dims[0]["num_sensors"]
+        num_gestures = dims[0]["num_gestures"]
+        if any(dim["num_sensors"] != num_sensors
+               or dim["num_gestures"] != num_gestures for dim in dims):
+            raise ValueError("the models have different numbers of sensors "
+                             "or gestures")
+
+        ensemble = cls(num_sensors, num_gestures,
+                       max(dim["learning_capacity"] for dim in dims),
+                       len(models))
+        with torch.no_grad():
+            for member, (model, dim) in enumerate(zip(models, dims)):
+                hidden, output = model.model[0], model.model[2]
+                size = dim["learning_capacity"]
+                ensemble.hidden_weight[member, :size] = hidden.weight
+                ensemble.hidden_bias[member, :size] = hidden.bias
+                ensemble.output_weight[member, :, :size] = output.weight
+                ensemble.output_bias[member] = output.bias
+        ensemble._update_joined()
+        return ensemble
+
+    def artifact_dims(self) -> Dict[str, int]:
+        """Returns the constructor arguments needed to rebuild this model."""
+
+        num_members, learning_capacity, num_sensors = self.hidden_weight.shape
+        return {"num_sensors": num_sensors,
+                "num_gestures": self.output_bias.shape[1],
+                "learning_capacity": learning_capacity,
+                "num_members": num_members}
+
+    def _update_joined(self) -> None:
+        """Works out the weights of the single network equal to the average
+        of the members.
+
+        The members' hidden units are laid side by side, and the mean of
+        the members' outputs W_k h_k + b_k is the joined hidden layer times
+        [W_1 ... W_K] / K, plus the mean of the b_k.
+        """
+
+        num_members, learning_capacity, num_sensors = self.hidden_weight.shape
+        with torch.no_grad():
+            self.joined_hidden_weight = self.hidden_weight.reshape(
+                -1, num_sensors).clone()
+            self.joined_hidden_bias = self.hidden_bias.reshape(-1).clone()
+            self.joined_output_weight = self.output_weight.permute(
+                1, 0, 2).reshape(-1, num_members * learning_capacity) \
+                / num_members
+            self.joined_output_bias = self.output_bias.mean(dim=0)
+
+    def forward(self, input_: torch.tensor) -> torch.tensor:
+        """Apply the model to transform the input data.
+
+        Returns the mean of the members' outputs.
+        """
+
+        hidden = F.relu(F.linear(input_, self.joined_hidden_weight,
+                                 self.joined_hidden_bias))
+        return F.linear(hidden, self.joined_output_weight,
+                        self.joined_output_bias)
+
+    def member_outputs(self, inputs: torch.Tensor) -> torch.Tensor:
+        """Gets every member's output, with one batched matrix multiply per
+        layer.
+
+        Args:
+            inputs:
+                A tensor of shape (n, num_sensors).
+
+        Returns:
+            A tensor of shape (num_members, n, num_gestures).
+        """
+
+        with torch.inference_mode():
+            hidden = F.relu(torch.baddbmm(
+                self.hidden_bias.unsqueeze(2),
+                self.hidden_weight,
+                inputs.T.expand(len(self.hidden_weight), -1, -1)))
+            return torch.baddbmm(self.output_bias.unsqueeze(1),
+                                 hidden.transpose(1, 2),
+                                 self.output_weight.transpose(1, 2))
+
@@ -2,7 +2,9 @@ from typing import Dict, List, Tuple
 import torch
 import torch.nn.functional as F
 
-class FeedForwardModel(torch.nn.Module):
+from . import prediction
+
+class FeedForwardModel(torch.nn.Module, prediction.BatchPredictor):
     """A feed forward network with 1 hidden layer.
     
     Args:
@@ -32,6 +34,33 @@ class FeedForwardModel(torch.nn.Module):
 
         return self.model(input_)
 
+    @classmethod
+    def from_state_dict(cls,
+                        state_dict: Dict[str, torch.Tensor]
+                        ) -> "FeedForwardModel":
+        """Instantiates a model sized to match a saved state dict.
+
+        Args:
+            state_dict:
+                The parameters of a trained FeedForwardModel.
+
+        Returns:
+            A FeedForwardModel with the parameters loaded.
+        """
+
+        learning_capacity, num_sensors = state_dict["model.0.weight"].shape
+        num_gestures = state_dict["model.2.weight"].shape[0]
+        model = cls(num_sensors, num_gestures, learning_capacity)
+        model.load_state_dict(state_dict)
+        return model
+
+    def artifact_dims(self) -> Dict[str, int]:
+        """Returns the constructor arguments needed to rebuild this model."""
+
+        return {"num_sensors": self.model[0].in_features,
+                "num_gestures": self.model[2].out_features,
+                "learning_capacity": self.model[0].out_features}
+
     def training_step(self,
                       batch: Tuple[torch.tensor, torch.tensor]
                      ) -> torch.tensor:
@@ -113,9 +142,8 @@ class FeedForwardModel(torch.nn.Module):
         _, predictions = torch.max(outputs, dim=1)
 
         # Find the total number of correct predictions over the total
-        # number of predictions
-        return torch.tensor(torch.sum(predictions == labels).item()
-                            / len(predictions))
+        # number of predictions, staying on the tensor so no sync is needed
+        return (predictions == labels).float().mean()
 
     def validation_epoch_end(self,
                              outputs: List) -> Dict[str, int]:
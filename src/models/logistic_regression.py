@@ -2,7 +2,9 @@ from typing import Dict, List, Tuple
 import torch
 import torch.nn.functional as F
 
-class LogisticRegressionModel(torch.nn.Module):
+from . import prediction
+
+class LogisticRegressionModel(torch.nn.Module, prediction.BatchPredictor):
     """A logistic regression using one Linear Transformation.
     
     Args:
@@ -22,6 +24,31 @@ class LogisticRegressionModel(torch.nn.Module):
 
         return self.model(input)
 
+    @classmethod
+    def from_state_dict(cls,
+                        state_dict: Dict[str, torch.Tensor]
+                        ) -> "LogisticRegressionModel":
+        """Instantiates a model sized to match a saved state dict.
+
+        Args:
+            state_dict:
+                The parameters of a trained LogisticRegressionModel.
+
+        Returns:
+            A LogisticRegressionModel with the parameters loaded.
+        """
+
+        num_gestures, num_sensors = state_dict["model.weight"].shape
+        model = cls(num_sensors, num_gestures)
+        model.load_state_dict(state_dict)
+        return model
+
+    def artifact_dims(self) -> Dict[str, int]:
+        """Returns the constructor arguments needed to rebuild this model."""
+
+        return {"num_sensors": self.model.in_features,
+                "num_gestures": self.model.out_features}
+
     def training_step(self,
                       batch: Tuple[torch.tensor, torch.tensor]
                      ) -> torch.tensor:
@@ -103,9 +130,8 @@ class LogisticRegressionModel(torch.nn.Module):
         _, predictions = torch.max(outputs, dim=1)
 
         # Find the total number of correct predictions over the total
-        # number of predictions
-        return torch.tensor(torch.sum(predictions == labels).item()
-                            / len(predictions))
+        # number of predictions, staying on the tensor so no sync is needed
+        return (predictions == labels).float().mean()
 
     def validation_epoch_end(self,
                              outputs: List) -> Dict[str, int]:
@@ -0,0 +1,146 @@
+from typing import Dict, Optional
+import numpy as np
+import torch
+import torch.nn.functional as F
+
+from . import prediction
+
+class NearestCentroidModel(torch.nn.Module, prediction.BatchPredictor):
+    """A training-free classifier that picks the gesture with the closest
+    mean reading.
+
+    Each gesture is represented by the centroid of its samples. Readings are
+    standardised per sensor with the mean and standard deviation of the
+    data the model was built from, so every sensor counts equally. Built
+    straight from a data set, and new gestures can be enrolled from a
+    handful of samples, with no training.
+
+    The squared distance to centroid c is |x|^2 - 2 x.c + |c|^2, and |x|^2
+    is the same for every gesture, so it can be left out without changing
+    the ranking or the softmax. What is left is linear in x, so predicting
+    costs one matrix multiply, the same as the LogisticRegressionModel.
+
+    Args:
+        num_sensors:
+            The number of sensors to be read.
+        num_gestures:
+            The number of gestures.
+    """
+    def __init__(self,
+                 num_sensors: int,
+                 num_gestures: int):
+        super().__init__()
+
+        self.register_buffer("centroids", torch.zeros(num_gestures,
+                                                      num_sensors))
+        self.register_buffer("counts", torch.zeros(num_gestures))
+        self.register_buffer("mean", torch.zeros(num_sensors))
+        self.register_buffer("scale", torch.ones(num_sensors))
+
+        # The linear form of the distances, see _update_linear()
+        self.register_buffer("weight", torch.zeros(num_gestures,
+                                                   num_sensors))
+        self.register_buffer("bias", torch.zeros(num_gestures))
+
+    @classmethod
+    def from_dataset(cls, dataset) -> "NearestCentroidModel":
+        """Builds a model from every sample of a data set.
+
+        Args:
+            dataset:
+                A CapacitanceDataset, or anything with inputs and labels
+                tensors.
+
+        Returns:
+            A NearestCentroidModel with one centroid per gesture index.
+        """
+
+        inputs = dataset.inputs.to(torch.float32)
+        labels = dataset.labels.to(torch.int64)
+        num_gestures = int(labels.max()) + 1
+
+        model = cls(inputs.shape[1], num_gestures)
+        model.mean.copy_(inputs.mean(dim=0))
+        model.scale.copy_(inputs.std(dim=0).clamp(min=1e-6))
+
+        # Sum and count the standardised samples of every gesture at once
+        standardised = (inputs - model.mean) / model.scale
+        sums = torch.zeros(num_gestures, inputs.shape[1])
+        sums.index_add_(0, labels, standardised)
+        counts = torch.bincount(labels, minlength=num_gestures)
+
+        model.counts.copy_(counts)
+        model.centroids.copy_(sums / counts.clamp(min=1).unsqueeze(1))
+        model._update_linear()
+        return model
+
+    def artifact_dims(self) -> Dict[str, int]:
+        """Returns the constructor arguments needed to rebuild this model."""
+
+        num_gestures, num_sensors = self.centroids.shape
+        return {"num_sensors": num_sensors, "num_gestures": num_gestures}
+
+    def enroll(self, samples, index: Optional[int] = None) -> int:
+        """Adds the samples of a gesture to the model.
+
+        Args:
+            samples:
+                An array or tensor of shape (n, num_sensors) of readings of
+                the gesture.
+            index:
+                The index of an existing gesture to add the samples to, or
+                None to add a new gesture.
+
+        Returns:
+            The index of the gesture.
+        """
+
+        if isinstance(samples, np.ndarray):
+            samples = torch.from_numpy(samples)
+        standardised = (samples.to(torch.float32) - self.mean) / self.scale
+
+        with torch.no_grad():
+            if index is None:
+                # Grow the buffers by one gesture
+                index = len(self.centroids)
+                self.centroids = torch.cat([self.centroids,
+                                            standardised.mean(dim=0,
+                                                              keepdim=True)])
+                self.counts = torch.cat([self.counts,
+                                         torch.tensor([len(standardised)],
+                                                      dtype=torch.float32)])
+            else:
+                # Running mean of the old and new samples
+                count = self.counts[index]
+                total = count + len(standardised)
+                self.centroids[index] = (self.centroids[index] * count
+                                         + standardised.sum(dim=0)) / total
+                self.counts[index] = total
+
+            self._update_linear()
+
+        return index
+
+    def _update_linear(self) -> None:
+        """Works out the weight and bias that give each gesture's negative
+        squared distance from a raw reading, less |standardised reading|^2.
+
+        With x standardised as (r - mean) / scale, 2 x.c - |c|^2 is
+        r.(2 c / scale) - 2 (mean / scale).c - |c|^2.
+        """
+
+        with torch.no_grad():
+            self.weight = 2 * self.centroids / self.scale
+            self.bias = (-(self.mean / self.scale) @ (2 * self.centroids).T
+                         - (self.centroids * self.centroids).sum(dim=1))
+
+    def forward(self, input_: torch.tensor) -> torch.tensor:
+        """Apply the model to transform the input data.
+
+        Returns the negative squared distance from the standardised input to
+        every centroid, less the same amount for every gesture, so the
+        closest gesture has the highest output.
+        """
+
+        return F.linear(input_, self.weight, self.bias)
+
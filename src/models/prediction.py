@@ -0,0 +1,91 @@
+from typing import Optional, Tuple
+import numpy as np
+import torch
+
+def softmax_argmax(logits: torch.Tensor,
+                   out_probs: Optional[torch.Tensor] = None,
+                   out_confidences: Optional[torch.Tensor] = None,
+                   out_indices: Optional[torch.Tensor] = None
+                   ) -> Tuple[torch.Tensor, torch.Tensor, torch.Tensor]:
+    """Turns a batch of logits into probabilities and the most probable
+    gesture of each sample, writing into the output tensors given.
+
+    Args:
+        logits:
+            A tensor of shape (n, num_gestures).
+        out_probs:
+            An optional float tensor of shape (n, num_gestures) to write the
+            probability of every gesture into.
+        out_confidences:
+            An optional float tensor of shape (n,) to write the probability
+            of the predicted gesture into.
+        out_indices:
+            An optional int64 tensor of shape (n,) to write the index of the
+            predicted gesture into.
+
+    Returns:
+        A tuple of the indices, confidences and probabilities tensors.
+    """
+
+    # Softmax, written into the output buffer
+    if out_probs is None:
+        out_probs = torch.empty_like(logits)
+    torch.sub(logits, logits.amax(dim=1, keepdim=True), out=out_probs)
+    out_probs.exp_()
+    out_probs.div_(out_probs.sum(dim=1, keepdim=True))
+
+    # The most probable gesture for each sample
+    if out_confidences is None:
+        out_confidences = torch.empty(len(logits))
+    if out_indices is None:
+        out_indices = torch.empty(len(logits), dtype=torch.int64)
+    torch.max(out_probs, dim=1, out=(out_confidences, out_indices))
+
+    return out_indices, out_confidences, out_probs
+
+class BatchPredictor:
+    """Gives a model predict_batch(), built on the logits of its forward
+    pass, or of batch_logits() where a model overrides it."""
+
+    def batch_logits(self, inputs: torch.Tensor) -> torch.Tensor:
+        """Gets the logits of a batch of samples, as a float32 tensor of
+        shape (n, num_gestures)."""
+
+        return self(inputs)
+
+    def predict_batch(self,
+                      inputs,
+                      out_probs: Optional[torch.Tensor] = None,
+                      out_confidences: Optional[torch.Tensor] = None,
+                      out_indices: Optional[torch.Tensor] = None
+                      ) -> Tuple[torch.Tensor, torch.Tensor, torch.Tensor]:
+        """Predicts the gestures for many samples in one forward pass.
+
+        Runs under torch.inference_mode() and writes the softmax in place,
+        so passing the output tensors avoids allocating them on every call.
+
+        Args:
+            inputs:
+                An array or tensor of samples, of shape (n, num_sensors)
+                unless the model's batch_logits() says otherwise.
+            out_probs:
+                An optional float tensor of shape (n, num_gestures) to write
+                the probability of every gesture into.
+            out_confidences:
+                An optional float tensor of shape (n,) to write the
+                probability of the predicted gesture into.
+            out_indices:
+                An optional int64 tensor of shape (n,) to write the index of
+                the predicted gesture into.
+
+        Returns:
+            A tuple of the indices, confidences and probabilities tensors.
+        """
+
+        if isinstance(inputs, np.ndarray):
+            inputs = torch.from_numpy(inputs)
+        inputs = inputs.to(torch.float32)
+
+        with torch.inference_mode():
+            return softmax_argmax(self.batch_logits(inputs),
+                                  out_probs, out_confidences, out_indices)
@@ -0,0 +1,310 @@
+from typing import Dict, List, Tuple
+import numpy as np
+import torch
+import torch.nn.functional as F
+
+from . import prediction
+
+class TemporalConvModel(torch.nn.Module, prediction.BatchPredictor):
+    """A causal convolutional network over the most recent frames.
+
+    Recognises gestures made of movement as well as static poses. Each layer
+    is a 1D convolution over time with its dilation doubling layer by layer,
+    so the prediction for a frame depends on the last receptive_field frames
+    and no later ones.
+
+    Trained on windows of receptive_field consecutive frames, given as
+    tensors of shape (n, num_sensors, receptive_field). On a live stream,
+    step() takes one frame at a time and keeps the last inputs of every
+    layer in ring buffers, so each frame costs one column of each
+    convolution rather than the whole window. Since the receptive field is
+    finite, the streamed predictions are exactly those for the window of the
+    frames that led up to them.
+
+    Args:
+        num_sensors:
+            The number of sensors to be read.
+        num_gestures:
+            The number of gestures to be trained.
+        learning_capacity:
+            The number of channels of each convolution.
+        kernel_size:
+            The number of frames each convolution spans, before dilation.
+        num_layers:
+            The number of convolutions.
+    """
+    def __init__(self,
+                 num_sensors: int,
+                 num_gestures: int,
+                 learning_capacity: int,
+                 kernel_size: int = 3,
+                 num_layers: int = 3):
+        super().__init__()
+
+        dilations = [2 ** layer for layer in range(num_layers)]
+        self.convs = torch.nn.ModuleList(
+            torch.nn.Conv1d(num_sensors if layer == 0 else learning_capacity,
+                            learning_capacity,
+                            kernel_size,
+                            dilation=dilation)
+            for layer, dilation in enumerate(dilations))
+        self.output = torch.nn.Linear(learning_capacity, num_gestures)
+
+        self.receptive_field: int = 1 + (kernel_size - 1) * sum(dilations)
+
+        # Streaming state. Each layer's recent inputs are kept in a ring of
+        # channels x ring_size, long enough for the most dilated layer, with
+        # the newest at _position. A step is a handful of small operations,
+        # for which NumPy's per-call overhead is a fraction of torch's, so
+        # the state is kept in NumPy arrays.
+        ring_size = (kernel_size - 1) * dilations[-1] + 1
+        self._rings: List[np.ndarray] = [
+            np.zeros((conv.in_channels, ring_size), dtype=np.float32)
+            for conv in self.convs]
+        self._position: int = -1
+
+        # The ring columns of each layer's taps for every newest position,
+        # oldest tap first to match the layout of the convolution weights
+        positions = np.arange(ring_size)[:, None]
+        self._taps: List[np.ndarray] = [
+            (positions - dilation * np.arange(kernel_size - 1, -1, -1))
+            % ring_size
+            for dilation in dilations]
+
+        # Buffers the taps and outputs of a step are written into
+        self._tap_values: List[np.ndarray] = [
+            np.zeros((conv.in_channels, kernel_size), dtype=np.float32)
+            for conv in self.convs]
+        self._activations: List[np.ndarray] = [
+            np.zeros(learning_capacity, dtype=np.float32) for _ in self.convs]
+        self._logits: torch.Tensor = torch.zeros(1, num_gestures)
+        self._logits_np: np.ndarray = self._logits.numpy()
+
+        # NumPy views of the weights, taken when the stream starts
+        self._layers: list = []
+
+    def forward(self, input_: torch.tensor) -> torch.tensor:
+        """Apply the model to transform the input data.
+
+        Takes windows of shape (n, num_sensors, window) and returns the
+        output for the last frame of each.
+        """
+
+        for conv in self.convs:
+            input_ = F.relu(conv(input_))
+        return self.output(input_[:, :, -1])
+
+    @classmethod
+    def from_state_dict(cls,
+                        state_dict: Dict[str, torch.Tensor]
+                        ) -> "TemporalConvModel":
+        """Instantiates a model sized to match a saved state dict.
+
+        Args:
+            state_dict:
+                The parameters of a trained TemporalConvModel.
+
+        Returns:
+            A TemporalConvModel with the parameters loaded.
+        """
+
+        num_layers = sum(1 for key in state_dict
+                         if key.startswith("convs.") and key.endswith(".weight"))
+        learning_capacity, num_sensors, kernel_size = \
+            state_dict["convs.0.weight"].shape
+        num_gestures = state_dict["output.weight"].shape[0]
+        model = cls(num_sensors, num_gestures, learning_capacity, kernel_size,
+                    num_layers)
+        model.load_state_dict(state_dict)
+        return model
+
+    def artifact_dims(self) -> Dict[str, int]:
+        """Returns the constructor arguments needed to rebuild this model."""
+
+        return {"num_sensors": self.convs[0].in_channels,
+                "num_gestures": self.output.out_features,
+                "learning_capacity": self.output.in_features,
+                "kernel_size": self.convs[0].kernel_size[0],
+                "num_layers": len(self.convs)}
+
+    def reset_state(self) -> None:
+        """Forgets the stream, so the next frame restarts the state."""
+
+        self._position = -1
+
+    def _start(self, frame: np.ndarray) -> None:
+        """Fills the state as if the stream had always held frame."""
+
+        # Views of the current weights, as the convolution weights of shape
+        # (out, in, kernel) flattened to multiply the (in, kernel) taps
+        self._layers = [
+            (ring, taps, tap_values, activation,
+             conv.weight.detach().numpy().reshape(len(activation), -1),
+             conv.bias.detach().numpy())
+            for ring, taps, tap_values, activation, conv in zip(
+                self._rings, self._taps, self._tap_values,
+                self._activations, self.convs)]
+        self._output_weight = self.output.weight.detach().numpy()
+        self._output_bias = self.output.bias.detach().numpy()
+
+        input_ = frame
+        for ring, _, _, _, weight, bias in self._layers:
+            ring[:] = input_[:, None]
+            # Every tap holds the same input, so the output is constant
+            input_ = np.maximum(
+                weight.reshape(len(bias), len(input_), -1).sum(axis=2)
+                @ input_ + bias, 0)
+        self._position = self._rings[0].shape[1] - 1
+
+    def step(self, input_: torch.tensor) -> torch.tensor:
+        """Advances the stream by one frame.
+
+        Args:
+            input_:
+                A tensor of shape (1, num_sensors) of the next frame.
+
+        Returns:
+            A tensor of shape (1, num_gestures) of the output for the frame.
+            The tensor is reused, so it is overwritten by the next call.
+        """
+
+        frame = input_.numpy()[0]
+        if self._position < 0:
+            self._start(frame)
+        position = self._position + 1
+        if position == self._rings[0].shape[1]:
+            position = 0
+        self._position = position
+
+        for ring, taps, tap_values, activation, weight, bias in self._layers:
+            ring[:, position] = frame
+            np.take(ring, taps[position], axis=1, out=tap_values)
+            np.dot(weight, tap_values.reshape(-1), out=activation)
+            activation += bias
+            np.maximum(activation, 0, out=activation)
+            frame = activation
+
+        logits = self._logits_np[0]
+        np.dot(self._output_weight, frame, out=logits)
+        logits += self._output_bias
+        return self._logits
+
+    def _stream(self, frames: torch.Tensor) -> torch.Tensor:
+        """Advances the stream by many frames, vectorised over the frames.
+
+        Gives the same outputs as calling step() on each frame in turn, up
+        to floating point rounding, and leaves the same state behind.
+        """
+
+        if self._position < 0:
+            self._start(frames[0].numpy())
+        ring_size = self._rings[0].shape[1]
+
+        input_ = frames.T
+        for ring, conv in zip(self._rings, self.convs):
+            # The inputs the first frame's taps reach back to, then the
+            # new frames, oldest first
+            span = conv.dilation[0] * (conv.kernel_size[0] - 1)
+            ordered = torch.from_numpy(
+                np.roll(ring, -(self._position + 1), axis=1))
+            sequence = torch.cat([ordered[:, ring_size - span:], input_],
+                                 dim=1)
+            ring[:] = torch.cat([ordered, input_],
+                                dim=1)[:, -ring_size:].numpy()
+            input_ = F.relu(conv(sequence.unsqueeze(0)))[0]
+        self._position = ring_size - 1
+
+        return self.output(input_.T)
+
+    def batch_logits(self, inputs: torch.Tensor) -> torch.Tensor:
+        """Gets the logits for predict_batch().
+
+        Takes windows of shape (n, num_sensors, window), or the next n
+        frames of the stream as a tensor of shape (n, num_sensors), which
+        advances the stream as step() would.
+        """
+
+        if inputs.dim() == 2:
+            return self._stream(inputs)
+        return self(inputs)
+
+    def training_step(self,
+                      batch: Tuple[torch.tensor, torch.tensor]
+                     ) -> torch.tensor:
+        """Calculate the loss.
+
+        Takes in a batch of windows from the training data loader,
+        generates a prediction using this model, then calculates and returns
+        the cross entropy loss between the predictions and the labels of the
+        last frame of each window.
+
+        Args:
+            batch:
+                A batch of training data from a torch DataLoader object.
+
+        Returns:
+            A torch tensor containing the cross entropy loss.
+        """
+
+        windows, labels = batch
+        return F.cross_entropy(self(windows), labels)
+
+    def validation_step(self,
+                        batch: Tuple[torch.tensor, torch.tensor]
+                        ) -> Dict[str, torch.tensor]:
+        """Calculate the loss and accuracy for a batch.
+
+        Args:
+            batch:
+                A batch of validation data from a torch DataLoader object.
+
+        Returns:
+            A dictionary containing the loss and accuracy. The keys are
+            "validation_loss" and "validation_accuracy".
+        """
+
+        windows, labels = batch
+        output = self(windows)
+
+        loss = F.cross_entropy(output, labels)
+        _, predictions = torch.max(output, dim=1)
+        accuracy = (predictions == labels).float().mean()
+
+        return {"validation_loss": loss,
+                "validation_accuracy": accuracy}
+
+    def validation_epoch_end(self,
+                             outputs: List) -> Dict[str, int]:
+        """Calculate the loss and accuracy for the whole validation set.
+
+        Args:
+            outputs:
+                List of dictionaries containing loss and accuracy for
+                particular batch.
+
+        Returns:
+            Dictionary containing loss and accuracy for the whole epoch. Keys
+            are "validation_loss" and "validation_accuracy"
+        """
+
+        batch_losses = [output["validation_loss"] for output in outputs]
+        batch_accs = [output["validation_accuracy"] for output in outputs]
+        return {"validation_loss": torch.stack(batch_losses).mean().item(),
+                "validation_accuracy": torch.stack(batch_accs).mean().item()}
+
+    def epoch_end(self,
+                  epoch: int,
+                  result: Dict[str, int]) -> None:
+        """Displays the loss and accuracy for the epoch.
+
+        Args:
+            epoch:
+                The current epoch number.
+            result:
+                A dictionary containing the loss and accuracy calculated from
+                the validation set for this epoch.
+        """
+
+        val_loss = result["validation_loss"]
+        val_acc = result["validation_accuracy"]
+        print(f"Epoch [{epoch}], validation loss: {val_loss}, validation accuracy: {val_acc}")
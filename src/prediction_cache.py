@@ -0,0 +1,170 @@
+"""Caches predictions for readings that round to the same values.
+
+While a gesture is held the glove sends near identical readings at 90 Hz,
+and running the model on each one repeats the same work. The cache rounds
+every reading to a grid of the given resolution and remembers the
+prediction for each grid point.
+
+The model is always run on the grid point, never on the raw reading, so a
+cached prediction is exactly what the model gives for the rounded reading.
+Hits and misses therefore return the same result for the same reading, and
+the only difference from not caching is the rounding itself, which
+agreement() measures on recorded data.
+"""
+
+import time
+from collections import OrderedDict
+from threading import Lock
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+import torch
+
+from . import timing
+
+class PredictionCache:
+    """A bounded LRU cache of predictions keyed on rounded readings.
+
+    Args:
+        resolution:
+            The spacing of the grid readings are rounded to, in the units of
+            the readings.
+        capacity:
+            The most predictions kept. The least recently used is evicted
+            when it is exceeded.
+
+    Attributes:
+        hits:
+            The number of predictions taken from the cache.
+        misses:
+            The number of predictions the model had to be run for.
+        evictions:
+            The number of predictions evicted to stay within capacity.
+        invalidations:
+            The number of times the cache was cleared because the model
+            changed.
+    """
+
+    def __init__(self, resolution: float = 1.0, capacity: int = 4096):
+        self.resolution: float = resolution
+        self.capacity: int = capacity
+
+        self._entries: "OrderedDict[bytes, Tuple[int, torch.Tensor]]" = \
+            OrderedDict()
+        self._lock = Lock()
+
+        # The model the cached predictions were made with
+        self._owner = None
+
+        self.hits: int = 0
+        self.misses: int = 0
+        self.evictions: int = 0
+        self.invalidations: int = 0
+
+    def quantize(self, frame: np.ndarray) -> np.ndarray:
+        """Rounds a reading to the nearest grid point index."""
+
+        return np.rint(np.asarray(frame, dtype=np.float64)
+                       / self.resolution).astype(np.int64)
+
+    def representative(self, cell: np.ndarray) -> np.ndarray:
+        """The reading at a grid point, which the model is run on."""
+
+        return (cell * self.resolution).astype(np.float32)
+
+    def predict(self,
+                owner,
+                frame: np.ndarray,
+                timings: Optional[timing.StageTimings] = None
+                ) -> Tuple[int, torch.Tensor]:
+        """Predicts the gesture for a reading, using the cache if possible.
+
+        Args:
+            owner:
+                A LoadedModel, or anything with the session to predict with.
+                The cache is cleared whenever a different one is passed, so
+                predictions of a swapped out model are never returned.
+            frame:
+                An array of shape (num_sensors,) of sensor readings.
+            timings:
+                The StageTimings to record the lookup and any model stages
+                into, or None to skip timing.
+
+        Returns:
+            A tuple of the index of the predicted gesture and the model's
+            output for the rounded reading.
+        """
+
+        start_ns = time.monotonic_ns()
+        cell = self.quantize(frame)
+        key = cell.tobytes()
+
+        with self._lock:
+            if owner is not self._owner:
+                if self._entries:
+                    self.invalidations += 1
+                self._entries.clear()
+                self._owner = owner
+
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+
+        if entry is not None:
+            if timings is not None:
+                timings.record("cache_hit", time.monotonic_ns() - start_ns)
+            return entry
+
+        # Run the model on the grid point, outside the lock
+        entry = owner.session.predict(self.representative(cell), timings)
+        entry = (entry[0], entry[1].clone())
+
+        with self._lock:
+            self.misses += 1
+            if owner is self._owner:
+                self._entries[key] = entry
+                if len(self._entries) > self.capacity:
+                    self._entries.popitem(last=False)
+                    self.evictions += 1
+
+        return entry
+
+    def clear(self) -> None:
+        """Drops every cached prediction."""
+
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, float]:
+        """Returns the hit, miss, eviction and invalidation counts, the hit
+        rate and the number of cached predictions."""
+
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {"hits": self.hits,
+                    "misses": self.misses,
+                    "hit_rate": self.hits / max(lookups, 1),
+                    "evictions": self.evictions,
+                    "invalidations": self.invalidations,
+                    "size": len(self._entries),
+                    "resolution": self.resolution}
+
+    def agreement(self, model: torch.nn.Module, frames: np.ndarray) -> float:
+        """Measures how often rounding changes a model's prediction.
+
+        Args:
+            model:
+                A model with predict_batch().
+            frames:
+                An array of shape (n, num_sensors) of recorded readings.
+
+        Returns:
+            The fraction of frames for which the model predicts the same
+            gesture from the rounded reading as from the raw one.
+        """
+
+        raw, _, _ = model.predict_batch(np.asarray(frames, dtype=np.float32))
+        rounded, _, _ = model.predict_batch(
+            self.representative(self.quantize(frames)))
+        return (raw == rounded).double().mean().item()
@@ -0,0 +1,241 @@
+"""Keeps several trained models loaded so they can be swapped between."""
+
+import os
+from collections import OrderedDict
+from threading import Lock
+from typing import Any, Dict, List, NamedTuple, Optional
+
+import torch
+
+from . import artifact
+from . import dataset
+from . import inference
+from .evaluate import load_model
+
+class LoadedModel(NamedTuple):
+    """A trained model ready for inference.
+
+    Attributes:
+        name:
+            The name the model was loaded by.
+        path:
+            The path of the file the model was loaded from.
+        mtime_ns:
+            The modification time of the file when it was loaded.
+        gestures:
+            The list of gestures the model was trained with, in index order.
+        model:
+            The model.
+        session:
+            An InferenceSession wrapping the model.
+        metadata:
+            The training metadata of a model loaded from an artifact, empty
+            for a .pth file.
+    """
+
+    name: str
+    path: str
+    mtime_ns: int
+    gestures: List[str]
+    model: torch.nn.Module
+    session: inference.InferenceSession
+    metadata: Dict[str, Any] = {}
+
+class ModelRegistry:
+    """An LRU cache of loaded models.
+
+    Models are keyed by their file path, and a model whose file was
+    modified since it was loaded, because it was retrained and saved again,
+    is reloaded on its next use. A model
+    saved as an artifact is preferred over its .pth file, since it carries
+    its own gesture list and dimensions.
+
+    Args:
+        capacity:
+            The maximum number of models kept loaded. The least recently
+            used model is evicted when it is exceeded.
+        models_dir:
+            The directory trained models are loaded from.
+        data_dir:
+            The directory of the raw data files that gesture lists are read
+            from when none is given.
+        num_threads:
+            Passed on to each InferenceSession.
+        warmup_runs:
+            Passed on to each InferenceSession.
+    """
+
+    def __init__(self,
+                 capacity: int = 4,
+                 models_dir: str = "trained_models",
+                 data_dir: str = "data",
+                 num_threads: Optional[int] = 1,
+                 warmup_runs: int = 100):
+        self._capacity: int = capacity
+        self._models_dir: str = models_dir
+        self._data_dir: str = data_dir
+        self._num_threads: Optional[int] = num_threads
+        self._warmup_runs: int = warmup_runs
+
+        self._models: "OrderedDict[str, LoadedModel]" = OrderedDict()
+        self._lock = Lock()
+
+    def get(self,
+            name: str,
+            gestures: Optional[List[str]] = None,
+            data_path: Optional[str] = None) -> LoadedModel:
+        """Gets a loaded model, loading it if it is not already loaded.
+
+        Args:
+            name:
+                The name of the model, i.e. the name of its file in the
+                models directory without the extension.
+            gestures:
+                The list of gestures the model was trained with. If not
+                given, it is read from the artifact, or for a .pth file
+                from its raw data file.
+            data_path:
+                The raw data file a .pth model was trained on, to read its
+                gestures from if none are given. Defaults to the file with
+                the same name as the model in the data directory.
+
+        Returns:
+            The LoadedModel.
+
+        Raises:
+            ValueError if the gestures do not match the model, or none are
+            given for a .pth model and it has no raw data file.
+        """
+
+        path = os.path.join(self._models_dir, f"{name}{artifact.EXTENSION}")
+        if not os.path.exists(path):
+            path = os.path.join(self._models_dir, f"{name}.pth")
+        return self._get(name, path, gestures, data_path)
+
+    def get_artifact(self, path: str) -> LoadedModel:
+        """Gets a model from an artifact file anywhere on disk, loading it if
+        it is not already loaded.
+
+        Args:
+            path:
+                The path of the artifact file.
+
+        Returns:
+            The LoadedModel, named after the file.
+        """
+
+        name = os.path.splitext(os.path.basename(path))[0]
+        return self._get(name, path, None)
+
+    def _get(self,
+             name: str,
+             path: str,
+             gestures: Optional[List[str]],
+             data_path: Optional[str] = None) -> LoadedModel:
+        """Gets a model from the cache or loads it from a file."""
+
+        mtime_ns = os.stat(path).st_mtime_ns
+
+        with self._lock:
+            loaded = self._models.get(path)
+            if loaded is not None and loaded.mtime_ns == mtime_ns:
+                # Already loaded, mark it as most recently used
+                self._models.move_to_end(path)
+                if path.endswith(artifact.EXTENSION):
+                    self._check_gestures(path, loaded.gestures, gestures)
+                elif (gestures is not None
+                      and list(gestures) != loaded.gestures):
+                    # Same weights under other gesture names
+                    self._check_num_gestures(path, len(loaded.gestures),
+                                             gestures)
+                    loaded = loaded._replace(gestures=list(gestures))
+                    self._models[path] = loaded
+                return loaded
+
+            # Not loaded, or an older version of the file was
+            loaded = self._load(name, path, mtime_ns, gestures, data_path)
+            self._models[path] = loaded
+            self._models.move_to_end(path)
+
+            # Drop the least recently used models over capacity
+            while len(self._models) > self._capacity:
+                self._models.popitem(last=False)
+
+            return loaded
+
+    def loaded(self) -> List[str]:
+        """Returns the names of the loaded models, least recently used
+        first."""
+
+        with self._lock:
+            return [loaded.name for loaded in self._models.values()]
+
+    def _load(self,
+              name: str,
+              path: str,
+              mtime_ns: int,
+              gestures: Optional[List[str]],
+              data_path: Optional[str] = None) -> LoadedModel:
+        """Loads a model and wraps it in an InferenceSession."""
+
+        if path.endswith(artifact.EXTENSION):
+            # The artifact describes itself, the gestures given must agree
+            loaded = artifact.load(path)
+            self._check_gestures(path, loaded.gestures, gestures)
+            model = loaded.model
+            num_sensors = loaded.num_sensors
+            gestures = loaded.gestures
+            num_gestures = len(gestures)
+            metadata = loaded.metadata
+        else:
+            model = load_model(path)
+            dims = model.artifact_dims()
+            num_sensors = dims["num_sensors"]
+            num_gestures = dims["num_gestures"]
+
+            if gestures is None:
+                gestures = self._gestures_from_data(
+                    path,
+                    data_path or os.path.join(self._data_dir, f"{name}.csv"))
+            metadata = {}
+
+        self._check_num_gestures(path, num_gestures, gestures)
+
+        session = inference.InferenceSession(model,
+                                             num_sensors,
+                                             self._num_threads,
+                                             self._warmup_runs)
+        return LoadedModel(name, path, mtime_ns, list(gestures), model, session,
+                           metadata)
+
+    @staticmethod
+    def _check_gestures(path: str,
+                        trained: List[str],
+                        given: Optional[List[str]]) -> None:
+        """Raises a ValueError if the gestures given for an artifact differ
+        from the ones it was trained with."""
+
+        if given is not None and list(given) != trained:
+            raise ValueError(f"{path} was trained with gestures {trained} "
+                             f"but {list(given)} were given")
+
+    @staticmethod
+    def _check_num_gestures(path: str,
+                            num_gestures: int,
+                            gestures: List[str]) -> None:
+        """Raises a ValueError if the number of gestures given differs from
+        the number a model predicts."""
+
+        if len(gestures) != num_gestures:
+            raise ValueError(f"{path} predicts {num_gestures} gestures but "
+                             f"{len(gestures)} gesture names were given")
+
+    @staticmethod
+    def _gestures_from_data(path: str, data_path: str) -> List[str]:
+        """Reads the gesture list of the model at path from the raw data file
+        it was trained on."""
+
+        if not os.path.exists(data_path):
+            raise ValueError(f"no gestures were given for {path}, and there "
+                             f"is no {data_path} to read them from")
+        return dataset.gesture_names(data_path)
@@ -0,0 +1,307 @@
+"""Script for finding the smallest model that meets an accuracy target and
+a latency budget.
+
+Trains a LogisticRegressionModel and FeedForwardModels of a range of
+learning capacities on the training split of a recorded data set, the
+same one the Trainer uses with the same split_seed. From the
+largest network, it also derives smaller ones by pruning its least used
+hidden units and fine-tuning, and trains small networks and a logistic
+regression to match its logits. Each candidate's accuracy is measured on
+half of the held out split, the selection half, and its single frame
+latency on this machine, so run it on the CPU the model will be deployed
+on.
+
+Prints every candidate, marking the accuracy/latency Pareto frontier, and
+saves the candidate with the fewest parameters that meets both the target
+and the budget as an artifact, along with its accuracy on the other half of
+the held out split, the test half, which played no part in choosing it.
+
+Run from the repository root with:
+    $ python3 -m src.search data/virgo.csv --target 0.99 --budget-us 50
+"""
+
+import argparse
+import os
+import sys
+from typing import List, NamedTuple, Optional
+
+import torch
+import torch.nn.functional as F
+from torch.utils.data import DataLoader, TensorDataset
+
+from . import artifact
+from . import dataset
+from . import inference
+from . import timing
+from . import train
+from .models import feed_forward
+from .models import logistic_regression
+
+class Candidate(NamedTuple):
+    """A trained model and its measurements."""
+
+    name: str
+    model: torch.nn.Module
+    num_params: int
+    accuracy: float
+    latency_us: float
+
+def fit(model: torch.nn.Module,
+        inputs: torch.Tensor,
+        labels: torch.Tensor,
+        num_epochs: int,
+        lr: float,
+        batch_size: int,
+        teacher_logits: Optional[torch.Tensor] = None,
+        temperature: float = 2.0) -> torch.nn.Module:
+    """Trains a model on tensors in memory.
+
+    Args:
+        model:
+            The model to train.
+        inputs:
+            A tensor of shape (n, num_sensors) of training samples.
+        labels:
+            A tensor of shape (n,) of their gesture indices.
+        num_epochs:
+            The number of passes over the samples.
+        lr:
+            The learning rate of the Adam optimiser.
+        batch_size:
+            The number of samples in each step.
+        teacher_logits:
+            A tensor of shape (n, num_gestures) of a larger model's outputs
+            for the samples to distill, or None to train on the labels
+            alone.
+        temperature:
+            The softmax temperature the teacher's outputs are matched at.
+
+    Returns:
+        The trained model, in evaluation mode.
+    """
+
+    if teacher_logits is None:
+        samples = TensorDataset(inputs, labels)
+    else:
+        samples = TensorDataset(inputs, labels, teacher_logits)
+    loader = DataLoader(samples, batch_size, shuffle=True)
+    optimiser = torch.optim.Adam(model.parameters(), lr)
+
+    model.train()
+    for _ in range(num_epochs):
+        for batch in loader:
+            if teacher_logits is None:
+                loss = model.training_step(batch)
+            else:
+                # Half the label loss, half the match to the teacher's
+                # softened outputs, scaled to keep its gradients comparable
+                batch_inputs, batch_labels, batch_teacher = batch
+                outputs = model(batch_inputs)
+                soft = F.kl_div(F.log_softmax(outputs / temperature, dim=1),
+                                F.log_softmax(batch_teacher / temperature,
+                                              dim=1),
+                                reduction="batchmean", log_target=True)
+                loss = (0.5 * F.cross_entropy(outputs, batch_labels)
+                        + 0.5 * temperature ** 2 * soft)
+            loss.backward()
+            optimiser.step()
+            optimiser.zero_grad()
+    return model.eval()
+
+def prune(model: feed_forward.FeedForwardModel,
+          inputs: torch.Tensor,
+          learning_capacity: int) -> feed_forward.FeedForwardModel:
+    """Builds a smaller network from a trained one's most used hidden units.
+
+    Each hidden unit is scored by its mean activation on the inputs times
+    the size of its output weights. The best learning_capacity units are
+    kept, and the mean contribution of the dropped ones is folded into the
+    output bias.
+
+    Args:
+        model:
+            The trained network.
+        inputs:
+            A tensor of shape (n, num_sensors) of training samples.
+        learning_capacity:
+            The number of hidden units to keep.
+
+    Returns:
+        A FeedForwardModel with learning_capacity hidden units.
+    """
+
+    hidden, output = model.model[0], model.model[2]
+    with torch.no_grad():
+        mean_activation = F.relu(hidden(inputs)).mean(dim=0)
+        scores = mean_activation * output.weight.norm(dim=0)
+        kept = scores.argsort(descending=True)[:learning_capacity]
+        dropped = torch.ones(len(scores), dtype=torch.bool)
+        dropped[kept] = False
+
+        pruned = feed_forward.FeedForwardModel(hidden.in_features,
+                                               output.out_features,
+                                               learning_capacity)
+        pruned.model[0].weight.copy_(hidden.weight[kept])
+        pruned.model[0].bias.copy_(hidden.bias[kept])
+        pruned.model[2].weight.copy_(output.weight[:, kept])
+        pruned.model[2].bias.copy_(output.bias + output.weight[:, dropped]
+                                   @ mean_activation[dropped])
+    return pruned
+
+def pareto_frontier(candidates: List[Candidate]) -> List[Candidate]:
+    """Gets the candidates no other candidate is both at least as fast and
+    at least as accurate as, and strictly better in one of the two."""
+
+    return [candidate for candidate in candidates
+            if not any(other.latency_us <= candidate.latency_us
+                       and other.accuracy >= candidate.accuracy
+                       and (other.latency_us < candidate.latency_us
+                            or other.accuracy > candidate.accuracy)
+                       for other in candidates)]
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("data", help="path to a raw data .csv file")
+    parser.add_argument("--target", type=float, default=0.99,
+                        help="accuracy to reach on the selection split")
+    parser.add_argument("--budget-us", type=float, default=50.0,
+                        help="median single frame latency allowed")
+    parser.add_argument("--capacities", type=int, nargs="+",
+                        default=[4, 8, 16, 32, 64, 128],
+                        help="learning capacities of the networks to train")
+    parser.add_argument("--no-prune", action="store_true",
+                        help="skip the pruned networks")
+    parser.add_argument("--no-distill", action="store_true",
+                        help="skip the distilled models")
+    parser.add_argument("--temperature", type=float, default=2.0,
+                        help="softmax temperature of the distillation")
+    parser.add_argument("--epochs", type=int, default=100)
+    parser.add_argument("--lr", type=float, default=1e-2)
+    parser.add_argument("--batch-size", type=int, default=128)
+    parser.add_argument("--split-seed", type=int, default=0,
+                        help="seed of the held out split, see "
+                        "train.split_indices()")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="seed of the training")
+    parser.add_argument("--out", help="artifact to save, defaults to "
+                        "trained_models/<data name>_search.model")
+    args = parser.parse_args()
+
+    # Hold out the Trainer's validation split of the data, filtered as in
+    # training, half to choose a model on and half to test the choice on
+    ds = dataset.CapacitanceDataset(args.data)
+    train_indices, held_out = train.split_indices(ds.blocks, args.split_seed)
+    selection, test = held_out[:len(held_out) // 2], \
+        held_out[len(held_out) // 2:]
+    inputs, labels = ds.inputs[train_indices], \
+        ds.labels[train_indices].long()
+    selection_inputs = ds.inputs[selection]
+    selection_labels = ds.labels[selection].long()
+    frames = selection_inputs.numpy()
+    num_sensors = inputs.shape[1]
+    num_gestures = int(ds.labels.max()) + 1
+
+    def trained(model: torch.nn.Module, **kwargs) -> torch.nn.Module:
+        torch.manual_seed(args.seed)
+        return fit(model, inputs, labels, args.epochs, args.lr,
+                   args.batch_size, **kwargs)
+
+    models = {"logistic regression": trained(
+        logistic_regression.LogisticRegressionModel(num_sensors,
+                                                    num_gestures))}
+    capacities = sorted(args.capacities)
+    networks = {}
+    for capacity in capacities:
+        networks[capacity] = trained(feed_forward.FeedForwardModel(
+            num_sensors, num_gestures, capacity))
+        models[f"feed forward {capacity}"] = networks[capacity]
+
+    # Smaller models derived from the largest network
+    largest = capacities[-1]
+    teacher = networks[largest]
+    if not args.no_prune:
+        for capacity in capacities[:-1]:
+            models[f"pruned {largest} to {capacity}"] = \
+                trained(prune(teacher, inputs, capacity))
+    if not args.no_distill:
+        with torch.no_grad():
+            teacher_logits = teacher(inputs)
+        models[f"distilled {largest} to logistic"] = trained(
+            logistic_regression.LogisticRegressionModel(num_sensors,
+                                                        num_gestures),
+            teacher_logits=teacher_logits, temperature=args.temperature)
+        for capacity in capacities[:-1]:
+            models[f"distilled {largest} to {capacity}"] = trained(
+                feed_forward.FeedForwardModel(num_sensors, num_gestures,
+                                              capacity),
+                teacher_logits=teacher_logits,
+                temperature=args.temperature)
+
+    # Measured once training is done, so it does not disturb the timings
+    candidates = []
+    for name, model in models.items():
+        predictions = model.predict_batch(selection_inputs)[0]
+        candidates.append(Candidate(
+            name, model,
+            sum(param.numel() for param in model.parameters()),
+            (predictions == selection_labels).double().mean().item(),
+            timing.per_frame_us(
+                inference.InferenceSession(model, num_sensors).predict,
+                frames, median=True)))
+
+    frontier = pareto_frontier(candidates)
+    eligible = [candidate for candidate in candidates
+                if candidate.accuracy >= args.target
+                and candidate.latency_us <= args.budget_us]
+    on_frontier = {candidate.name for candidate in frontier}
+    meets = {candidate.name for candidate in eligible}
+
+    print(f"{len(train_indices)} training, {len(selection)} selection and "
+          f"{len(test)} test frames from {args.data}, split seed "
+          f"{args.split_seed}, target {args.target}, budget {args.budget_us} "
+          f"us\n")
+    print(f"{'model':<30}{'params':>8}{'accuracy':>10}{'p50 us':>9}"
+          f"{'frontier':>10}{'meets':>7}")
+    for candidate in sorted(candidates, key=lambda c: c.latency_us):
+        print(f"{candidate.name:<30}{candidate.num_params:>8d}"
+              f"{candidate.accuracy:>10.4f}{candidate.latency_us:>9.1f}"
+              f"{'*' if candidate.name in on_frontier else '':>10}"
+              f"{'*' if candidate.name in meets else '':>7}")
+
+    if not eligible:
+        sys.exit("\nno model meets both the target and the budget")
+    best = min(eligible, key=lambda c: (c.num_params, c.latency_us))
+    predictions = best.model.predict_batch(ds.inputs[test])[0]
+    test_accuracy = (predictions == ds.labels[test]).double().mean().item()
+
+    out = args.out
+    if out is None:
+        name = os.path.splitext(os.path.basename(args.data))[0]
+        out = os.path.join("trained_models",
+                           f"{name}_search{artifact.EXTENSION}")
+    artifact.save(out, best.model, dataset.gesture_names(args.data),
+                  {"mean": inputs.mean(dim=0).tolist(),
+                   "std": inputs.std(dim=0).tolist()},
+                  {"data_file": args.data,
+                   "filter": ds.filter_config._asdict(),
+                   "num_samples": len(train_indices),
+                   "split_seed": args.split_seed,
+                   "split_block": dataset.SPLIT_BLOCK,
+                   "num_epochs": args.epochs,
+                   "lr": args.lr,
+                   "batch_size": args.batch_size,
+                   "search": best.name,
+                   "target_accuracy": args.target,
+                   "budget_us": args.budget_us,
+                   "selection_accuracy": best.accuracy,
+                   "test_accuracy": test_accuracy,
+                   "latency_us": best.latency_us,
+                   "frontier": [{"name": candidate.name,
+                                 "accuracy": candidate.accuracy,
+                                 "latency_us": candidate.latency_us}
+                                for candidate in frontier]})
+    print(f"\n{best.name} has the fewest parameters that meet both, with "
+          f"{test_accuracy:.4f} accuracy on the test split, saved {out}")
+
+if __name__ == "__main__":
+    main()
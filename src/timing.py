@@ -0,0 +1,184 @@
+"""Fixed-bucket latency histograms for timing the gesture pipeline."""
+
+import bisect
+import statistics
+import time
+from threading import Lock
+from typing import Any, Callable, Dict, Iterable, List
+
+# Upper bounds of the histogram buckets in nanoseconds, roughly three per
+# decade from 10 microseconds to 10 seconds. Anything slower falls into a
+# final overflow bucket.
+BUCKET_BOUNDS_NS: List[int] = [
+    int(mantissa * 10 ** exponent)
+    for exponent in range(4, 10)
+    for mantissa in (1, 2, 5)
+] + [10 ** 10]
+
+class LatencyHistogram:
+    """Counts durations into fixed buckets.
+
+    Recording is a binary search and an increment, so it is cheap enough to
+    call on every frame.
+
+    Attributes:
+        counts:
+            The number of durations recorded into each bucket. The last
+            entry is the overflow bucket.
+        count:
+            The total number of durations recorded.
+        total_ns:
+            The sum of all the durations recorded in nanoseconds.
+        max_ns:
+            The longest duration recorded in nanoseconds.
+    """
+
+    def __init__(self):
+        self.counts: List[int] = [0] * (len(BUCKET_BOUNDS_NS) + 1)
+        self.count: int = 0
+        self.total_ns: int = 0
+        self.max_ns: int = 0
+
+    def record(self, duration_ns: int) -> None:
+        """Adds a duration in nanoseconds to the histogram."""
+
+        self.counts[bisect.bisect_left(BUCKET_BOUNDS_NS, duration_ns)] += 1
+        self.count += 1
+        self.total_ns += duration_ns
+        if duration_ns > self.max_ns:
+            self.max_ns = duration_ns
+
+    def quantile(self, q: float) -> int:
+        """Estimates a quantile from the bucket counts.
+
+        Args:
+            q:
+                The quantile to estimate, between 0 and 1.
+
+        Returns:
+            The upper bound in nanoseconds of the bucket containing the
+            quantile, or the max duration for the overflow bucket. 0 if
+            nothing has been recorded.
+        """
+
+        if self.count == 0:
+            return 0
+
+        target = q * self.count
+        seen = 0
+        for idx, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= target and bucket_count:
+                if idx < len(BUCKET_BOUNDS_NS):
+                    return min(BUCKET_BOUNDS_NS[idx], self.max_ns)
+                return self.max_ns
+        return self.max_ns
+
+    def snapshot(self) -> Dict[str, float]:
+        """Summarises the histogram.
+
+        Returns:
+            A dictionary containing the count, and the mean, p50, p90, p99
+            and max durations in milliseconds.
+        """
+
+        mean_ns = self.total_ns / self.count if self.count else 0
+        return {"count": self.count,
+                "mean_ms": mean_ns / 1e6,
+                "p50_ms": self.quantile(0.5) / 1e6,
+                "p90_ms": self.quantile(0.9) / 1e6,
+                "p99_ms": self.quantile(0.99) / 1e6,
+                "max_ms": self.max_ns / 1e6}
+
+class StageTimings:
+    """A set of named latency histograms and event counters.
+
+    Instrumented code holds an Optional[StageTimings] that is None while
+    timing is disabled, so the disabled cost is a single None check.
+
+    Stages and counters are recorded from several threads, like the BLE
+    and API threads, and read from others, like the stats log and the
+    metrics scrape. Adding a stage and changing a counter take a lock, and
+    readers iterate over copies, so neither sees a dictionary change size.
+
+    Attributes:
+        histograms:
+            A dictionary of LatencyHistograms keyed by stage name.
+        counters:
+            A dictionary of event counts keyed by counter name.
+    """
+
+    def __init__(self):
+        self.histograms: Dict[str, LatencyHistogram] = {}
+        self.counters: Dict[str, int] = {}
+        self._lock = Lock()
+
+    def record(self, stage: str, duration_ns: int) -> None:
+        """Adds a duration in nanoseconds to a stage's histogram."""
+
+        histogram = self.histograms.get(stage)
+        if histogram is None:
+            # Only the first record of a stage takes the lock
+            with self._lock:
+                histogram = self.histograms.setdefault(stage,
+                                                       LatencyHistogram())
+        histogram.record(duration_ns)
+
+    def increment(self, counter: str, amount: int = 1) -> None:
+        """Adds to an event counter."""
+
+        with self._lock:
+            self.counters[counter] = self.counters.get(counter, 0) + amount
+
+    def snapshot(self) -> Dict[str, Dict]:
+        """Summarises every stage and counter.
+
+        Returns:
+            A dictionary with a "stages" dictionary of histogram summaries
+            and a "counters" dictionary of event counts.
+        """
+
+        with self._lock:
+            histograms = list(self.histograms.items())
+            counters = dict(self.counters)
+        return {"stages": {stage: histogram.snapshot()
+                           for stage, histogram in histograms},
+                "counters": counters}
+
+    def summary_line(self) -> str:
+        """Formats the mean and p99 of every stage as a single log line."""
+
+        with self._lock:
+            histograms = list(self.histograms.items())
+            counters = list(self.counters.items())
+        parts = [f"{stage} {histogram.total_ns / max(histogram.count, 1) / 1e6:.3f}"
+                 f"/{histogram.quantile(0.99) / 1e6:.3f}ms"
+                 for stage, histogram in histograms]
+        parts += [f"{counter}={count}" for counter, count in counters]
+        return "mean/p99: " + ", ".join(parts)
+
+def per_frame_us(step: Callable[[Any], Any], frames: Iterable[Any],
+                 median: bool = False) -> float:
+    """Times step on every frame in turn.
+
+    Args:
+        step:
+            The function to time, called with each frame, e.g. the predict
+            method of an InferenceSession.
+        frames:
+            The frames to call it on, in order.
+        median:
+            Whether to return the median rather than the mean, which is
+            steadier on a busy machine.
+
+    Returns:
+        The mean, or median, time of a single call in microseconds.
+    """
+
+    durations = []
+    for frame in frames:
+        start_ns = time.perf_counter_ns()
+        step(frame)
+        durations.append(time.perf_counter_ns() - start_ns)
+    average = statistics.median if median else statistics.fmean
+    return average(durations) / 1e3
@@ -1,16 +1,68 @@
 """Script for training the desired model."""
+import threading
+import time
+import numpy as np
 import torch
-from torch.utils.data import random_split, DataLoader
-from typing import List, Dict
+from torch.utils.data import DataLoader, Subset
+from typing import Any, Callable, List, Dict, Optional, Tuple
 
 import yaml
 import matplotlib.pyplot as plt
 
 from .models import feed_forward
+from .models import logistic_regression
+from .models import temporal_conv
+from . import artifact
 from . import dataset
 
+# The models that can be chosen with the architecture hyperparameter
+MODELS = {
+    "feed_forward": feed_forward.FeedForwardModel,
+    "logistic_regression": logistic_regression.LogisticRegressionModel,
+    "temporal_conv": temporal_conv.TemporalConvModel,
+}
+
+def split_indices(blocks: np.ndarray,
+                  split_seed: int) -> Tuple[List[int], List[int]]:
+    """Splits the indices of a data set into training and validation.
+
+    Whole blocks of consecutive readings are split rather than single
+    samples, a fifth of the blocks into validation, so no validation sample
+    is a near copy of a training one. A sample spanning two blocks, like a
+    window of readings, is only used if both are on the same side.
+
+    The split depends only on the blocks and the seed, so models trained on
+    the same data with the same seed are validated on the same samples,
+    which scripts like calibrate can then hold out.
+
+    Args:
+        blocks:
+            The blocks attribute of a CapacitanceDataset or WindowDataset,
+            an array of shape (n,) of the block of each sample, or of shape
+            (n, 2) of the first and last block each spans.
+        split_seed:
+            The seed of the random split.
+
+    Returns:
+        A tuple of the training indices, those in four fifths of the
+        blocks, and the validation indices.
+    """
+
+    blocks = blocks.reshape(len(blocks), -1)
+    num_blocks = int(blocks.max()) + 1 if len(blocks) else 0
+    generator = torch.Generator().manual_seed(split_seed)
+    order = torch.randperm(num_blocks, generator=generator).numpy()
+    validation = np.zeros(num_blocks, dtype=bool)
+    validation[order[num_blocks // 5 * 4:]] = True
+    sides = validation[blocks]
+    return (np.flatnonzero(~sides.any(axis=1)).tolist(),
+            np.flatnonzero(sides.all(axis=1)).tolist())
+
 class Trainer:
     """This class is responsible for training a selected model.
+
+    train() can be paused, resumed and cancelled from other threads, so the
+    GUI can run it on a worker thread.
     
     Args:
         data_file_path:
@@ -22,9 +74,18 @@ class Trainer:
         lr:
             The learning rate for the model.
         model:
-            The model object being trained.
+            The model object being trained. A model with a receptive_field
+            of more than one frame, like the TemporalConvModel, is trained
+            on windows of that many consecutive frames.
         optimiser_funct:
             The class of the optimiser used to adjust the model's parameters.
+        split_seed:
+            The seed of the split into training and validation, see
+            split_indices(). A random one is drawn if not given.
+
+    Attributes:
+        split_seed:
+            The seed of the split, recorded in the saved artifact.
     """
 
     def __init__(self,
@@ -33,8 +94,11 @@ class Trainer:
                  num_epochs: int,
                  lr: int,
                  model: torch.nn.Module,
-                 optimiser_funct: torch.optim.Optimizer):
+                 optimiser_funct: torch.optim.Optimizer,
+                 split_seed: Optional[int] = None):
 
+        self._data_file_path = data_file_path
+        self._batch_size = batch_size
         self._num_epochs = num_epochs
         self._lr = lr
         self._model = model
@@ -42,23 +106,80 @@ class Trainer:
 
         # Get dataset from the raw csv data
         ds = dataset.CapacitanceDataset(data_file_path)
+        self._dataset = ds
+        self._history: List[Dict[str, int]] = []
+
+        # Cut windows for models that look at recent frames
+        window = getattr(model, "receptive_field", 1)
+        samples = ds if window == 1 else dataset.WindowDataset(ds, window)
 
         # Split the data set into training and validation
-        train_ds_size = len(ds) // 5 * 4
-        train_ds, val_ds = random_split(ds,
-                                        [train_ds_size,
-                                         len(ds) - train_ds_size])
+        if split_seed is None:
+            split_seed = int(torch.randint(2 ** 31, ()))
+        self.split_seed = split_seed
+        train_indices, val_indices = split_indices(samples.blocks,
+                                                   split_seed)
+        train_ds = Subset(samples, train_indices)
+        val_ds = Subset(samples, val_indices)
 
         # Initialise Data Loaders
         self._train_loader = DataLoader(train_ds, batch_size, shuffle=True)
         self._val_loader = DataLoader(val_ds, batch_size)
 
-    def train(self) -> List[Dict[str, int]]:
+        # Cleared while paused, and set again to resume or cancel
+        self._running = threading.Event()
+        self._running.set()
+        self._cancelled = threading.Event()
+
+    @property
+    def cancelled(self) -> bool:
+        """Whether the last training run was cancelled."""
+
+        return self._cancelled.is_set()
+
+    def pause(self) -> None:
+        """Stops training after the current batch until resume() is
+        called."""
+
+        self._running.clear()
+
+    def resume(self) -> None:
+        """Continues training after pause()."""
+
+        self._running.set()
+
+    def cancel(self) -> None:
+        """Stops training after the current batch."""
+
+        self._cancelled.set()
+        self._running.set()
+
+    def reset(self) -> None:
+        """Clears a previous pause or cancel before the next training run.
+
+        Called by whoever starts the run, before it starts, so that a cancel
+        made in between is not lost.
+        """
+
+        self._cancelled.clear()
+        self._running.set()
+
+    def train(self,
+              on_epoch: Optional[Callable[[int, Optional[Dict[str, int]]],
+                                          None]] = None
+              ) -> List[Dict[str, int]]:
         """Training and validation loop.
+
+        Args:
+            on_epoch:
+                An optional function called at the end of every epoch with
+                the epoch number and the validation results, or None for
+                the epochs that are not validated.
         
         Returns:
             List containing dictionaries that keep track of the loss and
-            accuracy for every epoch.
+            accuracy for every epoch. If cancelled, those of the epochs
+            completed.
         """
 
         # List used to keep track of the loss and accuracy each epoch.
@@ -67,12 +188,18 @@ class Trainer:
         for epoch in range(self._num_epochs):
             # Training
             for batch in self._train_loader:
+                self._running.wait()
+                if self._cancelled.is_set():
+                    break
                 loss = self._model.training_step(batch)
                 loss.backward()
                 self._optimiser.step()
                 self._optimiser.zero_grad()
+            if self._cancelled.is_set():
+                break
 
             # Validation (every 10 epochs)
+            result = None
             if epoch % 10 == 0:
                 # Get loss and accuracy for the whole epoch
                 result = self._evaluate(self._model, self._val_loader)
@@ -83,8 +210,52 @@ class Trainer:
                 # Add it to history
                 history.append(result)
 
+            if on_epoch is not None:
+                on_epoch(epoch, result)
+
+        self._history = history
         return history
 
+    def save_artifact(self,
+                      path: str,
+                      gestures: List[str],
+                      metadata: Optional[Dict[str, Any]] = None) -> None:
+        """Saves the trained model as a self-describing artifact.
+
+        The artifact holds the model's architecture and dimensions, the
+        gesture names, the per-sensor mean and standard deviation of the
+        training data, and the training parameters and final validation
+        results, so it can be loaded without the config file.
+
+        Args:
+            path:
+                The path of the artifact file to write.
+            gestures:
+                The list of gestures the model was trained with, in index
+                order.
+            metadata:
+                Extra metadata to store alongside the training parameters.
+        """
+
+        inputs = self._dataset.inputs
+        normalization = {"mean": inputs.mean(dim=0).tolist(),
+                         "std": inputs.std(dim=0).tolist()}
+
+        training = {"data_file": self._data_file_path,
+                    "num_samples": len(self._dataset),
+                    "batch_size": self._batch_size,
+                    "num_epochs": self._num_epochs,
+                    "lr": self._lr,
+                    "filter": self._dataset.filter_config._asdict(),
+                    "split_seed": self.split_seed,
+                    "split_block": dataset.SPLIT_BLOCK,
+                    "trained_at": time.strftime("%Y-%m-%dT%H:%M:%S%z")}
+        if self._history:
+            training.update(self._history[-1])
+        training.update(metadata or {})
+
+        artifact.save(path, self._model, gestures, normalization, training)
+
     def _evaluate(self,
                   model: torch.nn.Module,
                   val_loader: DataLoader) -> Dict[str, int]:
@@ -128,25 +299,63 @@ class Trainer:
         plt.title("Accuracy vs Number of Epochs")
         plt.show()
 
+def build_model(hyperparams: Dict[str, Any],
+                num_sensors: int,
+                num_gestures: int) -> torch.nn.Module:
+    """Instantiates the model chosen in the hyperparams section of the
+    config file.
+
+    Args:
+        hyperparams:
+            The hyperparams section of the config file. Its architecture is
+            a key of MODELS, and defaults to feed_forward. Its
+            learning_capacity is not used by a logistic regression, and
+            its kernel_size and num_layers only by a temporal_conv.
+        num_sensors:
+            The number of sensors to be read.
+        num_gestures:
+            The number of gestures to be trained.
+
+    Returns:
+        The untrained model.
+    """
+
+    architecture = hyperparams.get("architecture", "feed_forward")
+    if architecture == "logistic_regression":
+        # No hidden layer to size
+        return MODELS[architecture](num_sensors, num_gestures)
+    if architecture == "temporal_conv":
+        return MODELS[architecture](num_sensors,
+                                    num_gestures,
+                                    hyperparams["learning_capacity"],
+                                    hyperparams["kernel_size"],
+                                    hyperparams["num_layers"])
+    return MODELS[architecture](num_sensors,
+                                num_gestures,
+                                hyperparams["learning_capacity"])
+
 def main() -> None:
     # Set up parameters
     num_sensors = 0
     num_gestures = 0
-    learning_cap = 0
+    hyperparams = {}
     data = ""
     batch_size = 0
     num_epochs = 0
     lr = 0
     model_path = ""
+    artifact_path = ""
+    gestures = []
     with open("src/config.yaml") as config:
         configyaml = yaml.load(config, Loader=yaml.loader.FullLoader)
 
         # General parameters
         num_sensors = configyaml["general"]["num_sensors"]
-        num_gestures = len(configyaml["general"]["gestures"])
+        gestures = configyaml["general"]["gestures"]
+        num_gestures = len(gestures)
 
         # Hyperparameters for machine learning
-        learning_cap = configyaml["hyperparams"]["learning_capacity"]
+        hyperparams = configyaml["hyperparams"]
         batch_size = configyaml["hyperparams"]["batch_size"]
         num_epochs = configyaml["hyperparams"]["num_epochs"]
         lr = configyaml["hyperparams"]["lr"]
@@ -154,11 +363,10 @@ def main() -> None:
         # File paths
         data = f"data/{configyaml['filenames']['data']}.csv"
         model_path = f"trained_models/{configyaml['filenames']['trained_model']}.pth"
+        artifact_path = f"trained_models/{configyaml['filenames']['trained_model']}{artifact.EXTENSION}"
 
     # Instantiate model
-    model = feed_forward.FeedForwardModel(num_sensors,
-                                          num_gestures,
-                                          learning_cap)
+    model = build_model(hyperparams, num_sensors, num_gestures)
 
     # Choose optimiser function
     optimiser_function = torch.optim.SGD
@@ -169,7 +377,8 @@ def main() -> None:
                       num_epochs,
                       lr,
                       model,
-                      optimiser_function)
+                      optimiser_function,
+                      hyperparams.get("split_seed"))
 
     # Train the model
     history = trainer.train()
@@ -180,6 +389,9 @@ def main() -> None:
     # Save the model's parameters
     torch.save(model.state_dict(), model_path)
 
+    # Save it with everything needed to load it without the config file
+    trainer.save_artifact(artifact_path, gestures)
+
 if __name__ == "__main__":
     main()
     
\ No newline at end of file
@@ -1,33 +1,153 @@
 #!/usr/bin/env python3
-from threading import Thread
-import multiprocessing as mp
+import logging
+import time
+from threading import Event, Thread
+from typing import Dict, List, NamedTuple, Optional, Tuple
 import serial
 import gesture_recognition_api
+from src import timing
+
+logger = logging.getLogger(__name__)
+
+# Wheel directions (left, right) for each gesture
+DIRECTIONS = {
+    "stop": (0, 0),
+    "forward": (1, 1),
+    "backward": (-1, -1),
+    "left": (1, -1),
+    "right": (-1, 1),
+    "forward right": (0, 1),
+    "forward left": (1, 0),
+    "backward right": (-1, 0),
+    "backward left": (0, -1)
+}
+
+def pack_frame(direction) -> bytes:
+    """Packs a direction into the frame sent over the serial link.
+
+    Each frame is a 0xFF header byte followed by the left and right wheel
+    speeds, each mapped from -1..1 to 0..200.
+    """
+
+    left, right = direction
+    return bytes((0xFF, 100 * left + 100, 100 * right + 100))
+
+STOP_FRAME = pack_frame(DIRECTIONS["stop"])
+
+# The serial port the robot is attached to
+DEFAULT_PORT = "/dev/serial/by-id/usb-FTDI_FT232R_USB_UART_A1024FPT-if00-port0"
+
+class Command(NamedTuple):
+    """A command frame with the times it passed through the pipeline.
+
+    Attributes:
+        frame:
+            The packed frame to write to the serial.
+        notified_ns:
+            The time.monotonic_ns() at which the BLE notification the command
+            was predicted from arrived. 0 if no gesture has been read yet.
+        predicted_ns:
+            The time.monotonic_ns() at which the gesture was predicted.
+        queued_ns:
+            The time.monotonic_ns() at which the command was handed to the
+            publisher.
+    """
+
+    frame: bytes
+    notified_ns: int = 0
+    predicted_ns: int = 0
+    queued_ns: int = 0
 
 class VirgoTeleopController:
-    def __init__(self):
+    """Drives the Virgo robot with gestures read from a StretchSense glove.
+
+    Gestures are read on a background thread and the resulting command is
+    published over serial by a fixed-rate scheduler. A frame is only
+    written when the command changes or when the keepalive is due.
+
+    Every command carries the time its sensor data arrived. If the newest
+    command is older than max_age, the publisher falls back to stop until
+    fresh gestures arrive again.
+
+    Args:
+        rate_hz:
+            The number of scheduler ticks per second.
+        keepalive:
+            The maximum number of seconds between frames when the command
+            does not change.
+        max_age:
+            The maximum number of seconds between a command's BLE
+            notification and its publication before it is considered stale.
+        port:
+            The path of the serial port to open. Ignored if ser is given.
+        ser:
+            An already open serial port to publish to.
+        api:
+            The gesture source. Anything with setup(), gestures and
+            read_stamped_gesture_fast() like the API, or a
+            shared_frames.SharedFrameReader to take gestures from another
+            process that owns the glove. Defaults to a new API.
+
+    Attributes:
+        latency:
+            A dictionary of LatencyHistograms for each stage of the
+            pipeline. The keys are "predict" (notification to prediction),
+            "queue" (prediction to handoff), "publish" (handoff to the
+            publisher picking it up), "wire" (notification to serial write)
+            and "age" (age of the command acted on at every tick).
+    """
+
+    def __init__(self,
+                 rate_hz: float = 50.0,
+                 keepalive: float = 0.5,
+                 max_age: float = 0.5,
+                 port: str = DEFAULT_PORT,
+                 ser: Optional[serial.Serial] = None,
+                 api=None):
         # API for gesture recognition
-        self._api = gesture_recognition_api.API()
+        self._api = api if api is not None else gesture_recognition_api.API()
+
+        self._period: float = 1.0 / rate_hz
+        self._keepalive: float = keepalive
+        self._max_age_ns: int = int(max_age * 1e9)
+
+        # The latest command, written by the reader and sent by the
+        # publisher. Replacing a reference is atomic, so no lock is needed
+        # for this single-slot handoff.
+        self._command: Command = Command(STOP_FRAME)
 
-        # Container queue to store the current direction
-        self._q = mp.Queue(1)
+        # Set to stop both loops
+        self._stop = Event()
+
+        # Scheduler statistics
+        self.ticks: int = 0
+        self.frames_sent: int = 0
+        self.deadline_misses: int = 0
+        self._total_jitter: float = 0.0
+        self.max_jitter: float = 0.0
+        self.stale_breaches: int = 0
+        self.latency: Dict[str, timing.LatencyHistogram] = {
+            stage: timing.LatencyHistogram()
+            for stage in ("predict", "queue", "publish", "wire", "age")
+        }
 
         # Functions to execute
-        self.init_serial()
+        if ser is not None:
+            self.ser = ser
+        else:
+            self.init_serial(port)
         self.set_up_glove()
 
-        # Initialise threads for parallel processing
-        glove_reader = Thread(target=self.get_gesture)
-        direction_publisher = Thread(target=self.run_glove)
+        # Precompute the frame for every gesture index, along with the
+        # model the indices belong to, swapped in as one tuple. The
+        # publisher rebuilds it when the model is swapped.
+        self._commands: Tuple[str, List[bytes]] = (
+            self._api.model_name,
+            self._build_command_table(self._api.gestures))
 
-        # Start threads
-        glove_reader.start()
-        direction_publisher.start()
-
-    def init_serial(self):
+    def init_serial(self, port: str = DEFAULT_PORT):
         self.ser = serial.Serial(
-            port=
-            "/dev/serial/by-id/usb-FTDI_FT232R_USB_UART_A1024FPT-if00-port0",
+            port=port,
             baudrate=115200
 
         )
@@ -37,63 +157,188 @@ class VirgoTeleopController:
     def set_up_glove(self) -> None:
         self._api.setup()
 
-    def run_glove(self):
-        """Gets the user input from the glove and outputs it to the serial."""
+    def _build_command_table(self, gestures: List[str]) -> List[bytes]:
+        """Maps every gesture index to its packed frame.
 
-        try:
-            print('Press CTRL+C to quit')
+        Gestures without a known direction are mapped to stop.
+
+        Args:
+            gestures:
+                The list of gestures the model was trained with.
 
-            curr_direction = (0, 0)
-            while True:
-                if not self._q.empty():
-                    # get the updated direction
-                    curr_direction = self._q.get()         
+        Returns:
+            A list of frames indexed by gesture index.
+        """
 
-                # Publish
-                print(curr_direction) # will be replaced by some function to publish to serial
-                left = (100 * curr_direction[0] + 100).to_bytes(1, "big")
-                right = (100 * curr_direction[1] + 100).to_bytes(1, "big")
+        commands = []
+        for gesture in gestures:
+            if gesture not in DIRECTIONS:
+                print(f"No direction for gesture '{gesture}', using stop")
+            commands.append(pack_frame(DIRECTIONS.get(gesture,
+                                                      DIRECTIONS["stop"])))
+        return commands
 
-                self.ser.write(bytes.fromhex('FF'))
-                self.ser.write(left)
-                self.ser.write(right)
+    def run(self) -> None:
+        """Starts reading gestures and publishes commands until CTRL+C."""
 
+        # Read gestures in the background, publish on this thread
+        glove_reader = Thread(target=self.get_gesture, daemon=True)
+        glove_reader.start()
+
+        try:
+            print('Press CTRL+C to quit')
+            self.run_glove()
         except KeyboardInterrupt:
             print("Exiting publisher...")
+        finally:
+            self._stop.set()
             self.ser.close()
-            exit()
+            print(self.stats())
+
+    def stop(self) -> None:
+        """Stops the reader and the publisher."""
+
+        self._stop.set()
+
+    def run_glove(self):
+        """Publishes the current command to the serial at a fixed rate."""
+
+        last_sent = None
+        last_sent_time = 0.0
+        last_command: Optional[Command] = None
+        stale = False
+        deadline = time.monotonic()
+
+        while not self._stop.is_set():
+            # Rebuild the command table for a swapped model, stopping until
+            # a gesture of the new model arrives
+            model_name = self._api.model_name
+            if model_name != self._commands[0]:
+                logger.info("Model changed to %s, rebuilding commands",
+                            model_name)
+                self._commands = (model_name, self._build_command_table(
+                    self._api.gestures))
+                self._command = Command(STOP_FRAME)
+
+            # Sleep until the next tick without spinning
+            now = time.monotonic()
+            if deadline > now and self._stop.wait(deadline - now):
+                break
+            now = time.monotonic()
+
+            # Track how late this tick is
+            lateness = now - deadline
+            self.ticks += 1
+            self._total_jitter += lateness
+            self.max_jitter = max(self.max_jitter, lateness)
+
+            # Check how old the newest command is
+            command = self._command
+            now_ns = time.monotonic_ns()
+            age_ns = now_ns - command.notified_ns
+            fresh = command is not last_command
+            last_command = command
+            if command.notified_ns:
+                self.latency["age"].record(age_ns)
+            if fresh and command.notified_ns:
+                self.latency["predict"].record(command.predicted_ns
+                                               - command.notified_ns)
+                self.latency["queue"].record(command.queued_ns
+                                             - command.predicted_ns)
+                self.latency["publish"].record(now_ns - command.queued_ns)
+
+            # Fall back to stop when the command is too old
+            frame = command.frame
+            if age_ns > self._max_age_ns:
+                frame = STOP_FRAME
+                if not stale and command.notified_ns:
+                    self.stale_breaches += 1
+                    logger.warning("Command is %.0f ms old, stopping",
+                                   age_ns / 1e6)
+                    stale = True
+            elif stale:
+                logger.info("Fresh commands resumed")
+                stale = False
+
+            # Publish when the command changes or the keepalive is due
+            if (frame != last_sent
+                    or now - last_sent_time >= self._keepalive):
+                self.ser.write(frame)
+                if fresh and frame is command.frame and command.notified_ns:
+                    self.latency["wire"].record(time.monotonic_ns()
+                                                - command.notified_ns)
+                last_sent = frame
+                last_sent_time = now
+                self.frames_sent += 1
+
+            # Schedule the next tick, skipping any ticks already missed
+            deadline += self._period
+            if deadline <= now:
+                missed = int((now - deadline) // self._period) + 1
+                self.deadline_misses += missed
+                deadline += missed * self._period
 
     def get_gesture(self):
         """Reads the user's gesture."""
 
-        try:
-            while True:
-                gesture = self._api.read_gesture_fast()
-                
-                self.update_direction(gesture)
+        while not self._stop.is_set():
+            gesture = self._api.read_stamped_gesture_fast()
 
-        except KeyboardInterrupt:
-            print("Exiting reader...")
+            self.update_direction(gesture)
+
+    def update_direction(self, gesture: gesture_recognition_api.StampedGesture):
+        """Updates the current command.
 
-    def update_direction(self, gesture: str):
-        """Updates queue with the current direction.
-        
-        Takes in a gesture and pushes a tuple
+        Takes in a stamped gesture, looks up its precomputed frame and
+        hands it to the publisher along with its timestamps. If the model
+        was swapped and the publisher has not rebuilt the table for it yet,
+        the gesture's index cannot be looked up, so stop is sent instead.
         """
 
-        inputs = {
-            "stop": (0, 0),
-            "forward": (1, 1),
-            "backward": (-1, -1),
-            "left": (1, -1),
-            "right": (-1, 1),
-            "forward right": (0, 1),
-            "forward left": (1, 0),
-            "backward right": (-1, 0),
-            "backward left": (0, -1)
-        }
+        model_name, commands = self._commands
+        if (self._api.model_name != model_name
+                or gesture.index >= len(commands)):
+            frame = STOP_FRAME
+        else:
+            frame = commands[gesture.index]
+        self._command = Command(frame,
+                                gesture.notified_ns,
+                                gesture.predicted_ns,
+                                time.monotonic_ns())
+
+    def stats(self) -> Dict[str, float]:
+        """Returns the scheduler statistics.
+
+        Returns:
+            A dictionary containing the number of ticks, frames sent,
+            deadlines missed and stale command breaches, the mean and max
+            lateness of a tick in seconds, and a summary of every latency
+            histogram.
+        """
 
-        self._q.put(inputs[gesture])
+        return {"ticks": self.ticks,
+                "frames_sent": self.frames_sent,
+                "deadline_misses": self.deadline_misses,
+                "stale_breaches": self.stale_breaches,
+                "mean_jitter": self._total_jitter / max(self.ticks, 1),
+                "max_jitter": self.max_jitter,
+                "latency": {stage: histogram.snapshot()
+                            for stage, histogram in self.latency.items()}}
 
 if __name__ == '__main__':
-    VirgoTeleopController()
\ No newline at end of file
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Drive the Virgo robot with glove gestures.")
+    parser.add_argument("--shared", metavar="NAME",
+                        help="read gestures from the shared memory block "
+                             "published by API.publish_shared() instead of "
+                             "connecting to the glove")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    source = None
+    if args.shared is not None:
+        import shared_frames
+        source = shared_frames.SharedFrameReader(args.shared)
+    VirgoTeleopController(api=source).run()